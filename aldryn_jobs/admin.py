@@ -2,11 +2,18 @@
 
 from __future__ import unicode_literals
 
+import json
+
 from django.conf import settings
 from django.contrib import admin
+from django.conf.urls import url
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
 from django.db import models
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 
 from adminsortable2.admin import SortableAdminMixin
@@ -19,41 +26,32 @@ from aldryn_translation_tools.admin import (
 
 from cms.admin.placeholderadmin import FrontendEditableAdminMixin
 
-from emailit.api import send_mail
 from parler.admin import TranslatableAdmin
 
 
 from .forms import JobCategoryAdminForm, JobOpeningAdminForm
-from .models import JobApplication, JobCategory, JobOpening, JobsConfig
+from .models import (
+    JobApplication, JobCategory, JobOpening, JobsConfig, RejectionJob,
+)
+from .rejections import start_rejection_job
 
 
 def _send_rejection_email(modeladmin, request, queryset, lang_code='',
                           delete_application=False):
-    # 1. send rejection email - this should be refactored to use djangos "bulk"
-    #    mail
-    #
-    # Info: Using mass rejection on many JobApplications can lead to a timeout,
-    # since SMTPs are not known to be fast
-    qs_count = len(queryset)
-
-    for application in queryset:
-        context = {'job_application': application, }
-        send_mail(recipients=[application.email], context=context,
-                  template_base='aldryn_jobs/emails/rejection_letter',
-                  language=lang_code.lower())
-
-    # 2. update status or delete objects
+    # Sending many emails within the request would time out, a RejectionJob
+    # sends them in the background, see aldryn_jobs.rejections.
+    job = start_rejection_job(queryset, language=lang_code.lower(),
+                              delete=delete_application)
     if not delete_application:
-        queryset.update(is_rejected=True, rejection_date=now())
-        success_msg = _("Successfully sent {0} rejection email(s).").format(
-            qs_count)
+        success_msg = _("Sending {0} rejection email(s).").format(job.total)
     else:
-        queryset.delete()
-        success_msg = _("Successfully deleted {0} application(s) and sent "
-                        "rejection email.").format(qs_count)
-
-    # 3. inform user with success message
-    modeladmin.message_user(request, success_msg)
+        success_msg = _("Sending {0} rejection email(s) and deleting the "
+                        "application(s).").format(job.total)
+    progress_url = reverse('admin:aldryn_jobs_rejectionjob_progress',
+                           args=(job.pk, ))
+    modeladmin.message_user(request, format_html(
+        '{0} <a href="{1}">{2}</a>', success_msg, progress_url,
+        _('Progress')))
     return
 
 
@@ -121,6 +119,24 @@ class JobApplicationAdmin(VersionedPlaceholderAdminMixin, admin.ModelAdmin):
             )
         return actions
 
+    def get_urls(self):
+        return [
+            url(r'^rejection-jobs/(?P<pk>\d+)/$',
+                self.admin_site.admin_view(self.rejection_job_progress),
+                name='aldryn_jobs_rejectionjob_progress'),
+        ] + super(JobApplicationAdmin, self).get_urls()
+
+    def rejection_job_progress(self, request, pk):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        job = get_object_or_404(RejectionJob, pk=pk)
+        return HttpResponse(json.dumps({
+            'status': job.status,
+            'total': job.total,
+            'processed': job.processed,
+            'error': job.last_error,
+        }), content_type='application/json')
+
     def has_add_permission(self, request):
         # Don't allow creation of "new" applications via admin-backend until
         # it's properly implemented
@@ -154,7 +170,7 @@ class JobCategoryAdmin(VersionedPlaceholderAdminMixin,
                 'fields': ['name', 'slug']
             }),
             (_('Supervisors'), {
-                'fields': ['supervisors']
+                'fields': ['supervisors', 'notifications']
             }),
             (_('Options'), {
                 'fields': ['app_config']
@@ -209,7 +225,9 @@ class JobOpeningAdmin(VersionedPlaceholderAdminMixin,
 
 
 class JobsConfigAdmin(VersionedPlaceholderAdminMixin, BaseAppHookConfig):
-    pass
+
+    def get_config_fields(self):
+        return ('config.paginate_by', 'config.notification_digest')
 
 
 admin.site.register(JobApplication, JobApplicationAdmin)
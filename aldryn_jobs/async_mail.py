@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Sending many emails concurrently from an asyncio event loop, see
+AsyncMailSender. Requires Python 3.5 or later, aldryn_jobs.mail only imports
+this module when ALDRYN_JOBS_MAIL_ASYNC_SESSIONS is set.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+from collections import namedtuple
+
+from django.core.mail import get_connection
+
+from .mail import ConnectionPool, send_message
+
+# ``error`` is the exception raised while sending ``message``, or None
+SendResult = namedtuple('SendResult', ['message', 'sent', 'error'])
+
+
+class RateLimiter(object):
+    """
+    Spaces calls of wait() so that at most ``rate`` of them return per
+    second, or not at all if ``rate`` is None. ``clock`` and ``sleep``
+    default to the time and sleep of the event loop.
+    """
+
+    def __init__(self, rate=None, clock=None, sleep=None):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = None
+        self.clock = clock
+        self.sleep = sleep or asyncio.sleep
+
+    async def wait(self):
+        if not self.interval:
+            return
+        clock = self.clock or asyncio.get_event_loop().time
+        current = clock()
+        if self.next_time is None or self.next_time < current:
+            self.next_time = current
+        delay = self.next_time - current
+        self.next_time += self.interval
+        if delay > 0:
+            await self.sleep(delay)
+
+
+def set_future_result(future, result):
+    # the sender may have given up on the message
+    if not future.done():
+        future.set_result(result)
+
+
+class AsyncMailSender(object):
+    """
+    Sends EmailMessages over ``size`` concurrent sessions with the mail
+    relay. The sessions are the threads of a ConnectionPool, each keeping
+    one connection of ``connection_factory`` open for all the messages it
+    sends, so the connections are configured by the EMAIL_* settings like
+    any other.
+
+    At most ``queue_size`` messages wait for a session, producers of more
+    messages are suspended until a session takes one. ``rate`` limits the
+    messages sent to the relay per second. A sender keeps its event loop
+    and connections until close() is called.
+    """
+
+    def __init__(self, size=4, rate=None, queue_size=None,
+                 connection_factory=get_connection):
+        self.size = size
+        self.queue_size = queue_size or size
+        self.rate = rate
+        self.pool = ConnectionPool(size, connection_factory)
+        self.loop = asyncio.new_event_loop()
+
+    def get_rate_limiter(self):
+        return RateLimiter(self.rate)
+
+    async def send_many(self, messages):
+        """
+        Send ``messages``, an iterable which is consumed as the sessions
+        catch up. Returns a SendResult per message, in their order.
+        """
+        loop = asyncio.get_event_loop()
+        tasks = asyncio.Queue(maxsize=self.queue_size)
+        limiter = self.get_rate_limiter()
+        results = []
+        sessions = [loop.create_task(self.session(tasks, limiter))
+                    for i in range(self.size)]
+        try:
+            for index, message in enumerate(messages):
+                results.append(None)
+                await tasks.put((index, message, results))
+            for session in sessions:
+                await tasks.put(None)
+            await asyncio.gather(*sessions)
+        finally:
+            for session in sessions:
+                session.cancel()
+        return results
+
+    async def session(self, tasks, limiter):
+        while True:
+            task = await tasks.get()
+            if task is None:
+                break
+            index, message, results = task
+            await limiter.wait()
+            result = await self.send(message)
+            if isinstance(result, Exception):
+                results[index] = SendResult(message, False, result)
+            else:
+                results[index] = SendResult(message, bool(result), None)
+
+    def send(self, message):
+        """
+        Send ``message`` on a thread of the pool. Returns a future of the
+        number of sent messages, or of the exception raised.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.pool.submit(
+            send_message, message, lambda result: loop.call_soon_threadsafe(
+                set_future_result, future, result))
+        return future
+
+    def send_messages(self, messages):
+        """
+        Send ``messages`` from the event loop of the sender, blocking until
+        all are sent. Returns a SendResult per message.
+        """
+        return self.loop.run_until_complete(self.send_many(messages))
+
+    def close(self):
+        self.pool.close()
+        self.loop.close()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import get_script_prefix
+from django.utils.encoding import force_bytes
+
+from cms.utils.apphook_reload import get_local_revision
+
+# Number of seconds the rendered job opening lists are cached for anonymous
+# visitors. 0 disables the cache.
+LIST_CACHE_TIMEOUT = getattr(settings, 'ALDRYN_JOBS_LIST_CACHE_TIMEOUT', 0)
+# Number of seconds the supervisor emails of categories are cached for at
+# most, in case they change without any signal, e.g. by queryset updates.
+RECIPIENTS_CACHE_TIMEOUT = getattr(
+    settings, 'ALDRYN_JOBS_RECIPIENTS_CACHE_TIMEOUT', 3600)
+
+LIST_CACHE_VERSION_KEY = 'aldryn_jobs:list_version:{namespace}'
+LIST_CACHE_KEY = 'aldryn_jobs:list:{digest}'
+RECIPIENTS_CACHE_KEY = 'aldryn_jobs:recipients:{category_pk}'
+
+
+def get_list_cache_version(namespace):
+    version_key = LIST_CACHE_VERSION_KEY.format(namespace=namespace)
+    version = cache.get(version_key)
+    if version is None:
+        version = uuid4().hex
+        cache.set(version_key, version, None)
+    return version
+
+
+def get_list_cache_key(namespace, language, category_slug='', query=''):
+    """
+    Return the cache key of a rendered list for the given namespace,
+    language, category and query string. Keys include the namespace version,
+    so invalidate_list_cache() drops all lists of a namespace at once.
+    """
+    parts = [
+        namespace,
+        get_list_cache_version(namespace),
+        language,
+        category_slug,
+        query,
+    ]
+    digest = md5(force_bytes('|'.join(parts))).hexdigest()
+    return LIST_CACHE_KEY.format(digest=digest)
+
+
+def invalidate_list_cache(*namespaces):
+    for namespace in set(namespaces):
+        if namespace is None:
+            continue
+        cache.set(LIST_CACHE_VERSION_KEY.format(namespace=namespace),
+                  uuid4().hex, None)
+
+
+# The supervisor emails of categories are cached in the shared cache, so
+# that all processes see them invalidated when supervisors change.
+def get_cached_recipients(category_pk):
+    return cache.get(RECIPIENTS_CACHE_KEY.format(category_pk=category_pk))
+
+
+def set_cached_recipients(category_pk, recipients):
+    cache.set(RECIPIENTS_CACHE_KEY.format(category_pk=category_pk),
+              recipients, RECIPIENTS_CACHE_TIMEOUT)
+
+
+def invalidate_recipients_cache(*category_pks):
+    cache.delete_many([RECIPIENTS_CACHE_KEY.format(category_pk=category_pk)
+                       for category_pk in set(category_pks)])
+
+
+# Process level caches that depend on the urlconf: reversed URLs,
+# {namespace: {key: url}}, and apphooked namespaces, {namespace: bool}.
+# URLs only change with slugs, which are part of the keys, and with the
+# urlconf, which is why both caches are dropped once this process reloads
+# its urlconf.
+_url_cache = {}
+_apphooked_cache = {}
+_urlconf_revision = [None]
+
+
+def check_urlconf_revision():
+    revision = get_local_revision()
+    if revision != _urlconf_revision[0]:
+        _url_cache.clear()
+        _apphooked_cache.clear()
+        _urlconf_revision[0] = revision
+
+
+def get_url_cache(namespace):
+    check_urlconf_revision()
+    return _url_cache.setdefault(namespace, {})
+
+
+def get_apphooked_cache():
+    check_urlconf_revision()
+    return _apphooked_cache
+
+
+def get_cached_url(namespace, language, *slugs):
+    """
+    Return the cached URL of the object with the given ``slugs`` (category
+    slug and, for job openings, the opening slug) in namespace and language,
+    or None.
+    """
+    key = (language, get_script_prefix()) + slugs
+    return get_url_cache(namespace).get(key)
+
+
+def set_cached_url(url, namespace, language, *slugs):
+    key = (language, get_script_prefix()) + slugs
+    get_url_cache(namespace)[key] = url
+
+
+def invalidate_url_cache(*namespaces):
+    """
+    Drop the cached URLs of the given namespaces, or all of them if no
+    namespace is given.
+    """
+    if not namespaces:
+        _url_cache.clear()
+    for namespace in namespaces:
+        _url_cache.pop(namespace, None)
+
+
+def invalidate_apphooked_cache():
+    _apphooked_cache.clear()
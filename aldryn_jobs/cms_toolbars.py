@@ -38,23 +38,17 @@ def get_jobopening_from_path(path, language, current_url=None):
     if current_url.url_name == 'job-opening-detail':
         # since identical names are allowed with different namespaces -
         # perform correct lookup.
-        job_opening = JobOpening.objects.language(
-            language).namespace(current_url.namespace)
-
-        if 'category_slug' in current_url.kwargs:
-            category_slug = current_url.kwargs['category_slug']
-            job_opening = job_opening.filter(
-                category__translations__slug=category_slug,
-                category__translations__language_code=language
-            )
-
-        if 'job_opening_slug' in current_url.kwargs:
-            job_slug = current_url.kwargs['job_opening_slug']
-            job_opening = job_opening.translated(language, slug=job_slug)
-
-        if job_opening.count():
-            # Let MultipleObjectsReturned propagate if it is raised
-            return job_opening.get()
+        # Let MultipleObjectsReturned propagate if it is raised
+        job_opening_pk = JobOpening.objects.resolve_pk(
+            current_url.namespace,
+            language,
+            current_url.kwargs.get('category_slug'),
+            current_url.kwargs.get('job_opening_slug'),
+        )
+        if job_opening_pk is not None:
+            return (JobOpening.objects.language(language)
+                                      .select_related('category')
+                                      .get(pk=job_opening_pk))
 
     return None
 
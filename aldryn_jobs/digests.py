@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import get_language, override
+
+from . import mail, models
+from .mail import get_email_renderer
+from .models import JobApplication
+
+DIGEST_TEMPLATE = 'aldryn_jobs/emails/digest'
+
+logger = logging.getLogger(__name__)
+
+
+def get_digest_recipients(category_pks):
+    """
+    Return the notification addresses of the categories of ``category_pks``
+    as a {category pk: [email, ...]} dict, with a single query.
+    """
+    recipients = dict((pk, []) for pk in category_pks)
+    rows = (models.supervisor_model._default_manager
+            .filter(job_opening_categories__in=list(recipients))
+            .exclude(email='')
+            .values_list('job_opening_categories', 'email'))
+    for category_pk, email in rows:
+        recipients[category_pk].append(email)
+    if models.DEFAULT_SEND_TO:
+        for emails in recipients.values():
+            emails.append(models.DEFAULT_SEND_TO)
+    return recipients
+
+
+def collect_digests(queryset=None):
+    """
+    Group the applications pending a digest, or those of ``queryset``, by
+    recipient. Returns the applications and a list of (email, applications)
+    with the applications ordered by job opening.
+    """
+    if queryset is None:
+        queryset = JobApplication.objects.filter(digest_pending=True)
+    applications = list(queryset.select_related('job_opening')
+                                .order_by('job_opening', 'created', 'pk'))
+    recipients = get_digest_recipients(set(
+        application.job_opening.category_id for application in applications))
+    digests = OrderedDict()
+    for application in applications:
+        # a supervisor may also be the default recipient
+        emails = OrderedDict.fromkeys(
+            recipients[application.job_opening.category_id])
+        for email in emails:
+            digests.setdefault(email, []).append(application)
+    return applications, sorted(digests.items())
+
+
+def send_digests(language=None, connection=None, queryset=None):
+    """
+    Send one digest of the pending applications to every supervisor, or
+    queue them in the outbox if ALDRYN_JOBS_MAIL_OUTBOX is set, and mark the
+    applications as notified. Returns the number of sent digests and of
+    notified applications.
+    """
+    language = language or get_language() or settings.LANGUAGE_CODE
+    # the titles of the job openings are loaded in the digest language
+    with override(language):
+        applications, digests = collect_digests(queryset)
+        if not applications:
+            return 0, 0
+        messages = [([email], {'job_applications': digest_applications})
+                    for email, digest_applications in digests]
+        errors = [None] * len(messages)
+        if mail.MAIL_OUTBOX:
+            for recipients, context in messages:
+                mail.queue_mail(recipients, context, DIGEST_TEMPLATE,
+                                language=language)
+        elif messages:
+            errors = mail.send_bulk(get_email_renderer(
+                DIGEST_TEMPLATE, language).render_many(messages), connection)
+    # applications are only marked once all their digests are out, the next
+    # run sends them again
+    failed = set()
+    for (recipients, context), error in zip(messages, errors):
+        if error is not None:
+            logger.error('Could not send the digest to %s: %s',
+                         recipients[0], error)
+            failed.update(application.pk
+                          for application in context['job_applications'])
+    JobApplication.objects.filter(
+        pk__in=[application.pk for application in applications
+                if application.pk not in failed]).update(digest_pending=False)
+    return errors.count(None), len(applications) - len(failed)
@@ -2,7 +2,6 @@
 
 from __future__ import unicode_literals
 
-import os
 import logging
 
 from django import forms
@@ -13,23 +12,34 @@ from django.core.exceptions import (
     ImproperlyConfigured,
 )
 from django.core.urlresolvers import reverse
-from django.utils.translation import ugettext
+from django.db import transaction
+from django.utils.translation import ugettext, ugettext_lazy as _
 
 from aldryn_apphooks_config.utils import setup_config
 from app_data import AppDataForm
 from cms.models import Page
-from emailit.api import send_mail
 from multiupload.fields import MultiFileField
 from parler.forms import TranslatableModelForm
+from reversion.revisions import revision_context_manager
 
+from .mail import send_mail, split_attachments
 from .models import (
-    JobApplication, JobApplicationAttachment, JobCategory, JobOpening,
-    JobsConfig, JobListPlugin, JobCategoriesPlugin)
-from .utils import namespace_is_apphooked
+    JobApplication, JobCategory, JobOpening, JobsConfig,
+    JobListPlugin, JobCategoriesPlugin)
+from .uploads import (
+    ATTACHMENTS_MAX_COUNT, ATTACHMENTS_MAX_FILE_SIZE, ATTACHMENTS_MIN_COUNT,
+    consume_uploads, create_attachments, delete_files, get_attachment_storage,
+    get_completed_uploads, store_attachments,
+)
+from .utils import namespace_is_apphooked, on_commit, save_shallow_revision
 
 SEND_ATTACHMENTS_WITH_EMAIL = getattr(
     settings, 'ALDRYN_JOBS_SEND_ATTACHMENTS_WITH_EMAIL', True)
-DEFAULT_SEND_TO = getattr(settings, 'ALDRYN_JOBS_DEFAULT_SEND_TO', None)
+# 'full' revisions of submitted applications follow the job opening, its
+# category, supervisors and config, 'shallow' ones only cover the
+# application and its attachments, None creates no revisions
+APPLICATION_REVISIONS = getattr(
+    settings, 'ALDRYN_JOBS_APPLICATION_REVISIONS', 'full')
 
 logger = logging.getLogger(__name__)
 
@@ -103,22 +113,25 @@ class JobOpeningAdminForm(TranslatableModelForm):
         """
         if 'category' in self.cleaned_data:
             app_config = self.cleaned_data['category'].app_config
-            return Q(category__app_config=app_config)
+            return Q(app_config=app_config)
         return Q()
 
 
 class JobApplicationForm(forms.ModelForm):
     FIVE_MEGABYTES = 1024 * 1024 * 5
     attachments = MultiFileField(
-        max_num=getattr(settings, 'ALDRYN_JOBS_ATTACHMENTS_MAX_COUNT', 5),
-        min_num=getattr(settings, 'ALDRYN_JOBS_ATTACHMENTS_MIN_COUNT', 0),
-        max_file_size=getattr(
-            settings, 'ALDRYN_JOBS_ATTACHMENTS_MAX_FILE_SIZE', FIVE_MEGABYTES),
+        max_num=ATTACHMENTS_MAX_COUNT,
+        min_num=ATTACHMENTS_MIN_COUNT,
+        max_file_size=ATTACHMENTS_MAX_FILE_SIZE,
         required=False
     )
+    # tokens of completed resumable uploads, see AttachmentUploadChunk
+    upload_tokens = forms.CharField(required=False, widget=forms.HiddenInput)
 
     def __init__(self, *args, **kwargs):
         self.job_opening = kwargs.pop('job_opening')
+        # error of AttachmentUploadHandler, which stopped reading the upload
+        self.upload_error = kwargs.pop('upload_error', None)
         if not hasattr(self, 'request') and kwargs.get('request') is not None:
             self.request = kwargs.pop('request')
         super(JobApplicationForm, self).__init__(*args, **kwargs)
@@ -133,18 +146,71 @@ class JobApplicationForm(forms.ModelForm):
             'cover_letter',
         ]
 
+    def clean_attachments(self):
+        if self.upload_error:
+            raise ValidationError(self.upload_error)
+        return self.cleaned_data['attachments']
+
+    def clean_upload_tokens(self):
+        tokens = set(
+            self.cleaned_data['upload_tokens'].replace(',', ' ').split())
+        uploads = list(get_completed_uploads(tokens))
+        if len(uploads) != len(tokens):
+            raise ValidationError(ugettext(
+                'Some attachments were not uploaded completely or have '
+                'expired, please upload them again.'))
+        return uploads
+
+    def clean(self):
+        cleaned_data = super(JobApplicationForm, self).clean()
+        num_files = (len(cleaned_data.get('attachments') or []) +
+                     len(cleaned_data.get('upload_tokens') or []))
+        if num_files > ATTACHMENTS_MAX_COUNT:
+            raise ValidationError(
+                self.fields['attachments'].error_messages['max_num'] % {
+                    'max_num': ATTACHMENTS_MAX_COUNT,
+                    'num_files': num_files,
+                })
+        return cleaned_data
+
     def save(self, commit=True):
         instance = super(JobApplicationForm, self).save(commit=False)
         instance.job_opening = self.job_opening
+        instance.digest_pending = (
+            self.job_opening.category.uses_notification_digest())
+
+        # store the files first, the transaction only covers the rows
+        storage = get_attachment_storage()
+        names = store_attachments(
+            instance, self.cleaned_data['attachments'], storage)
+        uploads = self.cleaned_data['upload_tokens']
+        try:
+            with transaction.atomic():
+                if APPLICATION_REVISIONS == 'full':
+                    with revision_context_manager.create_revision():
+                        self.save_rows(commit, names, uploads)
+                else:
+                    attachments = self.save_rows(commit, names, uploads)
+                    if (APPLICATION_REVISIONS == 'shallow' and
+                            instance.pk is not None):
+                        save_shallow_revision([instance] + attachments)
+        except Exception:
+            delete_files(names, storage)
+            raise
+
+        on_commit(self.send_emails)
+        return instance
 
+    def save_rows(self, commit, names, uploads):
         if commit:
-            instance.save()
-
-        for attachment in self.cleaned_data['attachments']:
-            att = JobApplicationAttachment(
-                application=instance, file=attachment)
-            att.save()
-
+            self.instance.save()
+        # the files belong to the attachments now
+        if uploads:
+            consume_uploads(uploads)
+        return create_attachments(self.instance, names + [
+            upload.file.name for upload in uploads])
+
+    def send_emails(self):
         # additional actions while applying for the job
         try:
             self.send_confirmation_email()
@@ -160,8 +226,6 @@ class JobApplicationForm(forms.ModelForm):
             # prevent the form from ultimately getting saved here.
             logger.exception('Could not send a staff notifications!')
 
-        return instance
-
     def send_confirmation_email(self):
         context = {'job_application': self.instance}
         send_mail(recipients=[self.instance.email],
@@ -169,9 +233,10 @@ class JobApplicationForm(forms.ModelForm):
                   template_base='aldryn_jobs/emails/confirmation')
 
     def send_staff_notifications(self):
-        recipients = list(self.instance.job_opening.get_notification_emails())
-        if DEFAULT_SEND_TO:
-            recipients += [DEFAULT_SEND_TO]
+        if self.instance.digest_pending:
+            # the supervisors get the application with the next digest
+            return
+        recipients = self.instance.job_opening.get_notification_recipients()
 
         app_label = self._meta.model._meta.app_label
         try:
@@ -193,23 +258,33 @@ class JobApplicationForm(forms.ModelForm):
             context['admin_change_form_url'] = self.request.build_absolute_uri(
                 admin_change_form)
 
-        kwargs = {}
+        attachments = []
         if SEND_ATTACHMENTS_WITH_EMAIL:
-            attachments = self.instance.attachments.all()
-            if attachments:
-                kwargs['attachments'] = []
-                for attachment in attachments:
-                    attachment.file.seek(0)
-                    kwargs['attachments'].append(
-                        (os.path.split(
-                            attachment.file.name)[1], attachment.file.read(),))
+            attachments, context['attachment_links'] = split_attachments(
+                self.instance, getattr(self, 'request', None))
         send_mail(recipients=recipients,
                   context=context,
-                  template_base='aldryn_jobs/emails/notification', **kwargs)
+                  template_base='aldryn_jobs/emails/notification',
+                  attachments=attachments)
 
 
 class JobsConfigForm(AppDataForm):
-    pass
+    paginate_by = forms.IntegerField(
+        label=_('Paginate size'),
+        min_value=0,
+        initial=0,
+        required=False,
+        help_text=_('Number of job openings per page in the lists. Use 0 to '
+                    'show all job openings on a single page.'),
+    )
+    notification_digest = forms.BooleanField(
+        label=_('Notification digest'),
+        initial=False,
+        required=False,
+        help_text=_('Notify the supervisors with periodic digests instead of '
+                    'an email per application. Categories can override '
+                    'this.'),
+    )
 
 
 class AppConfigPluginFormMixin(object):
@@ -299,7 +374,7 @@ class JobListPluginForm(AppConfigPluginFormMixin, forms.ModelForm):
             pass
         else:
             for job in selected:
-                if job.category.app_config == app_config:
+                if job.app_config_id == app_config.pk:
                     new_jobopenings.append(job)
 
         data['jobopenings'] = new_jobopenings
@@ -0,0 +1,622 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import binascii
+import logging
+import mimetypes
+import smtplib
+import threading
+from datetime import timedelta
+from email.mime.base import MIMEBase
+from functools import partial
+from os.path import basename
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core import signing
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.core.mail.message import sanitize_address
+from django.core.urlresolvers import NoReverseMatch, reverse
+from django.db.models import F
+from django.dispatch import receiver
+from django.template import Context, Template, TemplateDoesNotExist
+from django.template.loader import select_template
+from django.utils.encoding import force_bytes, force_text
+from django.utils.six.moves import queue
+from django.utils.timezone import now
+from django.utils.translation import get_language
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
+import premailer
+from emailit.utils import force_language, get_template_names
+
+from .models import JobApplicationAttachment, OutboxMessage
+
+# Queue application emails in the outbox instead of sending them during the
+# request, the jobs_mail_worker command sends them.
+MAIL_OUTBOX = getattr(settings, 'ALDRYN_JOBS_MAIL_OUTBOX', False)
+MAIL_MAX_ATTEMPTS = getattr(settings, 'ALDRYN_JOBS_MAIL_MAX_ATTEMPTS', 5)
+# Seconds before the first retry, doubled with every further attempt.
+MAIL_RETRY_DELAY = getattr(settings, 'ALDRYN_JOBS_MAIL_RETRY_DELAY', 60)
+# Send attachments over SMTP while reading them, chunk by chunk, instead of
+# reading them into memory first.
+MAIL_STREAM_ATTACHMENTS = getattr(
+    settings, 'ALDRYN_JOBS_MAIL_STREAM_ATTACHMENTS', False)
+# Size in bytes above which attachments are linked instead of attached.
+ATTACHMENT_LINK_THRESHOLD = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENT_LINK_THRESHOLD', None)
+# Seconds the attachment download links are valid for.
+ATTACHMENT_LINK_MAX_AGE = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENT_LINK_MAX_AGE', 60 * 60 * 24 * 30)
+# Number of concurrent sessions bulk emails are sent over by the asyncio
+# sender (Python 3.5+), None to send them over a single connection.
+MAIL_ASYNC_SESSIONS = getattr(settings, 'ALDRYN_JOBS_MAIL_ASYNC_SESSIONS', None)
+# Max number of bulk emails sent to the relay per second.
+MAIL_ASYNC_RATE = getattr(settings, 'ALDRYN_JOBS_MAIL_ASYNC_RATE', None)
+
+# bytes read at once when streaming, a multiple of 57 (one base64 line)
+STREAM_CHUNK_SIZE = 57 * 1024
+# bytes written to the SMTP connection at once
+STREAM_SEND_SIZE = 64 * 1024
+ATTACHMENT_TOKEN_SALT = 'aldryn_jobs.attachment'
+
+logger = logging.getLogger(__name__)
+
+
+def get_attachment_storage():
+    return JobApplicationAttachment._meta.get_field('file').storage
+
+
+def get_attachment_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def get_attachment_token(attachment):
+    return signing.TimestampSigner(salt=ATTACHMENT_TOKEN_SALT).sign(
+        force_text(attachment.pk))
+
+
+def get_attachment_pk(token, max_age=None):
+    """
+    Return the primary key signed in an attachment download ``token``.
+    Raises signing.BadSignature if the token was tampered with or expired.
+    """
+    if max_age is None:
+        max_age = ATTACHMENT_LINK_MAX_AGE
+    signer = signing.TimestampSigner(salt=ATTACHMENT_TOKEN_SALT)
+    return signer.unsign(token, max_age=max_age)
+
+
+def get_attachment_link(attachment, namespace, request=None):
+    """
+    Return the absolute URL of a signed download link of ``attachment``, or
+    None if the namespace is not hooked to a page.
+    """
+    try:
+        path = reverse(
+            '{0}:job-application-attachment'.format(namespace),
+            kwargs={'token': get_attachment_token(attachment)})
+    except NoReverseMatch:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(path)
+    return 'http://{0}{1}'.format(Site.objects.get_current().domain, path)
+
+
+def split_attachments(application, request=None, storage=None):
+    """
+    Return the names of the attachment files of ``application`` to attach to
+    an email, and (filename, url) download links of the files larger than
+    ALDRYN_JOBS_ATTACHMENT_LINK_THRESHOLD.
+    """
+    attachments = list(application.attachments.all())
+    if ATTACHMENT_LINK_THRESHOLD is None:
+        return [attachment.file.name for attachment in attachments], []
+    storage = storage or get_attachment_storage()
+    namespace = getattr(
+        application.job_opening.app_config, 'namespace', 'aldryn_jobs')
+    names, links = [], []
+    for attachment in attachments:
+        name = attachment.file.name
+        if storage.size(name) > ATTACHMENT_LINK_THRESHOLD:
+            link = get_attachment_link(attachment, namespace, request)
+            if link is not None:
+                links.append((basename(name), link))
+                continue
+        names.append(name)
+    return names, links
+
+
+def read_attachment(name, storage=None):
+    """
+    Return the (filename, content, mimetype) of attachment file ``name``, as
+    accepted by EmailMessage.attach(). Text attachments which are not UTF-8
+    are attached as binary files.
+    """
+    storage = storage or get_attachment_storage()
+    with storage.open(name) as f:
+        content = f.read()
+    filename = basename(name)
+    mimetype = get_attachment_mimetype(filename)
+    if mimetype.startswith('text/'):
+        try:
+            content = content.decode('utf-8')
+        except UnicodeDecodeError:
+            mimetype = 'application/octet-stream'
+    return filename, content, mimetype
+
+
+def render_template(template, context):
+    if isinstance(template, Template):
+        # Django < 1.8
+        return template.render(Context(context))
+    return template.render(context)
+
+
+class EmailRenderer(object):
+    """
+    Renders emails of an emailit template set like emailit's
+    construct_mail(), from templates loaded and compiled only once per
+    template set and language, see get_email_renderer().
+    """
+
+    def __init__(self, template_base, language):
+        self.template_base = template_base
+        self.language = language
+        with force_language(language):
+            self.subject = self.get_template('subject', 'txt')
+            self.body = self.get_template('body', 'txt', required=False)
+            self.html = self.get_template('body', 'html', required=False)
+        if self.body is None and self.html is None:
+            # raise a meaningful exception
+            self.get_template('body', 'txt')
+
+    def get_template(self, part, suffix, required=True):
+        try:
+            return select_template(get_template_names(
+                self.language, self.template_base, part, suffix))
+        except TemplateDoesNotExist:
+            if required:
+                raise
+            return None
+
+    def render(self, recipients, context, from_email=None, site=None,
+               **kwargs):
+        """
+        Render an EmailMultiAlternatives to ``recipients``, ``kwargs`` are
+        passed to it.
+        """
+        site = site or Site.objects.get_current()
+        context = dict(context, site=site, site_name=site.name)
+        with force_language(self.language):
+            subject = render_template(self.subject, context)
+            context['subject'] = subject = subject.replace(
+                '\n', '').replace('\r', '').strip()
+            body = html = ''
+            if self.body is not None:
+                body = render_template(self.body, context)
+            if self.html is not None:
+                html = premailer.transform(
+                    render_template(self.html, context),
+                    base_url='http://{0}'.format(site.domain))
+        mail = EmailMultiAlternatives(
+            subject, body, from_email or settings.DEFAULT_FROM_EMAIL,
+            recipients, **kwargs)
+        if html:
+            mail.attach_alternative(html, 'text/html')
+        return mail
+
+    def render_many(self, messages, **kwargs):
+        """
+        Render an email for every (recipients, context) of ``messages``.
+        """
+        site = kwargs.pop('site', None) or Site.objects.get_current()
+        return [self.render(recipients, context, site=site, **kwargs)
+                for recipients, context in messages]
+
+
+_email_renderers = {}
+
+
+@receiver(setting_changed)
+def clear_email_renderers(setting, **kwargs):
+    if setting.startswith('TEMPLATE') or setting == 'LANGUAGES':
+        _email_renderers.clear()
+
+
+def get_email_renderer(template_base, language=None):
+    """
+    Return the EmailRenderer of ``template_base`` in ``language``, the
+    current language by default. Renderers are kept for the lifetime of the
+    process.
+    """
+    language = language or get_language()
+    key = (template_base, language)
+    if key not in _email_renderers:
+        _email_renderers[key] = EmailRenderer(template_base, language)
+    return _email_renderers[key]
+
+
+def send_mail(recipients, context, template_base, attachments=(),
+              language=None, **kwargs):
+    """
+    Send an email rendered from an emailit template set, or queue it in the
+    outbox if ALDRYN_JOBS_MAIL_OUTBOX is set. ``attachments`` are names of
+    files in the attachment storage.
+    """
+    if MAIL_OUTBOX:
+        return queue_mail(recipients, context, template_base, attachments,
+                          language, **kwargs)
+    email = get_email_renderer(template_base, language).render(
+        recipients, context, **kwargs)
+    return send_email_message(email, attachments)
+
+
+def queue_mail(recipients, context, template_base, attachments=(),
+               language=None, **kwargs):
+    """
+    Render an email from an emailit template set and store it in the
+    outbox. Returns the OutboxMessage, or None if there are no recipients.
+    """
+    mail = get_email_renderer(template_base, language).render(
+        recipients, context, **kwargs)
+    if not mail.recipients():
+        return None
+    html = ''
+    for content, mimetype in mail.alternatives:
+        if mimetype == 'text/html':
+            html = content
+    return OutboxMessage.objects.create(
+        from_email=mail.from_email,
+        recipients='\n'.join(mail.to),
+        subject=mail.subject,
+        body=mail.body,
+        html=html,
+        attachments='\n'.join(attachments),
+    )
+
+
+def send_message(connection, message):
+    return connection.send_messages([message])
+
+
+def get_async_sender():
+    """
+    Return an AsyncMailSender configured by ALDRYN_JOBS_MAIL_ASYNC_SESSIONS
+    and ALDRYN_JOBS_MAIL_ASYNC_RATE, to be closed once no longer used.
+    """
+    from .async_mail import AsyncMailSender
+    return AsyncMailSender(size=MAIL_ASYNC_SESSIONS, rate=MAIL_ASYNC_RATE)
+
+
+def send_bulk(messages, connection=None, sender=None):
+    """
+    Send many EmailMessages from ``sender``, an AsyncMailSender, or a new
+    one if ALDRYN_JOBS_MAIL_ASYNC_SESSIONS is set, otherwise one after the
+    other over ``connection``. Returns the exception raised for every
+    message, None for sent ones.
+    """
+    messages = list(messages)
+    if sender is None and MAIL_ASYNC_SESSIONS:
+        sender = get_async_sender()
+        try:
+            return send_bulk(messages, sender=sender)
+        finally:
+            sender.close()
+    if sender is not None:
+        return [result.error for result in sender.send_messages(messages)]
+    connection = connection or get_connection()
+    pool = ConnectionPool(size=1, connection_factory=lambda: connection)
+    try:
+        results = pool.map(send_message, messages)
+    finally:
+        pool.close()
+    return [result if isinstance(result, Exception) else None
+            for result in results]
+
+
+def get_email_message(message):
+    """
+    Build the EmailMessage of an OutboxMessage, without its attachments.
+    """
+    email = EmailMultiAlternatives(
+        message.subject, message.body, message.from_email,
+        message.get_recipients())
+    if message.html:
+        email.attach_alternative(message.html, 'text/html')
+    return email
+
+
+def send_email_message(email, attachments=(), connection=None,
+                       storage=None):
+    """
+    Send ``email`` with the attachment files named ``attachments``. Over
+    SMTP and with ALDRYN_JOBS_MAIL_STREAM_ATTACHMENTS set, the files are
+    streamed, otherwise they are read and attached. Returns the number of
+    sent messages.
+    """
+    connection = connection or email.get_connection()
+    if MAIL_STREAM_ATTACHMENTS and isinstance(connection, SMTPEmailBackend):
+        return int(send_streamed(connection, email, attachments, storage))
+    if attachments:
+        storage = storage or get_attachment_storage()
+        for name in attachments:
+            email.attach(*read_attachment(name, storage))
+    email.connection = connection
+    return connection.send_messages([email])
+
+
+def iter_base64_lines(name, storage, chunk_size=None):
+    """
+    Yield the base64 encoded lines of file ``name``, reading at most
+    ``chunk_size`` bytes at once.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    rest = b''
+    with storage.open(name, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            end = len(data) - len(data) % 57
+            for start in range(0, end, 57):
+                yield binascii.b2a_base64(data[start:start + 57])[:-1]
+            rest = data[end:]
+    if rest:
+        yield binascii.b2a_base64(rest)[:-1]
+
+
+def iter_message_lines(email, attachments=(), storage=None):
+    """
+    Yield the lines (without line endings) of ``email`` with the attachment
+    files named ``attachments``, which are read and encoded chunk by chunk.
+    Adds the attachments to ``email``.
+    """
+    storage = storage or get_attachment_storage()
+    placeholders = {}
+    for name in attachments:
+        # Django formats the MIME structure around a placeholder payload,
+        # which is replaced by the file content while the lines are sent.
+        placeholder = uuid4().hex
+        filename = basename(name)
+        part = MIMEBase(*get_attachment_mimetype(filename).split('/', 1))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment',
+                        filename=filename)
+        part.set_payload(placeholder)
+        email.attach(part)
+        placeholders[force_bytes(placeholder)] = name
+    for line in force_bytes(email.message().as_bytes()).splitlines():
+        if line in placeholders:
+            for encoded in iter_base64_lines(placeholders[line], storage):
+                yield encoded
+        else:
+            yield line
+
+
+def send_streamed(connection, email, attachments=(), storage=None):
+    """
+    Send ``email`` over ``connection``, an SMTP EmailBackend, streaming the
+    attachment files named ``attachments`` as the message data. Returns
+    whether the message was sent.
+    """
+    if not email.recipients():
+        return False
+    encoding = email.encoding or settings.DEFAULT_CHARSET
+    from_email = sanitize_address(email.from_email, encoding)
+    recipients = [sanitize_address(address, encoding)
+                  for address in email.recipients()]
+    new_connection = connection.open()
+    try:
+        smtp = connection.connection
+        smtp.ehlo_or_helo_if_needed()
+        code, response = smtp.mail(from_email)
+        if code != 250:
+            smtp.rset()
+            raise smtplib.SMTPSenderRefused(code, response, from_email)
+        refused = {}
+        for recipient in recipients:
+            code, response = smtp.rcpt(recipient)
+            if code not in (250, 251):
+                refused[recipient] = (code, response)
+        if len(refused) == len(recipients):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        code, response = smtp.docmd('data')
+        if code != 354:
+            smtp.rset()
+            raise smtplib.SMTPDataError(code, response)
+        buffered = []
+        size = 0
+        for line in iter_message_lines(email, attachments, storage):
+            if line.startswith(b'.'):
+                line = b'.' + line
+            buffered.append(line)
+            size += len(line) + 2
+            if size >= STREAM_SEND_SIZE:
+                smtp.send(b'\r\n'.join(buffered) + b'\r\n')
+                buffered = []
+                size = 0
+        buffered.append(b'.')
+        smtp.send(b'\r\n'.join(buffered) + b'\r\n')
+        code, response = smtp.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+    except Exception:
+        # the connection is in an unknown state after a failed transfer
+        connection.close()
+        raise
+    if new_connection:
+        connection.close()
+    return True
+
+
+class ConnectionPool(object):
+    """
+    A fixed number of threads, each keeping one mail connection open for
+    all the messages it sends. A connection that failed is closed and
+    opened again for the next message.
+    """
+
+    def __init__(self, size=4, connection_factory=get_connection):
+        self.connection_factory = connection_factory
+        # at most one waiting task per thread, map() blocks on the rest
+        self.tasks = queue.Queue(maxsize=size)
+        self.threads = []
+        for i in range(size):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def work(self):
+        connection = self.connection_factory()
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            func, item, callback = task
+            try:
+                connection.open()
+                result = func(connection, item)
+            except Exception as e:
+                self.close_connection(connection)
+                result = e
+            callback(result)
+        self.close_connection(connection)
+
+    def close_connection(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            logger.exception('Could not close a mail connection.')
+
+    def submit(self, func, item, callback):
+        """
+        Call ``func(connection, item)`` on one of the threads, then
+        ``callback`` on that thread with the result, or the exception raised
+        by ``func``. Blocks while every thread has a task waiting.
+        """
+        self.tasks.put((func, item, callback))
+
+    def map(self, func, items):
+        """
+        Call ``func(connection, item)`` for all ``items`` on the threads.
+        Returns the results in the order of ``items``, exceptions raised by
+        ``func`` are returned as results.
+        """
+        items = list(items)
+        results = queue.Queue()
+        for index, item in enumerate(items):
+            self.submit(func, item, partial(self.collect, results, index))
+        collected = [None] * len(items)
+        for i in range(len(items)):
+            index, result = results.get()
+            collected[index] = result
+        return collected
+
+    def collect(self, results, index, result):
+        results.put((index, result))
+
+    def close(self):
+        for thread in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class OutboxWorker(object):
+    """
+    Sends due OutboxMessages over a ConnectionPool. Messages are claimed in
+    batches, so several workers can drain the same outbox. Failed messages
+    are retried with exponential backoff until ``max_attempts`` is reached.
+    """
+
+    def __init__(self, pool, batch_size=100, max_attempts=None,
+                 retry_delay=None, lease=600, storage=None):
+        self.pool = pool
+        self.batch_size = batch_size
+        if max_attempts is None:
+            max_attempts = MAIL_MAX_ATTEMPTS
+        self.max_attempts = max_attempts
+        if retry_delay is None:
+            retry_delay = MAIL_RETRY_DELAY
+        self.retry_delay = retry_delay
+        # seconds after which messages claimed by a crashed worker are due
+        self.lease = lease
+        self.storage = storage
+
+    def claim(self):
+        current = now()
+        due = OutboxMessage.objects.filter(
+            status=OutboxMessage.PENDING, next_attempt__lte=current)
+        pks = list(
+            due.order_by('next_attempt').values_list('pk', flat=True)[
+                :self.batch_size])
+        if not pks:
+            return []
+        claim = uuid4().hex
+        # rows claimed by another worker in the meantime are no longer due
+        due.filter(pk__in=pks).update(
+            claim=claim, next_attempt=current + timedelta(seconds=self.lease))
+        return list(OutboxMessage.objects.filter(claim=claim))
+
+    def send_message(self, connection, message):
+        send_email_message(
+            get_email_message(message), message.get_attachment_names(),
+            connection, self.storage)
+
+    def run_once(self):
+        """
+        Send one batch of due messages. Returns the number of sent and
+        failed messages.
+        """
+        messages = self.claim()
+        results = self.pool.map(self.send_message, messages)
+        sent = []
+        failed = 0
+        for message, result in zip(messages, results):
+            if isinstance(result, Exception):
+                self.fail(message, result)
+                failed += 1
+            else:
+                sent.append(message.pk)
+        OutboxMessage.objects.filter(pk__in=sent).update(
+            status=OutboxMessage.SENT, sent_at=now(), claim='',
+            attempts=F('attempts') + 1, last_error='')
+        return len(sent), failed
+
+    def drain(self):
+        """
+        Send batches until no message is due. Returns the number of sent and
+        failed messages.
+        """
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = self.run_once()
+            if not sent and not failed:
+                return total_sent, total_failed
+            total_sent += sent
+            total_failed += failed
+
+    def fail(self, message, error):
+        message.attempts += 1
+        message.claim = ''
+        message.last_error = force_text(error) or repr(error)
+        if message.attempts >= self.max_attempts:
+            message.status = OutboxMessage.FAILED
+            logger.error('Giving up sending outbox message %s: %s',
+                         message.pk, message.last_error)
+        else:
+            delay = self.retry_delay * 2 ** (message.attempts - 1)
+            message.next_attempt = now() + timedelta(seconds=delay)
+        message.save(update_fields=[
+            'attempts', 'claim', 'last_error', 'status', 'next_attempt'])
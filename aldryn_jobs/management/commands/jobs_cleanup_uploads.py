@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from ...uploads import delete_expired_uploads
+
+
+class Command(BaseCommand):
+    help = ('Deletes the resumable attachment uploads which were not used '
+            'by an application within ALDRYN_JOBS_UPLOAD_EXPIRY seconds, '
+            'along with their stored chunks and files.')
+
+    def handle(self, *args, **options):
+        deleted = delete_expired_uploads()
+        self.stdout.write('Deleted {0} expired upload(s).'.format(deleted))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from ...mail import ConnectionPool, OutboxWorker
+from ...rejections import RejectionJobRunner
+
+
+class Command(BaseCommand):
+    help = ('Sends the emails queued in the outbox and runs the rejection '
+            'jobs, see ALDRYN_JOBS_MAIL_OUTBOX.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once',
+                    default=False,
+                    help='Exit once no message is due.'),
+        make_option('--concurrency', type='int', dest='concurrency',
+                    default=4,
+                    help='Number of concurrent mail connections.'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=100,
+                    help='Number of messages claimed at once.'),
+        make_option('--interval', type='float', dest='interval', default=5,
+                    help='Seconds to wait when no message is due.'),
+    )
+
+    def handle(self, *args, **options):
+        pool = ConnectionPool(size=options['concurrency'])
+        worker = OutboxWorker(pool, batch_size=options['batch_size'])
+        runner = RejectionJobRunner(pool)
+        try:
+            while True:
+                sent, failed = worker.drain()
+                if sent or failed:
+                    self.stdout.write('Sent {0}, failed {1} message(s).'.format(
+                        sent, failed))
+                jobs = runner.run_pending()
+                if jobs:
+                    self.stdout.write('Ran {0} rejection job(s).'.format(jobs))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            runner.close()
+            pool.close()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from ...uploads import retry_file_deletions
+
+
+class Command(BaseCommand):
+    help = ('Retries to delete the attachment files which could not be '
+            'deleted along with their applications.')
+
+    def handle(self, *args, **options):
+        deleted, failed = retry_file_deletions()
+        self.stdout.write('Deleted {0} file(s), {1} failed again.'.format(
+            deleted, failed))
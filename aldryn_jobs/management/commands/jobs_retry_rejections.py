@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from ...models import RejectionJob
+from ...rejections import retry_rejection_jobs
+
+
+class Command(BaseCommand):
+    args = '[job_id ...]'
+    help = ('Sets failed rejection jobs, all of them or those of the given '
+            'ids, pending again. The jobs_mail_worker command resumes them '
+            'with the applications whose email was not sent.')
+
+    def handle(self, *args, **options):
+        queryset = None
+        if args:
+            queryset = RejectionJob.objects.filter(pk__in=args)
+        count = retry_rejection_jobs(queryset)
+        self.stdout.write('Retrying {0} rejection job(s).'.format(count))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...digests import send_digests
+
+
+class Command(BaseCommand):
+    help = ('Sends every supervisor a digest of the applications received '
+            'since the last run, for the categories notifying with digests. '
+            'Run it at the interval the digests should be sent at.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--language', dest='language',
+                    default=settings.LANGUAGE_CODE,
+                    help='Language of the digests.'),
+    )
+
+    def handle(self, *args, **options):
+        digests, applications = send_digests(language=options['language'])
+        self.stdout.write('Sent {0} digest(s) of {1} application(s).'.format(
+            digests, applications))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...sitemaps import JobOpeningSitemap
+from ...sitemaps.files import DomainSite, write_sitemap_files
+
+
+class Command(BaseCommand):
+    help = ('Writes gzipped job opening sitemaps and their index to the '
+            'storage configured with ALDRYN_JOBS_SITEMAP_STORAGE, if job '
+            'openings changed since the last run.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--domain', dest='domain', default=None,
+                    help='Domain of the URLs, defaults to the current Site.'),
+        make_option('--protocol', dest='protocol', default='http',
+                    help='Protocol of the URLs, defaults to http.'),
+        make_option('--force', action='store_true', dest='force',
+                    default=False,
+                    help='Write the files even if nothing changed.'),
+    )
+
+    def get_site(self, domain):
+        if domain:
+            return DomainSite(domain)
+        try:
+            from django.contrib.sites.models import Site
+            return Site.objects.get_current()
+        except Exception:
+            raise CommandError(
+                'Pass --domain or enable the sites framework.')
+
+    def handle(self, *args, **options):
+        sitemaps = {
+            'jobs': JobOpeningSitemap(),
+        }
+        written = write_sitemap_files(
+            sitemaps,
+            self.get_site(options['domain']),
+            protocol=options['protocol'],
+            force=options['force'],
+        )
+        for name in written:
+            self.stdout.write('Wrote {0}'.format(name))
+        if not written:
+            self.stdout.write('Job openings did not change.')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from ...uploads import (
+    SWEEP_BATCH_SIZE, delete_attachment_files, find_orphaned_files,
+)
+
+
+class Command(BaseCommand):
+    help = ('Deletes the files in the attachments/YYYY/MM/ directories of '
+            'the attachment storage which belong to no application.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Only list the orphaned files.'),
+        make_option('--root', dest='root', default='attachments',
+                    help='Directory containing the YYYY/MM/ directories.'),
+        make_option('--min-age', type='int', dest='min_age',
+                    default=60 * 60 * 24,
+                    help='Seconds since the last modification of files '
+                         'to be considered orphaned.'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=SWEEP_BATCH_SIZE,
+                    help='Number of files looked up and deleted at once.'),
+    )
+
+    def handle(self, *args, **options):
+        orphans = failed = 0
+        batch = []
+        for name in find_orphaned_files(
+                root=options['root'], min_age=options['min_age'],
+                batch_size=options['batch_size']):
+            self.stdout.write(name)
+            orphans += 1
+            if not options['dry_run']:
+                batch.append(name)
+                if len(batch) >= options['batch_size']:
+                    failed += delete_attachment_files(batch)
+                    batch = []
+        if batch:
+            failed += delete_attachment_files(batch)
+        if options['dry_run']:
+            self.stdout.write('Found {0} orphaned file(s).'.format(orphans))
+        else:
+            self.stdout.write(
+                'Deleted {0} orphaned file(s), {1} failed.'.format(
+                    orphans - failed, failed))
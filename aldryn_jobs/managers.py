@@ -2,24 +2,110 @@
 
 from __future__ import unicode_literals
 
-from django.db.models import Q
+from django.db.models import Count, Min, Q
 from django.utils import timezone
 
+from aldryn_apphooks_config.managers.parler import (
+    AppHookConfigTranslatableManager, AppHookConfigTranslatableQueryset,
+)
 from parler.managers import TranslatableManager, TranslatableQuerySet
+from parler.utils.i18n import get_active_language_choices
+
+
+def get_active_q(prefix=''):
+    """
+    Return the Q objects and keyword filters that limit JobOpenings to the
+    active ones (active flag and publication window). ``prefix`` allows to
+    apply the same predicate through a relation, e.g. ``'jobs__'``.
+    """
+    now = timezone.now()
+    args = (
+        Q(**{'{0}publication_start__isnull'.format(prefix): True}) |
+        Q(**{'{0}publication_start__lte'.format(prefix): now}),
+        Q(**{'{0}publication_end__isnull'.format(prefix): True}) |
+        Q(**{'{0}publication_end__gt'.format(prefix): now}),
+    )
+    kwargs = {'{0}is_active'.format(prefix): True}
+    return args, kwargs
 
 
 class JobOpeningsQuerySet(TranslatableQuerySet):
 
     def active(self):
+        args, kwargs = get_active_q()
+        return self.filter(*args, **kwargs)
+
+    def namespace(self, namespace):
+        return self.filter(app_config__namespace=namespace)
+
+    def next_publication_change(self):
+        """
+        Return the closest future publication_start or publication_end of
+        the active openings in this queryset, i.e. the moment the result of
+        active() changes without any object being saved, or None.
+        """
         now = timezone.now()
+        queryset = self.filter(is_active=True)
+        changes = [
+            queryset.filter(publication_start__gt=now).aggregate(
+                change=Min('publication_start'))['change'],
+            queryset.filter(publication_end__gt=now).aggregate(
+                change=Min('publication_end'))['change'],
+        ]
+        changes = [change for change in changes if change is not None]
+        return min(changes) if changes else None
+
+    def prefetch_translations(self):
+        """
+        Fetch everything that is needed to render and link the openings
+        along with them: the category and the app_config of both, plus the
+        translations of openings and categories. Iterating over the result
+        then costs a constant number of queries, regardless of the number of
+        openings.
+
+        All translations are fetched, parler takes the prefetched ones as
+        the complete set, e.g. for get_available_languages() and fallbacks.
+        """
+        return self.select_related(
+            'app_config', 'category', 'category__app_config'
+        ).prefetch_related('translations', 'category__translations')
+
+    def translated_slugs(self, language_code, category_slug,
+                         job_opening_slug):
+        """
+        Filter by the opening slug in ``language_code`` and by the category
+        slug in ``language_code`` or one of its fallbacks, since that is what
+        JobOpening.get_absolute_url() puts into the URL. Both lookups are
+        served by the (language_code, slug) index of the translation tables.
+        """
         return self.filter(
-            Q(publication_start__isnull=True) | Q(publication_start__lte=now),
-            Q(publication_end__isnull=True) | Q(publication_end__gt=now),
-            is_active=True
-        )
+            translations__language_code=language_code,
+            translations__slug=job_opening_slug,
+            category__translations__language_code__in=(
+                get_active_language_choices(language_code)),
+            category__translations__slug=category_slug,
+        ).distinct()
 
-    def namespace(self, namespace):
-        return self.filter(category__app_config__namespace=namespace)
+    def resolve_pk(self, namespace, language_code, category_slug,
+                   job_opening_slug):
+        """
+        Return the primary key of the JobOpening addressed by the given
+        namespace, language and slugs, or None. Like get(), raises
+        MultipleObjectsReturned if the lookup is ambiguous.
+        """
+        pks = list(
+            self.namespace(namespace)
+                .translated_slugs(language_code, category_slug,
+                                  job_opening_slug)
+                .values_list('pk', flat=True)[:2]
+        )
+        if len(pks) > 1:
+            raise self.model.MultipleObjectsReturned(
+                'More than one {0} matches {1}'.format(
+                    self.model._meta.object_name,
+                    (namespace, language_code, category_slug,
+                     job_opening_slug)))
+        return pks[0] if pks else None
 
 
 class JobOpeningsManager(TranslatableManager):
@@ -32,3 +118,32 @@ class JobOpeningsManager(TranslatableManager):
 
     def namespace(self, namespace):
         return self.get_queryset().namespace(namespace)
+
+    def resolve_pk(self, namespace, language_code, category_slug,
+                   job_opening_slug):
+        return self.get_queryset().resolve_pk(
+            namespace, language_code, category_slug, job_opening_slug)
+
+
+class JobCategoriesQuerySet(AppHookConfigTranslatableQueryset):
+
+    def with_active_jobs_count(self, language_code=None):
+        """
+        Annotate categories with ``active_jobs_count``, the number of active
+        JobOpenings translated in ``language_code`` (or its fallbacks).
+        Categories without such openings are excluded. All filters on the
+        related openings are applied in a single ``filter()`` call so that
+        they share one join and the count stays a single aggregate query.
+        """
+        args, kwargs = get_active_q(prefix='jobs__')
+        kwargs['jobs__translations__language_code__in'] = (
+            get_active_language_choices(language_code))
+        return self.filter(*args, **kwargs).annotate(
+            active_jobs_count=Count('jobs', distinct=True))
+
+
+class JobCategoriesManager(AppHookConfigTranslatableManager):
+    queryset_class = JobCategoriesQuerySet
+
+    def with_active_jobs_count(self, language_code=None):
+        return self.get_queryset().with_active_jobs_count(language_code)
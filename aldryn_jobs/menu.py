@@ -2,16 +2,33 @@
 
 from __future__ import unicode_literals
 
-from django.core.urlresolvers import NoReverseMatch
 from django.utils.translation import ugettext_lazy as _
 
 from cms.menu_bases import CMSAttachMenu
 from cms.utils import get_language_from_request
 from menus.base import NavigationNode
 from menus.menu_pool import menu_pool
+from parler.utils.i18n import get_active_language_choices
 
+from .managers import get_active_q
 from .models import JobCategory
 from .models import JobOpening
+from .utils import (
+    CATEGORY_SLUG_PLACEHOLDER, JOB_OPENING_SLUG_PLACEHOLDER,
+    fill_url_template, get_translated_rows, get_url_template,
+)
+
+
+def get_category_rows(namespace, languages, *fields):
+    translation_model = JobCategory._parler_meta.root_model
+    rows = (
+        translation_model.objects
+                         .filter(master__app_config__namespace=namespace,
+                                 language_code__in=languages)
+                         .order_by('master__ordering', 'master_id')
+                         .values_list('master_id', 'language_code', *fields)
+    )
+    return get_translated_rows(rows, languages)
 
 
 class JobCategoryMenu(CMSAttachMenu):
@@ -24,21 +41,21 @@ class JobCategoryMenu(CMSAttachMenu):
         except AttributeError:
             app_namespace = None
         language = get_language_from_request(request)
+        url_template = get_url_template(
+            app_namespace, language, 'category-job-opening-list',
+            category_slug=CATEGORY_SLUG_PLACEHOLDER)
+        if url_template is None:
+            return []
         nodes = []
-        categories = (
-            JobCategory.objects
-                       .namespace(app_namespace)
-                       .language(language)
-                       .active_translations(language)
-        )
-        for category in categories:
-            try:
-                node = NavigationNode(category.name,
-                                      category.get_absolute_url(),
-                                      category.slug)
-                nodes.append(node)
-            except NoReverseMatch:
-                pass
+        languages = get_active_language_choices(language)
+        categories = get_category_rows(
+            app_namespace, languages, 'name', 'slug')
+        for pk, language_code, name, slug in categories.values():
+            if not slug:
+                continue
+            url = fill_url_template(
+                url_template, **{CATEGORY_SLUG_PLACEHOLDER: slug})
+            nodes.append(NavigationNode(name, url, slug))
         return nodes
 
 
@@ -54,25 +71,37 @@ class JobOpeningMenu(CMSAttachMenu):
             app_namespace = None
 
         current_language = get_language_from_request(request)
+        url_template = get_url_template(
+            app_namespace, current_language, 'job-opening-detail',
+            category_slug=CATEGORY_SLUG_PLACEHOLDER,
+            job_opening_slug=JOB_OPENING_SLUG_PLACEHOLDER)
+        if url_template is None:
+            return []
         nodes = []
-        openings = (
-            JobOpening.objects
-                      .active()
-                      .namespace(app_namespace)
-                      .language(current_language)
-                      .active_translations(current_language)
-        )
-        for job_opening in openings:
-            try:
-                node = NavigationNode(
-                    title=job_opening.title,
-                    url=job_opening.get_absolute_url(),
-                    id=job_opening.pk,
-                )
-            except NoReverseMatch:
-                pass
-            else:
-                nodes.append(node)
+        languages = get_active_language_choices(current_language)
+        category_slugs = get_category_rows(app_namespace, languages, 'slug')
+        args, kwargs = get_active_q(prefix='master__')
+        kwargs.update({
+            'master__app_config__namespace': app_namespace,
+            'language_code__in': languages,
+        })
+        translation_model = JobOpening._parler_meta.root_model
+        openings = get_translated_rows(
+            translation_model.objects
+                             .filter(*args, **kwargs)
+                             .order_by('master__ordering', 'master_id')
+                             .values_list('master_id', 'language_code',
+                                          'title', 'slug',
+                                          'master__category_id'),
+            languages)
+        for pk, language_code, title, slug, category_id in openings.values():
+            if category_id not in category_slugs or not slug:
+                continue
+            url = fill_url_template(url_template, **{
+                CATEGORY_SLUG_PLACEHOLDER: category_slugs[category_id][2],
+                JOB_OPENING_SLUG_PLACEHOLDER: slug,
+            })
+            nodes.append(NavigationNode(title=title, url=url, id=pk))
         return nodes
 
 
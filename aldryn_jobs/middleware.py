@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.urlresolvers import Resolver404, resolve
+from django.utils.translation import get_language_from_path, override
+
+from .uploads import AttachmentUploadHandler
+
+
+class AttachmentUploadMiddleware(object):
+    """
+    Sets up AttachmentUploadHandler for the applications posted to job
+    openings. Upload handlers have to be in place before anything reads the
+    POST data, so this middleware must come before the session, CSRF and
+    django CMS middlewares.
+    """
+    view_name = 'job-opening-detail'
+
+    def process_request(self, request):
+        if request.method != 'POST' or not request.META.get(
+                'CONTENT_TYPE', '').startswith('multipart/form-data'):
+            return None
+        # resolve the path as LocaleMiddleware will, with its language
+        language = (get_language_from_path(request.path_info) or
+                    settings.LANGUAGE_CODE)
+        with override(language):
+            try:
+                match = resolve(
+                    request.path_info, getattr(request, 'urlconf', None))
+            except Resolver404:
+                return None
+        if (match.url_name == self.view_name and
+                match.func.__module__ == 'aldryn_jobs.views'):
+            request.upload_handlers.insert(
+                0, AttachmentUploadHandler(request))
+        return None
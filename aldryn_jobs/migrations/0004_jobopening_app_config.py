@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0003_auto_20160714_1512'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobopening',
+            name='app_config',
+            field=models.ForeignKey(verbose_name='app configuration', null=True, editable=False, related_name='job_openings', to='aldryn_jobs.JobsConfig'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+def backfill_app_config(apps, schema_editor):
+    JobCategory = apps.get_model('aldryn_jobs', 'JobCategory')
+    JobOpening = apps.get_model('aldryn_jobs', 'JobOpening')
+    # one UPDATE per category, categories are expected to be few.
+    categories = JobCategory.objects.values_list('pk', 'app_config_id')
+    for category_pk, app_config_pk in categories:
+        JobOpening.objects.filter(category_id=category_pk).update(
+            app_config_id=app_config_pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0004_jobopening_app_config'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_app_config, noop)
+    ]
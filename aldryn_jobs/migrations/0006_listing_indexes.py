@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0005_backfill_jobopening_app_config'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jobapplication',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='created', db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='jobapplication',
+            index_together=set([('job_opening', 'created')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='jobopening',
+            index_together=set([('app_config', 'is_active', 'publication_start', 'publication_end'), ('category', 'is_active', 'ordering')]),
+        ),
+    ]
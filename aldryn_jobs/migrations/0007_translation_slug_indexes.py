@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0006_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='jobcategorytranslation',
+            index_together=set([('language_code', 'slug')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='jobopeningtranslation',
+            index_together=set([('language_code', 'slug')]),
+        ),
+    ]
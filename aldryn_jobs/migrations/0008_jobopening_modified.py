@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+def backfill_modified(apps, schema_editor):
+    JobOpening = apps.get_model('aldryn_jobs', 'JobOpening')
+    JobOpening.objects.update(modified=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0007_translation_slug_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobopening',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, auto_now=True),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_modified, noop),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0008_jobopening_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('created', models.DateTimeField(verbose_name='created', auto_now_add=True)),
+                ('from_email', models.CharField(verbose_name='from', max_length=254)),
+                ('recipients', models.TextField(verbose_name='recipients')),
+                ('subject', models.TextField(verbose_name='subject')),
+                ('body', models.TextField(verbose_name='body', blank=True)),
+                ('html', models.TextField(verbose_name='HTML body', blank=True)),
+                ('attachments', models.TextField(verbose_name='attachments', blank=True)),
+                ('status', models.CharField(verbose_name='status', max_length=10, default='pending', choices=[('pending', 'pending'), ('sent', 'sent'), ('failed', 'failed')])),
+                ('attempts', models.PositiveIntegerField(verbose_name='attempts', default=0)),
+                ('next_attempt', models.DateTimeField(verbose_name='next attempt', default=django.utils.timezone.now)),
+                ('claim', models.CharField(max_length=32, blank=True, db_index=True)),
+                ('sent_at', models.DateTimeField(verbose_name='sent at', blank=True, null=True)),
+                ('last_error', models.TextField(verbose_name='last error', blank=True)),
+            ],
+            options={
+                'verbose_name': 'outbox message',
+                'verbose_name_plural': 'outbox messages',
+                'ordering': ['created'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxmessage',
+            index_together=set([('status', 'next_attempt')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import aldryn_jobs.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0009_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentUpload',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('token', models.CharField(verbose_name='token', max_length=32, unique=True, default=aldryn_jobs.models.get_upload_token)),
+                ('filename', models.CharField(verbose_name='file name', max_length=200)),
+                ('size', models.BigIntegerField(verbose_name='size')),
+                ('offset', models.BigIntegerField(verbose_name='offset', default=0)),
+                ('chunks', models.TextField(verbose_name='chunks', blank=True)),
+                ('file', models.FileField(max_length=200, blank=True, null=True, upload_to=aldryn_jobs.models.default_jobs_attachment_upload_to)),
+                ('created', models.DateTimeField(verbose_name='created', auto_now_add=True)),
+                ('modified', models.DateTimeField(verbose_name='modified', db_index=True, auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'attachment upload',
+                'verbose_name_plural': 'attachment uploads',
+            },
+        ),
+    ]
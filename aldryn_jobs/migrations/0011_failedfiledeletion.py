@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0010_attachmentupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedFileDeletion',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('name', models.CharField(verbose_name='file name', max_length=200)),
+                ('error', models.TextField(verbose_name='error', blank=True)),
+                ('attempts', models.PositiveIntegerField(verbose_name='attempts', default=1)),
+                ('created', models.DateTimeField(verbose_name='created', auto_now_add=True)),
+                ('modified', models.DateTimeField(verbose_name='modified', auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'failed file deletion',
+                'verbose_name_plural': 'failed file deletions',
+                'ordering': ['created'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0011_failedfiledeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RejectionJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('created', models.DateTimeField(verbose_name='created', auto_now_add=True)),
+                ('language', models.CharField(verbose_name='language', max_length=15, blank=True)),
+                ('delete_applications', models.BooleanField(verbose_name='delete applications', default=False)),
+                ('applications', models.TextField(verbose_name='applications')),
+                ('status', models.CharField(verbose_name='status', max_length=10, db_index=True, default='pending', choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')])),
+                ('total', models.PositiveIntegerField(verbose_name='total', default=0)),
+                ('processed', models.PositiveIntegerField(verbose_name='processed', default=0)),
+                ('started', models.DateTimeField(verbose_name='started', blank=True, null=True)),
+                ('finished', models.DateTimeField(verbose_name='finished', blank=True, null=True)),
+                ('last_error', models.TextField(verbose_name='last error', blank=True)),
+            ],
+            options={
+                'verbose_name': 'rejection job',
+                'verbose_name_plural': 'rejection jobs',
+                'ordering': ['created'],
+            },
+        ),
+    ]
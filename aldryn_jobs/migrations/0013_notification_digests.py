@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0012_rejectionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplication',
+            name='digest_pending',
+            field=models.BooleanField(verbose_name='pending digest', db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobcategory',
+            name='notifications',
+            field=models.CharField(verbose_name='notifications', max_length=20, blank=True, default='', choices=[('', 'As in the app configuration'), ('immediately', 'One email per application'), ('digest', 'Periodic digest')], help_text='Digests summarize the new applications, they are sent by the jobs_send_digests command.'),
+        ),
+    ]
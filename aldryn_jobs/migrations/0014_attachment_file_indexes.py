@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import aldryn_jobs.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0013_notification_digests'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attachmentupload',
+            name='file',
+            field=models.FileField(max_length=200, blank=True, null=True, db_index=True, upload_to=aldryn_jobs.models.default_jobs_attachment_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='jobapplicationattachment',
+            name='file',
+            field=models.FileField(max_length=200, blank=True, null=True, db_index=True, upload_to=aldryn_jobs.models.default_jobs_attachment_upload_to),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aldryn_jobs', '0014_attachment_file_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rejectionjob',
+            name='claim',
+            field=models.CharField(max_length=32, blank=True),
+        ),
+        migrations.AddField(
+            model_name='rejectionjob',
+            name='heartbeat',
+            field=models.DateTimeField(verbose_name='heartbeat', blank=True, null=True),
+        ),
+    ]
@@ -8,7 +8,9 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse, NoReverseMatch
 from django.db import models
-from django.db.models.signals import pre_delete
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save,
+)
 from django.dispatch.dispatcher import receiver
 from django.utils.encoding import force_text, python_2_unicode_compatible
 from django.utils.timezone import now
@@ -21,15 +23,13 @@ except ImportError:
 
 from djangocms_text_ckeditor.fields import HTMLField
 from aldryn_reversion.core import version_controlled_content
-from aldryn_apphooks_config.managers.parler import (
-    AppHookConfigTranslatableManager
-)
 from aldryn_translation_tools.models import (
     TranslationHelperMixin, TranslatedAutoSlugifyMixin,
 )
 
 from cms.models import CMSPlugin
 from cms.models.fields import PlaceholderField
+from cms.signals import post_publish, post_unpublish, urls_need_reloading
 from cms.utils.i18n import force_language
 from distutils.version import LooseVersion
 from functools import partial
@@ -39,8 +39,13 @@ from reversion.revisions import default_revision_manager, RegistrationError
 from sortedm2m.fields import SortedManyToManyField
 from uuid import uuid4
 
+from .cache import (
+    get_cached_recipients, get_cached_url, invalidate_apphooked_cache,
+    invalidate_list_cache, invalidate_recipients_cache, invalidate_url_cache,
+    set_cached_recipients, set_cached_url,
+)
 from .cms_appconfig import JobsConfig
-from .managers import JobOpeningsManager
+from .managers import JobCategoriesManager, JobOpeningsManager
 from .utils import get_valid_filename
 
 # NOTE: We need to use LooseVersion NOT StrictVersion as Aldryn sometimes uses
@@ -113,6 +118,12 @@ else:
     except RegistrationError:
         pass
 
+# the class of the supervisors
+supervisor_model = (user_model if loose_version < LooseVersion('1.7.0')
+                    else user_model_object)
+
+DEFAULT_SEND_TO = getattr(settings, 'ALDRYN_JOBS_DEFAULT_SEND_TO', None)
+
 
 def default_jobs_attachment_upload_to(instance, filename):
     date = now().strftime('%Y/%m')
@@ -151,7 +162,8 @@ class JobCategory(TranslatedAutoSlugifyMixin,
         name=models.CharField(_('name'), max_length=255),
         slug=models.SlugField(_('slug'), max_length=255, blank=True,
             help_text=_('Auto-generated. Used in the URL. If changed, the URL '
-                        'will change. Clear it to have the slug re-created.'))
+                        'will change. Clear it to have the slug re-created.')),
+        meta={'index_together': [('language_code', 'slug')]},
     )
 
     supervisors = models.ManyToManyField(
@@ -165,9 +177,25 @@ class JobCategory(TranslatedAutoSlugifyMixin,
     app_config = models.ForeignKey(JobsConfig, null=True,
         verbose_name=_('app configuration'), related_name='categories')
 
+    NOTIFY_CONFIGURED = ''
+    NOTIFY_IMMEDIATELY = 'immediately'
+    NOTIFY_DIGEST = 'digest'
+
+    NOTIFICATION_CHOICES = (
+        (NOTIFY_CONFIGURED, _('As in the app configuration')),
+        (NOTIFY_IMMEDIATELY, _('One email per application')),
+        (NOTIFY_DIGEST, _('Periodic digest')),
+    )
+
+    notifications = models.CharField(_('notifications'),
+        max_length=20, blank=True, default=NOTIFY_CONFIGURED,
+        choices=NOTIFICATION_CHOICES,
+        help_text=_('Digests summarize the new applications, they are sent '
+                    'by the jobs_send_digests command.'))
+
     ordering = models.IntegerField(_('ordering'), default=0)
 
-    objects = AppHookConfigTranslatableManager()
+    objects = JobCategoriesManager()
 
     class Meta:
         verbose_name = _('job category')
@@ -186,6 +214,12 @@ class JobCategory(TranslatedAutoSlugifyMixin,
         kwargs['qs'] = qs.filter(app_config=self.app_config)
         return super(JobCategory, self)._slug_exists(*args, **kwargs)
 
+    def save(self, *args, **kwargs):
+        super(JobCategory, self).save(*args, **kwargs)
+        # keep the denormalized JobOpening.app_config in sync
+        self.jobs.exclude(app_config=self.app_config_id).update(
+            app_config=self.app_config_id)
+
     def get_absolute_url(self, language=None):
         language = language or self.get_current_language()
         slug = self.safe_translation_getter('slug', language_code=language)
@@ -193,25 +227,49 @@ class JobCategory(TranslatedAutoSlugifyMixin,
             namespace = self.app_config.namespace
         else:
             namespace = 'aldryn_jobs'
+        url = get_cached_url(namespace, language, slug)
+        if url is not None:
+            return url
         with force_language(language):
             try:
                 if not slug:
-                    return reverse('{0}:job-opening-list'.format(namespace))
-                kwargs = {'category_slug': slug}
-                return reverse(
-                    '{0}:category-job-opening-list'.format(namespace),
-                    kwargs=kwargs,
-                    current_app=self.app_config.namespace
-                )
+                    url = reverse('{0}:job-opening-list'.format(namespace))
+                else:
+                    kwargs = {'category_slug': slug}
+                    url = reverse(
+                        '{0}:category-job-opening-list'.format(namespace),
+                        kwargs=kwargs,
+                        current_app=self.app_config.namespace
+                    )
             except NoReverseMatch:
                 return "/%s/" % language
+        set_cached_url(url, namespace, language, slug)
+        return url
 
     def get_notification_emails(self):
         return self.supervisors.values_list('email', flat=True)
 
+    def get_notification_recipients(self):
+        return get_notification_recipients(self.pk)
+
+    def uses_notification_digest(self):
+        """
+        Whether the supervisors are notified with digests instead of an
+        email per application.
+        """
+        if self.notifications:
+            return self.notifications == self.NOTIFY_DIGEST
+        if self.app_config_id is None:
+            return False
+        return bool(getattr(self.app_config, 'notification_digest', False))
+
     # We keep this 'count' name for compatibility in templates:
     # there used to be annotate() call with the same property name.
     def count(self):
+        # prefer the value annotated by with_active_jobs_count(), if any
+        active_jobs_count = getattr(self, 'active_jobs_count', None)
+        if active_jobs_count is not None:
+            return active_jobs_count
         return self.jobs.active().count()
 
 
@@ -229,13 +287,20 @@ class JobOpening(TranslatedAutoSlugifyMixin,
             help_text=_('Auto-generated. Used in the URL. If changed, the URL '
                         'will change. Clear it to have the slug re-created.')),
         lead_in=HTMLField(_('short description'), blank=True,
-            help_text=_('This text will be displayed in lists.'))
+            help_text=_('This text will be displayed in lists.')),
+        meta={'index_together': [('language_code', 'slug')]},
     )
 
     content = PlaceholderField('Job Opening Content')
     category = models.ForeignKey(JobCategory, verbose_name=_('category'),
         related_name='jobs')
+    # Denormalized copy of category.app_config, maintained on save of both
+    # JobOpening and JobCategory. Allows filtering by namespace without
+    # joining the category table.
+    app_config = models.ForeignKey(JobsConfig, null=True, editable=False,
+        verbose_name=_('app configuration'), related_name='job_openings')
     created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(_('active?'), default=True)
     publication_start = models.DateTimeField(_('published since'),
         null=True, blank=True)
@@ -253,6 +318,13 @@ class JobOpening(TranslatedAutoSlugifyMixin,
         verbose_name_plural = _('job openings')
         # DO NOT attempt to add 'translated__title' here.
         ordering = ['ordering', ]
+        index_together = [
+            # JobOpeningsQuerySet.namespace().active()
+            ('app_config', 'is_active', 'publication_start',
+             'publication_end'),
+            # CategoryJobOpeningList, ordered by 'ordering'
+            ('category', 'is_active', 'ordering'),
+        ]
 
     def __str__(self):
         return self.safe_translation_getter('title', str(self.pk))
@@ -263,9 +335,14 @@ class JobOpening(TranslatedAutoSlugifyMixin,
         if qs is None:
             qs = self._get_slug_queryset()
         # limit qs to current app_config only
-        kwargs['qs'] = qs.filter(category__app_config=self.category.app_config)
+        kwargs['qs'] = qs.filter(app_config=self.app_config_id)
         return super(JobOpening, self)._slug_exists(*args, **kwargs)
 
+    def save(self, *args, **kwargs):
+        if self.category_id:
+            self.app_config_id = self.category.app_config_id
+        return super(JobOpening, self).save(*args, **kwargs)
+
     def get_absolute_url(self, language=None):
         language = language or self.get_current_language()
         slug = self.safe_translation_getter('slug', language_code=language)
@@ -274,16 +351,19 @@ class JobOpening(TranslatedAutoSlugifyMixin,
         )
         namespace = getattr(
             self.category.app_config, "namespace", "aldryn_jobs")
+        # FIXME: does not looks correct return category url here
+        if not slug:
+            return self.category.get_absolute_url(language=language)
+        url = get_cached_url(namespace, language, category_slug, slug)
+        if url is not None:
+            return url
         with force_language(language):
             try:
-                # FIXME: does not looks correct return category url here
-                if not slug:
-                    return self.category.get_absolute_url(language=language)
                 kwargs = {
                     'category_slug': category_slug,
                     'job_opening_slug': slug,
                 }
-                return reverse(
+                url = reverse(
                     '{0}:job-opening-detail'.format(namespace),
                     kwargs=kwargs,
                     current_app=self.category.app_config.namespace
@@ -292,6 +372,8 @@ class JobOpening(TranslatedAutoSlugifyMixin,
                 # FIXME: this is wrong, if have some problem in reverse
                 #        we should know
                 return "/%s/" % language
+        set_cached_url(url, namespace, language, category_slug, slug)
+        return url
 
     def get_active(self):
         return all([
@@ -303,6 +385,9 @@ class JobOpening(TranslatedAutoSlugifyMixin,
     def get_notification_emails(self):
         return self.category.get_notification_emails()
 
+    def get_notification_recipients(self):
+        return get_notification_recipients(self.category_id)
+
 
 @version_controlled_content(follow=['job_opening'])
 @python_2_unicode_compatible
@@ -323,13 +408,21 @@ class JobApplication(models.Model):
     last_name = models.CharField(_('last name'), max_length=20)
     email = models.EmailField(_('email'), max_length=254)
     cover_letter = models.TextField(_('cover letter'), blank=True)
-    created = models.DateTimeField(_('created'), auto_now_add=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True,
+        db_index=True)
     is_rejected = models.BooleanField(_('rejected?'), default=False)
     rejection_date = models.DateTimeField(_('rejection date'),
         null=True, blank=True)
+    # the supervisors are yet to be notified with a digest
+    digest_pending = models.BooleanField(_('pending digest'), default=False,
+        db_index=True, editable=False)
 
     class Meta:
         ordering = ['-created']
+        index_together = [
+            # applications of an opening, newest first
+            ('job_opening', 'created'),
+        ]
         verbose_name = _('job application')
         verbose_name_plural = _('job applications')
 
@@ -341,6 +434,60 @@ class JobApplication(models.Model):
         return full_name.strip()
 
 
+def get_notification_recipients(category_pk):
+    """
+    Return the addresses notified of applications to the job openings of a
+    category: the emails of its supervisors and ALDRYN_JOBS_DEFAULT_SEND_TO.
+    The supervisor emails are cached until the supervisors or their emails
+    change.
+    """
+    emails = get_cached_recipients(category_pk)
+    if emails is None:
+        emails = list(supervisor_model._default_manager.filter(
+            job_opening_categories=category_pk).values_list(
+                'email', flat=True))
+        set_cached_recipients(category_pk, emails)
+    recipients = list(emails)
+    if DEFAULT_SEND_TO:
+        recipients.append(DEFAULT_SEND_TO)
+    return recipients
+
+
+@receiver(m2m_changed)
+def invalidate_supervisor_recipients(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    if sender is not JobCategory.supervisors.through:
+        return
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_recipients_cache(instance.pk)
+    elif action == 'pre_clear':
+        # the categories of a user are no longer known after the clear
+        instance._previous_job_categories = list(
+            instance.job_opening_categories.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_recipients_cache(*instance._previous_job_categories)
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipients_cache(*pk_set)
+
+
+@receiver(post_save, sender=supervisor_model)
+@receiver(pre_delete, sender=supervisor_model)
+def invalidate_user_recipients(sender, instance, created=False,
+                               update_fields=None, raw=False, **kwargs):
+    # e.g. logins only update last_login
+    if created or raw or (
+            update_fields is not None and 'email' not in update_fields):
+        return
+    invalidate_recipients_cache(*instance.job_opening_categories.values_list(
+        'pk', flat=True))
+
+
+@receiver(post_delete, sender=JobCategory)
+def invalidate_category_recipients(sender, instance, **kwargs):
+    invalidate_recipients_cache(instance.pk)
+
+
 @receiver(pre_delete, sender=JobApplication)
 def cleanup_attachments(sender, instance, **kwargs):
     for attachment in instance.attachments.all():
@@ -348,11 +495,235 @@ def cleanup_attachments(sender, instance, **kwargs):
             attachment.file.delete(False)
 
 
+def get_app_config_namespace(instance):
+    try:
+        return instance.app_config.namespace if instance.app_config_id else None
+    except JobsConfig.DoesNotExist:
+        # the config is being deleted along with the instance
+        return None
+
+
+@receiver(pre_save, sender=JobCategory)
+@receiver(pre_save, sender=JobOpening)
+def remember_previous_namespace(sender, instance, raw=False, **kwargs):
+    # an opening or a category can be moved to another config, lists of the
+    # previous namespace have to be invalidated as well.
+    instance._previous_namespace = None
+    if instance.pk and not raw:
+        instance._previous_namespace = (
+            sender.objects.filter(pk=instance.pk)
+                          .values_list('app_config__namespace', flat=True)
+                          .first())
+
+
+@receiver(post_save, sender=JobCategory)
+@receiver(post_delete, sender=JobCategory)
+@receiver(post_save, sender=JobOpening)
+@receiver(post_delete, sender=JobOpening)
+def invalidate_lists(sender, instance, **kwargs):
+    namespaces = (
+        get_app_config_namespace(instance),
+        getattr(instance, '_previous_namespace', None),
+    )
+    invalidate_list_cache(*namespaces)
+    invalidate_url_cache(*namespaces)
+
+
+@receiver(post_save, sender=JobOpening._parler_meta.root_model)
+def touch_job_opening(sender, instance, raw=False, **kwargs):
+    # translations saved on their own, e.g. with a new slug, change the
+    # opening as well, see JobOpeningSitemap.fingerprint()
+    if not raw:
+        JobOpening.objects.filter(pk=instance.master_id).update(
+            modified=now())
+
+
+@receiver(post_save, sender=JobsConfig)
+@receiver(post_delete, sender=JobsConfig)
+def invalidate_config_lists(sender, instance, **kwargs):
+    invalidate_list_cache(instance.namespace)
+    invalidate_url_cache(instance.namespace)
+    invalidate_apphooked_cache()
+
+
+@receiver(post_publish)
+@receiver(post_unpublish)
+@receiver(urls_need_reloading)
+def invalidate_urls(sender, **kwargs):
+    # the path of the apphooked pages is part of every cached URL, and the
+    # cached lists contain URLs and page content
+    invalidate_url_cache()
+    invalidate_apphooked_cache()
+    invalidate_list_cache(
+        *JobsConfig.objects.values_list('namespace', flat=True))
+
+
 @version_controlled_content(follow=['application'])
 class JobApplicationAttachment(models.Model):
     application = models.ForeignKey(JobApplication, related_name='attachments',
                                     verbose_name=_('job application'))
-    file = JobApplicationFileField()
+    file = JobApplicationFileField(db_index=True)
+
+
+@python_2_unicode_compatible
+class OutboxMessage(models.Model):
+    """
+    An email waiting to be sent by the jobs_mail_worker command, see
+    aldryn_jobs.mail. Attachments are stored as names of files in the
+    attachment storage, which are only read when the message is sent.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, _('pending')),
+        (SENT, _('sent')),
+        (FAILED, _('failed')),
+    )
+
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    from_email = models.CharField(_('from'), max_length=254)
+    recipients = models.TextField(_('recipients'))
+    subject = models.TextField(_('subject'))
+    body = models.TextField(_('body'), blank=True)
+    html = models.TextField(_('HTML body'), blank=True)
+    attachments = models.TextField(_('attachments'), blank=True)
+    status = models.CharField(_('status'), max_length=10,
+        choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    # also acts as the lease of a worker that claimed the message
+    next_attempt = models.DateTimeField(_('next attempt'), default=now)
+    claim = models.CharField(max_length=32, blank=True, db_index=True)
+    sent_at = models.DateTimeField(_('sent at'), null=True, blank=True)
+    last_error = models.TextField(_('last error'), blank=True)
+
+    class Meta:
+        ordering = ['created']
+        index_together = [
+            # jobs_mail_worker, due pending messages
+            ('status', 'next_attempt'),
+        ]
+        verbose_name = _('outbox message')
+        verbose_name_plural = _('outbox messages')
+
+    def __str__(self):
+        return self.subject
+
+    def get_recipients(self):
+        return [email for email in self.recipients.splitlines() if email]
+
+    def get_attachment_names(self):
+        return [name for name in self.attachments.splitlines() if name]
+
+
+def get_upload_token():
+    return uuid4().hex
+
+
+@python_2_unicode_compatible
+class AttachmentUpload(models.Model):
+    """
+    A resumable upload of an application attachment, see
+    aldryn_jobs.uploads. Chunks are stored as separate files in the
+    attachment storage until the upload is complete, they are then
+    assembled into ``file``.
+    """
+    token = models.CharField(_('token'), max_length=32, unique=True,
+        default=get_upload_token)
+    filename = models.CharField(_('file name'), max_length=200)
+    size = models.BigIntegerField(_('size'))
+    offset = models.BigIntegerField(_('offset'), default=0)
+    # newline separated names of the stored chunks
+    chunks = models.TextField(_('chunks'), blank=True)
+    file = JobApplicationFileField(db_index=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    modified = models.DateTimeField(_('modified'), auto_now=True,
+        db_index=True)
+
+    class Meta:
+        verbose_name = _('attachment upload')
+        verbose_name_plural = _('attachment uploads')
+
+    def __str__(self):
+        return self.filename
+
+    def get_chunk_names(self):
+        return [name for name in self.chunks.splitlines() if name]
+
+    @property
+    def is_complete(self):
+        return bool(self.file)
+
+
+@python_2_unicode_compatible
+class FailedFileDeletion(models.Model):
+    """
+    A file of the attachment storage which could not be deleted along with
+    its application, retried by the jobs_retry_file_deletions command.
+    """
+    name = models.CharField(_('file name'), max_length=200)
+    error = models.TextField(_('error'), blank=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=1)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    modified = models.DateTimeField(_('modified'), auto_now=True)
+
+    class Meta:
+        ordering = ['created']
+        verbose_name = _('failed file deletion')
+        verbose_name_plural = _('failed file deletions')
+
+    def __str__(self):
+        return self.name
+
+
+@python_2_unicode_compatible
+class RejectionJob(models.Model):
+    """
+    Rejection emails to send to applications in the background, started by
+    the rejection actions of JobApplicationAdmin, see aldryn_jobs.rejections.
+    Applications are marked as rejected or deleted once their email is sent.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, _('pending')),
+        (RUNNING, _('running')),
+        (DONE, _('done')),
+        (FAILED, _('failed')),
+    )
+
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    language = models.CharField(_('language'), max_length=15, blank=True)
+    delete_applications = models.BooleanField(
+        _('delete applications'), default=False)
+    # newline separated primary keys of the applications
+    applications = models.TextField(_('applications'))
+    status = models.CharField(_('status'), max_length=10,
+        choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    total = models.PositiveIntegerField(_('total'), default=0)
+    processed = models.PositiveIntegerField(_('processed'), default=0)
+    started = models.DateTimeField(_('started'), null=True, blank=True)
+    finished = models.DateTimeField(_('finished'), null=True, blank=True)
+    last_error = models.TextField(_('last error'), blank=True)
+    # the runner of a running job, renewing its heartbeat after every batch
+    claim = models.CharField(max_length=32, blank=True)
+    heartbeat = models.DateTimeField(_('heartbeat'), null=True, blank=True)
+
+    class Meta:
+        ordering = ['created']
+        verbose_name = _('rejection job')
+        verbose_name_plural = _('rejection jobs')
+
+    def __str__(self):
+        return '{0} ({1}/{2})'.format(
+            self.get_status_display(), self.processed, self.total)
+
+    def get_application_pks(self):
+        return [int(pk) for pk in self.applications.splitlines() if pk]
 
 
 @python_2_unicode_compatible
@@ -383,13 +754,18 @@ class JobListPlugin(CMSPlugin):
         and language, sorted by title.
         """
         if self.jobopenings.exists():
-            return self.jobopenings.namespace(namespace).active()
+            return (
+                self.jobopenings.namespace(namespace)
+                                .active()
+                                .prefetch_translations()
+            )
 
         return (
             JobOpening.objects.namespace(namespace)
                               .language(self.language)
                               .active_translations(self.language)
                               .active()
+                              .prefetch_translations()
         )
 
     def copy_relations(self, oldinstance):
@@ -413,9 +789,18 @@ class JobCategoriesPlugin(CMSPlugin):
 
     @property
     def categories(self):
-        categories_qs = JobCategory.objects.namespace(
-            self.app_config.namespace).order_by('ordering')
-        return (category for category in categories_qs if category.count())
+        """
+        Return categories of the selected namespace which have active job
+        openings, annotated with ``active_jobs_count``.
+        """
+        return (
+            JobCategory.objects.namespace(self.app_config.namespace)
+                               .language(self.language)
+                               .active_translations(self.language)
+                               .with_active_jobs_count(self.language)
+                               .prefetch_related('translations')
+                               .order_by('ordering')
+        )
 
     def copy_relations(self, oldinstance):
         self.app_config = oldinstance.app_config
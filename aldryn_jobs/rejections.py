@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.encoding import force_text
+from django.utils.timezone import now
+
+from . import mail
+from .mail import get_email_renderer, send_message
+from .models import JobApplication, RejectionJob
+from .uploads import delete_applications
+
+# Number of rejection emails sent over the mail connection at once.
+REJECTION_BATCH_SIZE = getattr(
+    settings, 'ALDRYN_JOBS_REJECTION_BATCH_SIZE', 100)
+
+logger = logging.getLogger(__name__)
+
+
+def start_rejection_job(queryset, language='', delete=False):
+    """
+    Create a RejectionJob for the applications of ``queryset``, it is run by
+    the jobs_mail_worker command.
+    """
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    return RejectionJob.objects.create(
+        language=language, delete_applications=delete, total=len(pks),
+        applications='\n'.join(force_text(pk) for pk in pks))
+
+
+def retry_rejection_jobs(queryset=None):
+    """
+    Set the failed jobs, or those of ``queryset``, pending again. They
+    resume with the applications whose email was not sent. Returns the
+    number of jobs.
+    """
+    if queryset is None:
+        queryset = RejectionJob.objects.all()
+    return queryset.filter(status=RejectionJob.FAILED).update(
+        status=RejectionJob.PENDING, finished=None, last_error='')
+
+
+class RejectionJobRunner(object):
+    """
+    Runs RejectionJobs: renders the rejection emails in the language of the
+    job, sends the emails of every batch concurrently over the connections
+    of ``pool`` and marks the applications of sent emails as rejected or
+    deletes them.
+
+    A running job is claimed by its runner, which renews the claim after
+    every batch. Jobs whose claim was not renewed for ``lease`` seconds,
+    e.g. because their runner crashed, are claimed again by the next runner
+    and resume with the applications not processed yet.
+    """
+
+    def __init__(self, pool, batch_size=None, lease=600):
+        self.pool = pool
+        self.batch_size = batch_size or REJECTION_BATCH_SIZE
+        self.lease = lease
+        # the asyncio sender of ALDRYN_JOBS_MAIL_ASYNC_SESSIONS, kept for
+        # all the batches until close()
+        self.sender = None
+
+    def claim(self, pk=None):
+        current = now()
+        claimable = RejectionJob.objects.filter(
+            Q(status=RejectionJob.PENDING) |
+            Q(status=RejectionJob.RUNNING,
+              heartbeat__lt=current - timedelta(seconds=self.lease)))
+        if pk is not None:
+            claimable = claimable.filter(pk=pk)
+        for job in claimable.order_by('created')[:1]:
+            claim = uuid4().hex
+            # another runner may have claimed it in the meantime
+            if claimable.filter(pk=job.pk).update(
+                    status=RejectionJob.RUNNING, claim=claim,
+                    started=current, heartbeat=current):
+                return RejectionJob.objects.get(pk=job.pk)
+        return None
+
+    def run_pending(self, pk=None):
+        """
+        Run the pending jobs, or only the one with ``pk``. Returns the
+        number of jobs run.
+        """
+        count = 0
+        while True:
+            job = self.claim(pk)
+            if job is None:
+                return count
+            self.run(job)
+            count += 1
+
+    def run(self, job):
+        all_pks = job.get_application_pks()
+        processed = job.processed
+        renderer = get_email_renderer(
+            'aldryn_jobs/emails/rejection_letter', job.language or None)
+        # applications before ``processed`` are done
+        while processed < len(all_pks):
+            # runners stop once another one claimed their job
+            if not self.renew(job, processed):
+                return False
+            chunk = all_pks[processed:processed + self.batch_size]
+            # applications deleted in the meantime are skipped
+            applications = list(JobApplication.objects.filter(pk__in=chunk))
+            messages = list(renderer.render_many(
+                ([application.email], {'job_application': application})
+                for application in applications))
+            if mail.MAIL_ASYNC_SESSIONS:
+                if self.sender is None:
+                    self.sender = mail.get_async_sender()
+                errors = mail.send_bulk(messages, sender=self.sender)
+            else:
+                errors = [
+                    result if isinstance(result, Exception) else None
+                    for result in self.pool.map(send_message, messages)]
+            failed = dict(
+                (application.pk, error) for application, error
+                in zip(applications, errors) if error is not None)
+            sent = [application.pk for application in applications
+                    if application.pk not in failed]
+            if sent:
+                queryset = JobApplication.objects.filter(pk__in=sent)
+                if job.delete_applications:
+                    delete_applications(queryset)
+                else:
+                    queryset.update(is_rejected=True, rejection_date=now())
+            done = [pk for pk in chunk if pk not in failed]
+            processed += len(done)
+            if failed:
+                # the failed applications move behind the processed ones, a
+                # retry resumes with them
+                all_pks[processed - len(done):processed + len(failed)] = (
+                    done + list(failed))
+                if self.renew(job, processed, all_pks):
+                    self.fail(job, next(iter(failed.values())))
+                return False
+        self.finish(job, status=RejectionJob.DONE, processed=processed)
+        return True
+
+    def renew(self, job, processed, all_pks=None):
+        """
+        Record the progress of ``job``, and the reordered ``all_pks`` if
+        given, and renew its claim. Returns False if another runner claimed
+        it in the meantime.
+        """
+        kwargs = {'processed': processed, 'heartbeat': now()}
+        if all_pks is not None:
+            kwargs['applications'] = '\n'.join(
+                force_text(pk) for pk in all_pks)
+        if RejectionJob.objects.filter(
+                pk=job.pk, claim=job.claim).update(**kwargs):
+            return True
+        logger.warning('Rejection job %s was claimed by another runner.',
+                       job.pk)
+        return False
+
+    def finish(self, job, **kwargs):
+        RejectionJob.objects.filter(pk=job.pk, claim=job.claim).update(
+            claim='', finished=now(), **kwargs)
+
+    def fail(self, job, error):
+        logger.error('Rejection job %s failed: %s', job.pk, error)
+        self.finish(job, status=RejectionJob.FAILED,
+                    last_error=force_text(error) or repr(error))
+
+    def close(self):
+        if self.sender is not None:
+            self.sender.close()
+            self.sender = None
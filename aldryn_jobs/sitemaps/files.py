@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes, force_text
+from django.utils.text import compress_string
+
+# The storage object pre-generated sitemap files are written to, defaults
+# to django.core.files.storage.default_storage.
+SITEMAP_STORAGE = getattr(settings, 'ALDRYN_JOBS_SITEMAP_STORAGE', None)
+SITEMAP_DIR = getattr(settings, 'ALDRYN_JOBS_SITEMAP_DIR', 'sitemaps/')
+
+SITEMAP_TEMPLATE = 'aldryn_jobs/sitemaps/sitemap.xml'
+SITEMAP_INDEX_TEMPLATE = 'aldryn_jobs/sitemaps/sitemap_index.xml'
+
+
+class DomainSite(object):
+    """
+    Stands in for a Site object when writing sitemaps for a given domain.
+    """
+
+    def __init__(self, domain):
+        self.domain = self.name = domain
+
+
+def get_sitemap_file_name(section=None, page=None):
+    if section is None:
+        return '{0}sitemap.xml.gz'.format(SITEMAP_DIR)
+    return '{0}sitemap-{1}-{2}.xml.gz'.format(SITEMAP_DIR, section, page)
+
+
+def get_fingerprint_file_name(section):
+    return '{0}sitemap-{1}.fingerprint'.format(SITEMAP_DIR, section)
+
+
+def save_file(storage, name, content):
+    """
+    Store ``content`` as ``name``, replacing the current file. Storages with
+    local paths replace it atomically with a renamed temporary file, other
+    storages delete it first, so readers may miss it for a moment.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(content))
+    temp_name = storage.save(
+        '{0}.{1}.tmp'.format(name, uuid4().hex), ContentFile(content))
+    # os.rename() does not replace existing files on Windows
+    getattr(os, 'replace', os.rename)(storage.path(temp_name), path)
+    return name
+
+
+def read_file(storage, name):
+    if not storage.exists(name):
+        return None
+    with storage.open(name) as f:
+        return force_text(f.read())
+
+
+def write_sitemap_files(sitemaps, site, protocol='http', storage=None,
+                        force=False):
+    """
+    Render ``sitemaps``, a {section: Sitemap} dict as passed to Django's
+    sitemap views, into gzipped files and a gzipped sitemap index in
+    ``storage``. ``site`` provides the ``domain`` of the URLs. Sections
+    providing a ``fingerprint()`` are only rendered again if it changed
+    since the last run, unless ``force`` is set. Returns the names of the
+    written files.
+    """
+    if storage is None:
+        storage = SITEMAP_STORAGE or default_storage
+    written = []
+    locations = []
+    for section, sitemap in sorted(sitemaps.items()):
+        if callable(sitemap):
+            sitemap = sitemap()
+        pages = sitemap.paginator.page_range
+        fingerprint = None
+        if hasattr(sitemap, 'fingerprint'):
+            fingerprint = force_text(sitemap.fingerprint())
+        fingerprint_name = get_fingerprint_file_name(section)
+        if (force or fingerprint is None or
+                read_file(storage, fingerprint_name) != fingerprint):
+            for page in pages:
+                urls = sitemap.get_urls(
+                    page=page, site=site, protocol=protocol)
+                content = render_to_string(SITEMAP_TEMPLATE, {'urlset': urls})
+                written.append(save_file(
+                    storage, get_sitemap_file_name(section, page),
+                    compress_string(force_bytes(content))))
+            # drop pages left over from a larger catalog
+            page = len(pages) + 1
+            while storage.exists(get_sitemap_file_name(section, page)):
+                storage.delete(get_sitemap_file_name(section, page))
+                page += 1
+            if fingerprint is not None:
+                save_file(storage, fingerprint_name, force_bytes(fingerprint))
+        for page in pages:
+            location = storage.url(get_sitemap_file_name(section, page))
+            if location.startswith('/'):
+                location = '{0}://{1}{2}'.format(
+                    protocol, site.domain, location)
+            locations.append(location)
+
+    if written or not storage.exists(get_sitemap_file_name()):
+        content = render_to_string(
+            SITEMAP_INDEX_TEMPLATE, {'sitemaps': locations})
+        written.append(save_file(
+            storage, get_sitemap_file_name(),
+            compress_string(force_bytes(content))))
+    return written
@@ -1,7 +1,22 @@
 # -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from hashlib import md5
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.db.models import Count, Max
+from django.utils.encoding import force_bytes
+
+from parler.utils.i18n import get_active_language_choices
 
+from ..managers import get_active_q
+from ..cms_appconfig import JobsConfig
 from ..models import JobCategory, JobOpening
+from ..utils import (
+    CATEGORY_SLUG_PLACEHOLDER, JOB_OPENING_SLUG_PLACEHOLDER,
+    fill_url_template, get_url_template,
+)
 
 
 class JobOpeningCategoriesSitemap(Sitemap):
@@ -9,15 +24,229 @@ class JobOpeningCategoriesSitemap(Sitemap):
     priority = 0.5
 
     def items(self):
-        return JobCategory.objects.all()
+        return (
+            JobCategory.objects.select_related('app_config')
+                               .prefetch_related('translations')
+        )
+
+
+class JobOpeningSitemapEntry(object):
+    """
+    A job opening translation as listed in JobOpeningSitemap. Locations are
+    paths, alternates is a list of (language, path) of all translations.
+    """
+
+    def __init__(self, pk, language, location, lastmod, alternates):
+        self.pk = pk
+        self.language = language
+        self.location = location
+        self.lastmod = lastmod
+        self.alternates = alternates
+
+
+class JobOpeningSitemapItems(object):
+    """
+    The items of a JobOpeningSitemap, Django's paginator counts and slices
+    them. Slices are generators: rows are streamed from the database and
+    turned into entries chunk by chunk, see JobOpeningSitemap.get_entries().
+    """
+
+    def __init__(self, sitemap):
+        self.sitemap = sitemap
+
+    def count(self):
+        return self.sitemap.get_queryset().count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.sitemap.iter_entries(
+                self.sitemap.get_queryset()[index])
+        return list(self[index:index + 1])[0]
+
+    def __iter__(self):
+        return self.sitemap.iter_entries(self.sitemap.get_queryset())
 
 
 class JobOpeningSitemap(Sitemap):
+    """
+    Lists one entry per translation of the active job openings, along with
+    hreflang alternates of the other translations, which
+    ``aldryn_jobs/sitemaps/sitemap.xml`` renders. Optionally limited to a
+    namespace and to a set of languages (default: all of
+    ``settings.LANGUAGES``). Large catalogs are split into pages of
+    ``limit`` entries, which Django's sitemap index view lists.
+    """
     changefreq = "monthly"
     priority = 0.5
+    # number of translations whose entries are built at once
+    chunk_size = 500
+
+    def __init__(self, namespace=None, languages=None):
+        self.namespace = namespace
+        if languages is None:
+            languages = [code for code, name in settings.LANGUAGES]
+        self.languages = list(languages)
+        self._url_templates = {}
+
+    def get_queryset(self):
+        args, kwargs = get_active_q(prefix='master__')
+        kwargs['language_code__in'] = self.languages
+        if self.namespace is not None:
+            kwargs['master__app_config__namespace'] = self.namespace
+        return (
+            JobOpening._parler_meta.root_model.objects
+                      .filter(*args, **kwargs)
+                      .exclude(slug='')
+                      .order_by('master_id', 'language_code')
+        )
+
+    def fingerprint(self):
+        """
+        Return a string that changes whenever the entries may change, used
+        to skip regenerating unchanged sitemap files: when job openings are
+        added, edited, deactivated, deleted or their publication periods
+        start or end, when category slugs change and when the apphooked
+        pages are moved or their slugs change.
+        """
+        queryset = self.get_queryset()
+        aggregate = queryset.aggregate(
+            count=Count('pk'), modified=Max('master__modified'))
+        # the listed translations, which change without any edit when
+        # publication periods start or end
+        listed = md5()
+        for pk in queryset.values_list('pk', flat=True).iterator():
+            listed.update(force_bytes('{0},'.format(pk)))
+        parts = ['{count}:{modified}'.format(**aggregate),
+                 listed.hexdigest()]
+        category_translations = (
+            JobCategory._parler_meta.root_model.objects.exclude(slug=''))
+        configs = JobsConfig.objects.all()
+        if self.namespace is not None:
+            category_translations = category_translations.filter(
+                master__app_config__namespace=self.namespace)
+            configs = configs.filter(namespace=self.namespace)
+        parts.extend(
+            '{0}:{1}:{2}'.format(*row) for row in category_translations
+            .order_by('master_id', 'language_code')
+            .values_list('master_id', 'language_code', 'slug'))
+        for namespace in configs.order_by('namespace').values_list(
+                'namespace', flat=True):
+            for language in self.languages:
+                parts.append('{0}:{1}:{2}'.format(
+                    namespace, language,
+                    self.get_url_template(namespace, language)))
+        return md5(force_bytes('|'.join(parts))).hexdigest()
 
     def items(self):
-        return JobOpening.objects.active()
+        return JobOpeningSitemapItems(self)
+
+    def location(self, entry):
+        return entry.location
+
+    def lastmod(self, entry):
+        return entry.lastmod
+
+    def get_urls(self, page=1, site=None, protocol=None):
+        urls = super(JobOpeningSitemap, self).get_urls(
+            page=page, site=site, protocol=protocol)
+        for url in urls:
+            entry = url['item']
+            # 'protocol://domain' as prepended by Django
+            prefix = url['location'][:-len(entry.location)]
+            url['alternates'] = [
+                {'language': language, 'location': prefix + location}
+                for language, location in entry.alternates
+            ]
+        return urls
+
+    def iter_entries(self, queryset):
+        rows = queryset.values_list(
+            'master_id', 'language_code', 'slug', 'master__category_id',
+            'master__app_config__namespace', 'master__modified',
+        ).iterator()
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                for entry in self.get_entries(chunk):
+                    yield entry
+                chunk = []
+        for entry in self.get_entries(chunk):
+            yield entry
+
+    def get_entries(self, rows):
+        """
+        Build the entries of ``rows``, with one query for the translations
+        of the openings (alternates) and one for the category slugs.
+        """
+        if not rows:
+            return []
+        opening_translations = (
+            JobOpening._parler_meta.root_model.objects
+                      .filter(master_id__in=set(row[0] for row in rows),
+                              language_code__in=self.languages)
+                      .exclude(slug='')
+                      .values_list('master_id', 'language_code', 'slug')
+        )
+        translations = {}
+        for pk, language, slug in opening_translations:
+            translations.setdefault(pk, {})[language] = slug
+        category_translations = (
+            JobCategory._parler_meta.root_model.objects
+                       .filter(master_id__in=set(row[3] for row in rows))
+                       .exclude(slug='')
+                       .values_list('master_id', 'language_code', 'slug')
+        )
+        category_slugs = {}
+        for category_id, language, slug in category_translations:
+            category_slugs[(category_id, language)] = slug
+
+        entries = []
+        for pk, language, slug, category_id, namespace, modified in rows:
+            location = self.get_location(
+                namespace, language, category_id, slug, category_slugs)
+            if location is None:
+                continue
+            alternates = []
+            for alternate in self.languages:
+                if alternate not in translations.get(pk, {}):
+                    continue
+                alternate_location = self.get_location(
+                    namespace, alternate, category_id,
+                    translations[pk][alternate], category_slugs)
+                if alternate_location is not None:
+                    alternates.append((alternate, alternate_location))
+            entries.append(JobOpeningSitemapEntry(
+                pk, language, location, modified, alternates))
+        return entries
+
+    def get_location(self, namespace, language, category_id, slug,
+                     category_slugs):
+        # categories are linked in the language of the opening or in one of
+        # its fallbacks, as in JobOpening.get_absolute_url()
+        for category_language in get_active_language_choices(language):
+            category_slug = category_slugs.get(
+                (category_id, category_language))
+            if category_slug:
+                break
+        else:
+            return None
+        url_template = self.get_url_template(namespace, language)
+        if url_template is None:
+            return None
+        return fill_url_template(url_template, **{
+            CATEGORY_SLUG_PLACEHOLDER: category_slug,
+            JOB_OPENING_SLUG_PLACEHOLDER: slug,
+        })
 
-    def lastmod(self, obj):
-        return obj.publication_start
+    def get_url_template(self, namespace, language):
+        key = (namespace, language)
+        if key not in self._url_templates:
+            self._url_templates[key] = get_url_template(
+                namespace, language, 'job-opening-detail',
+                category_slug=CATEGORY_SLUG_PLACEHOLDER,
+                job_opening_slug=JOB_OPENING_SLUG_PLACEHOLDER)
+        return self._url_templates[key]
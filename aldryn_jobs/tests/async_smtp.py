@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+An asyncio SMTP server for the tests, requires Python 3.5 or later.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import threading
+
+from django.core.mail import get_connection
+
+
+class AsyncSMTPStandIn(object):
+    """
+    A local SMTP server in the style of aiosmtpd: an asyncio loop on a thread
+    serves the sessions concurrently, accepts every message after
+    ``latency`` seconds and refuses recipients starting with "refused".
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.messages = []
+        self.sessions = 0
+        self.receiving = 0
+        self.max_receiving = 0
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self.thread = threading.Thread(target=self.serve, args=(started, ))
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+
+    def serve(self, started):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        started.set()
+        self.loop.run_forever()
+        server.close()
+        self.loop.run_until_complete(server.wait_closed())
+        self.loop.close()
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        writer.write(b'220 stand-in\r\n')
+        mailfrom, rcpttos = None, []
+        while True:
+            line = await reader.readline()
+            command = line[:4].upper()
+            if not line or command == b'QUIT':
+                writer.write(b'221 Bye\r\n')
+                break
+            if command == b'MAIL':
+                mailfrom = line[10:].strip()
+            elif command == b'RCPT':
+                if line[8:].strip().lstrip(b'<').startswith(b'refused'):
+                    writer.write(b'550 Refused\r\n')
+                    continue
+                rcpttos.append(line[8:].strip())
+            elif command == b'DATA':
+                writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                data = []
+                while True:
+                    line = await reader.readline()
+                    if line in (b'.\r\n', b''):
+                        break
+                    data.append(line)
+                await self.receive(mailfrom, rcpttos, b''.join(data))
+                mailfrom, rcpttos = None, []
+            writer.write(b'250 OK\r\n')
+            await writer.drain()
+        writer.close()
+
+    async def receive(self, mailfrom, rcpttos, data):
+        self.receiving += 1
+        self.max_receiving = max(self.max_receiving, self.receiving)
+        await asyncio.sleep(self.latency)
+        self.receiving -= 1
+        self.messages.append((mailfrom, rcpttos, data))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def get_connection(self):
+        return get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=self.port)
+
+
+class FakeClock(object):
+    """
+    A clock for RateLimiter which only advances by the delays slept, right
+    when sleeping starts. Records the slept ``delays``.
+    """
+
+    def __init__(self):
+        self.now = 0
+        self.delays = []
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.delays.append(delay)
+        self.now += delay
+        await asyncio.sleep(0)
@@ -16,6 +16,7 @@ from django.utils.translation import override
 from cms import api
 from cms.utils import get_cms_setting
 
+from ..cache import invalidate_apphooked_cache, invalidate_url_cache
 from ..models import JobsConfig, JobCategory, JobOpening
 
 
@@ -173,6 +174,8 @@ class JobsBaseTestCase(TransactionTestCase):
         if app_config:
             app_config.get().delete()
         cache.clear()
+        invalidate_url_cache()
+        invalidate_apphooked_cache()
 
     def create_user(self, user_name, user_password, is_staff=False,
                     is_superuser=False):
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from unittest import skipIf
+
+from django.core.mail import EmailMessage
+from django.test.utils import override_settings
+
+from .. import mail as jobs_mail
+from ..models import JobApplication, RejectionJob
+from ..rejections import RejectionJobRunner, start_rejection_job
+
+from .base import JobsBaseTestCase
+
+try:
+    from ..async_mail import AsyncMailSender, RateLimiter
+    from .async_smtp import AsyncSMTPStandIn, FakeClock
+except (ImportError, SyntaxError):
+    # Python < 3.5
+    AsyncMailSender = AsyncSMTPStandIn = None
+
+
+@skipIf(AsyncMailSender is None, 'Requires Python 3.5 or later.')
+class AsyncMailSenderTestCase(JobsBaseTestCase):
+    template_base = 'aldryn_jobs/emails/rejection_letter'
+
+    def setUp(self):
+        super(AsyncMailSenderTestCase, self).setUp()
+        self.server = AsyncSMTPStandIn(latency=0.02)
+        self.addCleanup(self.server.stop)
+
+    def get_messages(self, count):
+        return [EmailMessage('Subject', 'Body', 'jobs@example.com',
+                             ['applicant{0}@example.com'.format(i)])
+                for i in range(count)]
+
+    def get_sender(self, **kwargs):
+        sender = AsyncMailSender(
+            connection_factory=self.server.get_connection, **kwargs)
+        self.addCleanup(sender.close)
+        return sender
+
+    def test_messages_are_sent_concurrently(self):
+        messages = self.get_messages(12)
+        results = self.get_sender(size=3).send_messages(messages)
+        self.assertEqual([result.message for result in results], messages)
+        self.assertTrue(all(result.sent for result in results))
+        self.assertEqual(len(self.server.messages), 12)
+        # every session keeps its connection open
+        self.assertEqual(self.server.sessions, 3)
+        self.assertEqual(self.server.max_receiving, 3)
+
+    def test_results_are_reported_per_message(self):
+        messages = self.get_messages(4)
+        messages[1].to = ['refused@example.com']
+        results = self.get_sender(size=2).send_messages(messages)
+        self.assertEqual([result.sent for result in results],
+                         [True, False, True, True])
+        self.assertIsNone(results[0].error)
+        self.assertIn('refused@example.com', str(results[1].error))
+        self.assertEqual(len(self.server.messages), 3)
+
+    def test_producers_wait_for_the_sessions(self):
+        received = []
+
+        def produce():
+            for message in self.get_messages(12):
+                # messages produced ahead of the server
+                received.append(len(self.server.messages))
+                yield message
+
+        self.get_sender(size=2, queue_size=2).send_messages(produce())
+        self.assertEqual(len(self.server.messages), 12)
+        # two messages in the sessions, two in the queue, one being put
+        self.assertLessEqual(
+            max(index - count for index, count in enumerate(received)), 5)
+
+    def test_rate_is_limited(self):
+        clock = FakeClock()
+        sender = self.get_sender(size=4, rate=20)
+        sender.get_rate_limiter = lambda: RateLimiter(
+            sender.rate, clock=clock.time, sleep=clock.sleep)
+        sender.send_messages(self.get_messages(10))
+        # the first message is sent right away
+        self.assertAlmostEqual(clock.now, 9 / 20.0)
+        self.assertEqual(len(clock.delays), 9)
+        self.assertEqual(len(self.server.messages), 10)
+
+    def test_sender_keeps_its_sessions(self):
+        sender = self.get_sender(size=2)
+        for i in range(3):
+            sender.send_messages(self.get_messages(4))
+        self.assertEqual(len(self.server.messages), 12)
+        self.assertEqual(self.server.sessions, 2)
+
+
+@skipIf(AsyncMailSender is None, 'Requires Python 3.5 or later.')
+class AsyncBulkMailTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(AsyncBulkMailTestCase, self).setUp()
+        jobs_mail.MAIL_ASYNC_SESSIONS = 2
+        self.server = AsyncSMTPStandIn()
+        self.addCleanup(self.server.stop)
+        job_opening = self.create_default_job_opening(translated=True)
+        for email in ('applicant0@example.com', 'refused@example.com',
+                      'applicant1@example.com'):
+            JobApplication.objects.create(
+                job_opening=job_opening, email=email)
+
+    def tearDown(self):
+        jobs_mail.MAIL_ASYNC_SESSIONS = None
+        super(AsyncBulkMailTestCase, self).tearDown()
+
+    def test_refused_rejections_fail_the_job(self):
+        job = start_rejection_job(JobApplication.objects.all(), 'en')
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.port):
+            runner = RejectionJobRunner(pool=None)
+            self.addCleanup(runner.close)
+            runner.run_pending()
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(
+            sorted(JobApplication.objects.filter(
+                is_rejected=True).values_list('email', flat=True)),
+            ['applicant0@example.com', 'applicant1@example.com'])
+        job = RejectionJob.objects.get(pk=job.pk)
+        self.assertEqual(job.status, RejectionJob.FAILED)
+        self.assertIn('refused@example.com', job.last_error)
+
+    def test_batches_are_sent_over_the_same_sessions(self):
+        JobApplication.objects.filter(email='refused@example.com').update(
+            email='applicant2@example.com')
+        start_rejection_job(JobApplication.objects.all(), 'en')
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.port):
+            runner = RejectionJobRunner(pool=None, batch_size=1)
+            self.addCleanup(runner.close)
+            self.assertEqual(runner.run_pending(), 1)
+        self.assertEqual(len(self.server.messages), 3)
+        # at most the two sessions of one sender, not two per batch
+        self.assertLessEqual(self.server.sessions, 2)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import Client
+from django.utils.timezone import now
+from django.utils.translation import override
+
+from ..cache import (
+    get_apphooked_cache, get_cached_url, get_list_cache_key, set_cached_url,
+)
+from ..cms_appconfig import JobsConfig
+from .. import cache as jobs_cache, models
+from ..models import JobOpening
+from ..utils import namespace_is_apphooked
+from ..views import CategoryJobOpeningList, JobOpeningList
+
+from .base import JobsBaseTestCase
+
+
+class ListCacheTestCase(JobsBaseTestCase):
+    cache_timeout = 3600
+
+    def setUp(self):
+        super(ListCacheTestCase, self).setUp()
+        self.views = (JobOpeningList, CategoryJobOpeningList)
+        for view in self.views:
+            view.cache_timeout = self.cache_timeout
+        self.job_opening = self.create_default_job_opening(translated=True)
+        with override('en'):
+            self.list_url = self.page.get_absolute_url()
+            self.category_url = self.default_category.get_absolute_url()
+
+    def tearDown(self):
+        for view in self.views:
+            view.cache_timeout = 0
+        super(ListCacheTestCase, self).tearDown()
+
+    def test_lists_are_served_from_cache(self):
+        for url in (self.list_url, self.category_url):
+            response = self.client.get(url)
+            self.assertContains(response, self.job_opening.title)
+
+        # bypass signals, cached lists stay as they are
+        JobOpening.objects.filter(pk=self.job_opening.pk).update(
+            is_active=False)
+        for url in (self.list_url, self.category_url):
+            response = self.client.get(url)
+            self.assertContains(response, self.job_opening.title)
+
+    def test_cached_lists_keep_their_headers(self):
+        render_to_response = JobOpeningList.render_to_response
+
+        def render_with_header(view, context, **kwargs):
+            response = render_to_response(view, context, **kwargs)
+            response['X-List'] = 'rendered'
+            return response
+
+        JobOpeningList.render_to_response = render_with_header
+        self.addCleanup(setattr, JobOpeningList, 'render_to_response',
+                        render_to_response)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-List'], 'rendered')
+        cached = self.client.get(self.list_url)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(sorted(cached.items()), sorted(response.items()))
+
+    def test_only_keyset_parameters_are_part_of_the_key(self):
+        self.client.get(self.list_url + '?utm_source=1')
+        JobOpening.objects.filter(pk=self.job_opening.pk).update(
+            is_active=False)
+        response = self.client.get(self.list_url + '?utm_source=2')
+        self.assertContains(response, self.job_opening.title)
+        response = self.client.get(self.list_url + '?after=1')
+        self.assertNotContains(response, self.job_opening.title)
+
+    def test_toolbar_pages_are_not_shared(self):
+        response = self.client.get(self.list_url + '?edit')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(response, 'cms-toolbar')
+
+        response = Client().get(self.list_url)
+        self.assertContains(response, self.job_opening.title)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, 'cms-toolbar')
+
+    def test_private_responses_are_not_cached(self):
+        render_to_response = JobOpeningList.render_to_response
+        headers = {}
+
+        def render_with_headers(view, context, **kwargs):
+            response = render_to_response(view, context, **kwargs)
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        JobOpeningList.render_to_response = render_with_headers
+        self.addCleanup(setattr, JobOpeningList, 'render_to_response',
+                        render_to_response)
+        for headers in ({'Vary': 'Accept-Language, Cookie'},
+                        {'Cache-Control': 'private, max-age=60'},
+                        {'Set-Cookie': 'visitor=1'}):
+            self.client.get(self.list_url)
+            self.assertIsNone(cache.get(
+                get_list_cache_key(self.app_config.namespace, 'en', '', '')))
+
+    def test_lists_are_invalidated_on_publish(self):
+        self.client.get(self.list_url)
+        JobOpening.objects.filter(pk=self.job_opening.pk).update(
+            is_active=False)
+        self.page.publish('en')
+        response = self.client.get(self.list_url)
+        self.assertNotContains(response, self.job_opening.title)
+
+    def test_lists_are_invalidated_on_save(self):
+        for url in (self.list_url, self.category_url):
+            self.client.get(url)
+
+        self.job_opening.is_active = False
+        self.job_opening.save()
+        for url in (self.list_url, self.category_url):
+            response = self.client.get(url)
+            self.assertNotContains(response, self.job_opening.title)
+
+    def test_lists_are_invalidated_on_category_save(self):
+        self.client.get(self.list_url)
+        with override('en'):
+            self.default_category.name = 'Renamed category'
+            self.default_category.save()
+        response = self.client.get(self.list_url)
+        self.assertContains(response, 'Renamed category')
+
+    def test_lists_are_not_cached_for_logged_in_users(self):
+        self.client.login(
+            username=self.staff_user.username,
+            password=self.staff_user_password)
+        self.client.get(self.list_url)
+        JobOpening.objects.filter(pk=self.job_opening.pk).update(
+            is_active=False)
+        response = self.client.get(self.list_url)
+        self.assertNotContains(response, self.job_opening.title)
+
+    def test_timeout_is_capped_at_next_publication_change(self):
+        self.job_opening.publication_end = now() + timedelta(minutes=10)
+        self.job_opening.save()
+        view = JobOpeningList()
+        view.config = self.app_config
+        view.cache_timeout = 7 * 24 * 60 * 60
+        timeout = view.get_cache_timeout()
+        self.assertGreater(timeout, 0)
+        self.assertLessEqual(timeout, 10 * 60)
+
+        self.create_new_job_opening(self.prepare_data(1, update_date=True))
+        # the new opening is published one day from now
+        self.assertLessEqual(view.get_cache_timeout(), 10 * 60)
+        self.job_opening.publication_end = None
+        self.job_opening.save()
+        self.assertLessEqual(view.get_cache_timeout(), 24 * 60 * 60)
+        self.assertGreater(view.get_cache_timeout(), 23 * 60 * 60)
+
+
+class UrlCacheTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(UrlCacheTestCase, self).setUp()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.namespace = self.app_config.namespace
+        self.slugs = (self.default_category.safe_translation_getter(
+            'slug', language_code='en'), self.job_opening.slug)
+
+    def test_urls_are_cached(self):
+        with override('en'):
+            url = self.job_opening.get_absolute_url()
+            category_url = self.default_category.get_absolute_url()
+        self.assertEqual(
+            get_cached_url(self.namespace, 'en', *self.slugs), url)
+        self.assertEqual(
+            get_cached_url(self.namespace, 'en', self.slugs[0]),
+            category_url)
+
+        set_cached_url('/cached/', self.namespace, 'en', *self.slugs)
+        self.assertEqual(self.job_opening.get_absolute_url('en'), '/cached/')
+
+    def test_urls_are_invalidated_on_save(self):
+        url = self.job_opening.get_absolute_url('en')
+        set_cached_url('/cached/', self.namespace, 'en', *self.slugs)
+        self.job_opening.save()
+        self.assertEqual(self.job_opening.get_absolute_url('en'), url)
+
+    def test_urls_are_invalidated_on_slug_change(self):
+        with override('en'):
+            self.job_opening.get_absolute_url()
+            self.job_opening.slug = 'new-slug'
+            self.job_opening.save()
+            self.assertIn('new-slug', self.job_opening.get_absolute_url())
+
+    def test_urls_are_invalidated_on_publish(self):
+        url = self.job_opening.get_absolute_url('en')
+        set_cached_url('/cached/', self.namespace, 'en', *self.slugs)
+        self.page.publish('en')
+        self.assertEqual(self.job_opening.get_absolute_url('en'), url)
+
+
+class ApphookedCacheTestCase(JobsBaseTestCase):
+
+    def test_apphooked_namespaces_are_cached(self):
+        self.assertTrue(namespace_is_apphooked(self.app_config.namespace))
+        self.assertFalse(namespace_is_apphooked('not_apphooked'))
+        self.assertEqual(get_apphooked_cache(), {
+            self.app_config.namespace: True,
+            'not_apphooked': False,
+        })
+
+    def test_cache_is_invalidated_on_publish(self):
+        other_config = JobsConfig.objects.create(namespace='other_config')
+        self.assertFalse(namespace_is_apphooked(other_config.namespace))
+        self.create_page(
+            title='other', slug='other', namespace=other_config.namespace)
+        self.assertTrue(namespace_is_apphooked(other_config.namespace))
+
+
+class RecipientsCacheTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(RecipientsCacheTestCase, self).setUp()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.staff_user.email = 'staff@example.com'
+        self.staff_user.save()
+        self.super_user.email = 'super@example.com'
+        self.super_user.save()
+        self.default_category.supervisors.add(self.staff_user)
+
+    def tearDown(self):
+        models.DEFAULT_SEND_TO = None
+        super(RecipientsCacheTestCase, self).tearDown()
+
+    def get_recipients(self):
+        return sorted(self.job_opening.get_notification_recipients())
+
+    def test_recipients_are_cached(self):
+        models.DEFAULT_SEND_TO = 'jobs@example.com'
+        self.assertEqual(self.get_recipients(),
+                         ['jobs@example.com', 'staff@example.com'])
+        job_opening = JobOpening.objects.get(pk=self.job_opening.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                sorted(job_opening.get_notification_recipients()),
+                ['jobs@example.com', 'staff@example.com'])
+
+    def test_default_recipient_is_not_cached(self):
+        models.DEFAULT_SEND_TO = 'jobs@example.com'
+        self.get_recipients()
+        models.DEFAULT_SEND_TO = 'hr@example.com'
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_recipients(),
+                             ['hr@example.com', 'staff@example.com'])
+        models.DEFAULT_SEND_TO = None
+        self.assertEqual(self.get_recipients(), ['staff@example.com'])
+
+    def test_recipients_expire(self):
+        self.addCleanup(setattr, jobs_cache, 'RECIPIENTS_CACHE_TIMEOUT',
+                        jobs_cache.RECIPIENTS_CACHE_TIMEOUT)
+        jobs_cache.RECIPIENTS_CACHE_TIMEOUT = 0
+        self.get_recipients()
+        with self.assertNumQueries(1):
+            self.get_recipients()
+
+    def test_recipients_are_invalidated_when_supervisors_change(self):
+        category = self.default_category
+        self.assertEqual(self.get_recipients(), ['staff@example.com'])
+        category.supervisors.add(self.super_user)
+        self.assertEqual(self.get_recipients(),
+                         ['staff@example.com', 'super@example.com'])
+        category.supervisors.remove(self.staff_user)
+        self.assertEqual(self.get_recipients(), ['super@example.com'])
+        category.supervisors.clear()
+        self.assertEqual(self.get_recipients(), [])
+
+        # from the side of the users
+        self.staff_user.job_opening_categories.add(category)
+        self.assertEqual(self.get_recipients(), ['staff@example.com'])
+        self.staff_user.job_opening_categories.clear()
+        self.assertEqual(self.get_recipients(), [])
+
+    def test_recipients_are_invalidated_when_emails_change(self):
+        self.assertEqual(self.get_recipients(), ['staff@example.com'])
+        self.staff_user.email = 'hr@example.com'
+        self.staff_user.save(update_fields=['last_login'])
+        self.assertEqual(self.get_recipients(), ['staff@example.com'])
+        self.staff_user.save()
+        self.assertEqual(self.get_recipients(), ['hr@example.com'])
+        self.staff_user.delete()
+        self.assertEqual(self.get_recipients(), [])
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.utils.datastructures import MultiValueDict
+from django.utils.six import StringIO
+from django.utils.translation import override
+
+from .. import models
+from ..digests import collect_digests, send_digests
+from ..forms import JobApplicationForm
+from ..models import JobApplication, JobCategory
+
+from .base import JobsBaseTestCase
+from .test_mail import get_unused_port
+
+
+class DigestTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(DigestTestCase, self).setUp()
+        self.default_category.notifications = JobCategory.NOTIFY_DIGEST
+        self.default_category.save()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        with override('en'):
+            self.other_category = JobCategory.objects.create(
+                name='Other category', app_config=self.app_config,
+                notifications=JobCategory.NOTIFY_DIGEST)
+        self.other_opening = self.create_new_job_opening(
+            self.prepare_data(2, category=self.other_category))
+        self.staff_user.email = 'staff@example.com'
+        self.staff_user.save()
+        self.super_user.email = 'super@example.com'
+        self.super_user.save()
+        self.default_category.supervisors.add(self.staff_user, self.super_user)
+        self.other_category.supervisors.add(self.super_user)
+
+    def tearDown(self):
+        models.DEFAULT_SEND_TO = None
+        super(DigestTestCase, self).tearDown()
+
+    def apply(self, job_opening, i):
+        form = JobApplicationForm(
+            data=self.make_new_values(self.application_values_raw, i),
+            files=MultiValueDict(), job_opening=job_opening)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def get_admin_url(self, application):
+        return 'http://example.com{0}'.format(reverse(
+            'admin:aldryn_jobs_jobapplication_change',
+            args=(application.pk, )))
+
+    def test_supervisors_get_one_digest_per_run(self):
+        applications = [self.apply(self.job_opening, 1),
+                        self.apply(self.job_opening, 2),
+                        self.apply(self.other_opening, 3)]
+        # only the applicants were notified
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(application.email for application in applications))
+        mail.outbox = []
+
+        out = StringIO()
+        call_command('jobs_send_digests', stdout=out)
+        self.assertIn('Sent 2 digest(s) of 3 application(s).', out.getvalue())
+        digests = dict((message.to[0], message) for message in mail.outbox)
+        self.assertEqual(sorted(digests),
+                         ['staff@example.com', 'super@example.com'])
+        self.assertIn('3 new job applications',
+                      digests['super@example.com'].subject)
+        for application in applications:
+            self.assertIn(self.get_admin_url(application),
+                          digests['super@example.com'].body)
+        self.assertNotIn(self.get_admin_url(applications[2]),
+                         digests['staff@example.com'].body)
+        self.assertFalse(JobApplication.objects.filter(digest_pending=True))
+
+        mail.outbox = []
+        self.assertEqual(send_digests(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_applications_stay_pending_if_sending_fails(self):
+        self.apply(self.job_opening, 1)
+        connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=get_unused_port(), timeout=1)
+        self.assertEqual(send_digests(connection=connection), (0, 0))
+        self.assertTrue(JobApplication.objects.get().digest_pending)
+
+    def test_digests_are_collected_with_two_queries(self):
+        models.DEFAULT_SEND_TO = 'super@example.com'
+        for i in range(5):
+            for job_opening in (self.job_opening, self.other_opening):
+                JobApplication.objects.create(
+                    job_opening=job_opening, digest_pending=True,
+                    email='applicant{0}@example.com'.format(i))
+        with self.assertNumQueries(2):
+            applications, digests = collect_digests()
+        self.assertEqual(len(applications), 10)
+        self.assertEqual(
+            [(email, len(digest_applications))
+             for email, digest_applications in digests],
+            [('staff@example.com', 5), ('super@example.com', 10)])
+
+    def test_categories_use_the_setting_of_their_config(self):
+        self.assertTrue(self.job_opening.category.uses_notification_digest())
+        self.default_category.notifications = JobCategory.NOTIFY_CONFIGURED
+        self.default_category.save()
+        category = JobCategory.objects.get(pk=self.default_category.pk)
+        self.assertFalse(category.uses_notification_digest())
+
+        self.app_config.app_data.config.notification_digest = True
+        self.app_config.save()
+        category = JobCategory.objects.get(pk=self.default_category.pk)
+        self.assertTrue(category.uses_notification_digest())
+        self.assertTrue(self.apply(self.job_opening, 1).digest_pending)
+
+        self.other_category.notifications = JobCategory.NOTIFY_IMMEDIATELY
+        self.other_category.save()
+        mail.outbox = []
+        application = self.apply(self.other_opening, 2)
+        self.assertFalse(application.digest_pending)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         [application.email, 'super@example.com'])
@@ -1,6 +1,8 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
+from django.utils.encoding import force_text
 from django.utils.translation import override
 from parler.utils.context import switch_language
 
@@ -50,6 +52,51 @@ class JobsAddTest(JobsBaseTestCase):
             title=title, category=self.default_category)
         self.assertIn(opening, self.default_category.jobs.all())
 
+    def test_job_opening_app_config_follows_category(self):
+        """
+        Check that the denormalized app_config is kept in sync.
+        """
+        opening = JobOpening.objects.create(
+            title='Accountant', category=self.default_category)
+        self.assertEqual(opening.app_config, self.app_config)
+
+        other_config = JobsConfig.objects.create(namespace='other_config')
+        other_category = JobCategory.objects.create(
+            name='Other category', app_config=other_config)
+        opening.category = other_category
+        opening.save()
+        self.assertEqual(
+            JobOpening.objects.get(pk=opening.pk).app_config, other_config)
+
+        other_category.app_config = self.app_config
+        other_category.save()
+        self.assertEqual(
+            JobOpening.objects.get(pk=opening.pk).app_config, self.app_config)
+        self.assertIn(
+            opening, JobOpening.objects.namespace(self.app_config.namespace))
+
+    def test_resolve_job_opening_pk_from_slugs(self):
+        opening = self.create_default_job_opening(translated=True)
+        namespace = self.app_config.namespace
+        for language in ('en', 'de'):
+            category_slug = self.default_category_values[language]['slug']
+            job_slug = self.default_job_values[language]['slug']
+            self.assertEqual(
+                JobOpening.objects.resolve_pk(
+                    namespace, language, category_slug, job_slug),
+                opening.pk)
+            # wrong namespace
+            self.assertIsNone(JobOpening.objects.resolve_pk(
+                'other_namespace', language, category_slug, job_slug))
+            # wrong category
+            self.assertIsNone(JobOpening.objects.resolve_pk(
+                namespace, language, 'other-category', job_slug))
+        # slug from the other language
+        self.assertIsNone(JobOpening.objects.resolve_pk(
+            namespace, 'en',
+            self.default_category_values['en']['slug'],
+            self.default_job_values['de']['slug']))
+
     def test_add_opening_list_plugin_api(self):
         """
         We add an opening to the Plugin and look it up
@@ -440,3 +487,131 @@ class JobApphookTest(JobsBaseTestCase):
             with switch_language(same_name_opening, language):
                 self.assertContains(response_other, same_name_opening.title)
                 self.assertContains(response_other, same_name_opening.lead_in)
+
+
+class JobOpeningListPaginationTest(JobsBaseTestCase):
+
+    def setUp(self):
+        super(JobOpeningListPaginationTest, self).setUp()
+        self.app_config.app_data.config.paginate_by = 2
+        self.app_config.save()
+        with override('en'):
+            self.other_category = JobCategory.objects.create(
+                name='Other category', app_config=self.app_config)
+        self.openings = []
+        for i in range(3):
+            for category in (self.default_category, self.other_category):
+                self.openings.append(self.create_new_job_opening(
+                    self.prepare_data(
+                        '{0}-{1}'.format(category.pk, i),
+                        category=category)))
+
+    def collect_pages(self, url):
+        pages = []
+        querystring = ''
+        while True:
+            response = self.client.get('{0}?{1}'.format(url, querystring))
+            self.assertEqual(response.status_code, 200)
+            page = response.context['keyset_page']
+            pages.append([obj.pk for obj in page])
+            if not page.has_next:
+                break
+            querystring = page.next_querystring
+        return pages, response
+
+    def test_list_view_is_paginated_by_keyset(self):
+        with override('en'):
+            list_url = self.page.get_absolute_url()
+        pages, last_response = self.collect_pages(list_url)
+        # both categories have the same ordering, openings of one category
+        # still have to stay together for {% regroup %}.
+        expected = [
+            opening.pk for opening in sorted(
+                self.openings, key=lambda o: (o.category_id, o.pk))]
+        self.assertEqual([len(page) for page in pages], [2, 2, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+        # walk back from the last page
+        previous_page = last_response.context['keyset_page']
+        self.assertTrue(previous_page.has_previous)
+        response = self.client.get('{0}?{1}'.format(
+            list_url, previous_page.previous_querystring))
+        self.assertEqual(
+            [obj.pk for obj in response.context['keyset_page']], pages[1])
+
+    def test_category_view_is_paginated_by_keyset(self):
+        with override('en'):
+            category_url = self.default_category.get_absolute_url()
+        pages, __ = self.collect_pages(category_url)
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual(sum(pages, []), sorted(
+            opening.pk for opening in self.openings
+            if opening.category_id == self.default_category.pk))
+
+    def test_invalid_keyset_returns_404(self):
+        with override('en'):
+            list_url = self.page.get_absolute_url()
+        response = self.client.get('{0}?after=foo'.format(list_url))
+        self.assertEqual(response.status_code, 404)
+
+
+class JobOpeningPrefetchTest(JobsBaseTestCase):
+
+    def setUp(self):
+        super(JobOpeningPrefetchTest, self).setUp()
+        with override('en'):
+            self.other_category = JobCategory.objects.create(
+                name='Other category', app_config=self.app_config)
+        for i in range(3):
+            for category in (self.default_category, self.other_category):
+                self.create_new_job_opening(self.prepare_data(
+                    '{0}-{1}'.format(category.pk, i), category=category))
+
+    def render_openings(self):
+        openings = (
+            JobOpening.objects.active()
+                              .namespace(self.app_config.namespace)
+                              .language('en')
+                              .active_translations('en')
+                              .prefetch_translations()
+        )
+        return [
+            (opening.title, opening.get_absolute_url(),
+             force_text(opening.category),
+             opening.category.get_absolute_url())
+            for opening in openings
+        ]
+
+    def test_listing_costs_constant_number_of_queries(self):
+        with override('en'):
+            # warm up url resolvers
+            self.render_openings()
+            # do not let parler serve translations from its cache
+            cache.clear()
+            # openings, opening translations and category translations
+            with self.assertNumQueries(3):
+                rendered = self.render_openings()
+        self.assertEqual(len(rendered), 6)
+        self.assertTrue(all(url != '/en/' for row in rendered
+                            for url in (row[1], row[3])))
+
+    def test_prefetched_openings_know_all_their_translations(self):
+        translated = self.create_default_job_opening(translated=True)
+        openings = dict(
+            (opening.pk, opening) for opening in
+            JobOpening.objects.active().namespace(self.app_config.namespace)
+                              .prefetch_translations())
+        opening = openings[translated.pk]
+        self.assertEqual(sorted(opening.get_available_languages()),
+                         ['de', 'en'])
+        self.assertTrue(opening.has_translation('de'))
+        with switch_language(opening, 'de'):
+            self.assertEqual(opening.title,
+                             self.default_job_values['de']['title'])
+        # openings without a German translation fall back to English
+        untranslated = openings[self.other_category.jobs.first().pk]
+        with switch_language(untranslated, 'de'):
+            self.assertEqual(
+                untranslated.title,
+                untranslated.safe_translation_getter(
+                    'title', language_code='en'))
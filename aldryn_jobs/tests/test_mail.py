@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncore
+import email
+import os
+import re
+import shutil
+import smtpd
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+
+from django.core import mail
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.test.utils import override_settings
+from django.utils.datastructures import MultiValueDict
+from django.utils.encoding import force_bytes
+from django.utils.timezone import now
+
+from emailit.api import construct_mail
+
+from .. import mail as jobs_mail
+from ..forms import JobApplicationForm
+from ..mail import (
+    ConnectionPool, OutboxWorker, get_email_renderer, queue_mail, send_bulk,
+    send_email_message,
+)
+from ..models import JobApplication, JobApplicationAttachment, OutboxMessage
+
+from .base import JobsBaseTestCase
+
+
+class SMTPStandIn(smtpd.SMTPServer):
+    """
+    A local SMTP server collecting the messages it receives.
+    """
+
+    def __init__(self):
+        self.socket_map = {}
+        smtpd.SMTPServer.__init__(
+            self, ('127.0.0.1', 0), None, map=self.socket_map)
+        self.port = self.socket.getsockname()[1]
+        self.messages = []
+        self.peers = set()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.01, count=1, map=self.socket_map)
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        # one peer (host, port) per SMTP connection
+        self.peers.add(peer)
+        self.messages.append((mailfrom, rcpttos, data))
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        asyncore.close_all(map=self.socket_map)
+
+    def get_connection(self):
+        return get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=self.port)
+
+
+def get_unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class RefusingEmailBackend(EmailBackend):
+    """
+    Refuses messages to addresses starting with "refused".
+    """
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0].startswith('refused'):
+                raise SMTPRecipientsRefused({message.to[0]: (550, b'No')})
+        return super(RefusingEmailBackend, self).send_messages(messages)
+
+
+class OutboxTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(OutboxTestCase, self).setUp()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.default_category.supervisors.add(self.staff_user)
+        self.staff_user.email = 'staff@example.com'
+        self.staff_user.save()
+        jobs_mail.MAIL_OUTBOX = True
+
+    def tearDown(self):
+        jobs_mail.MAIL_OUTBOX = False
+        super(OutboxTestCase, self).tearDown()
+
+    def queue(self, count):
+        return [
+            queue_mail(['applicant{0}@example.com'.format(i)],
+                       {'job_application': None},
+                       'aldryn_jobs/emails/rejection_letter')
+            for i in range(count)
+        ]
+
+    def test_application_emails_are_queued(self):
+        form = JobApplicationForm(
+            data=self.make_new_values(self.application_values_raw, 1),
+            files=MultiValueDict({'attachments': [
+                SimpleUploadedFile('cv.txt', b'my cv')]}),
+            job_opening=self.job_opening)
+        self.assertTrue(form.is_valid(), form.errors)
+        application = form.save()
+        self.addCleanup(application.delete)
+
+        self.assertEqual(len(mail.outbox), 0)
+        confirmation, notification = OutboxMessage.objects.order_by('pk')
+        self.assertEqual(confirmation.get_recipients(), [application.email])
+        self.assertEqual(confirmation.get_attachment_names(), [])
+        self.assertEqual(notification.get_recipients(), ['staff@example.com'])
+        self.assertEqual(notification.get_attachment_names(),
+                         [application.attachments.get().file.name])
+
+        pool = ConnectionPool(size=1)
+        self.addCleanup(pool.close)
+        self.assertEqual(OutboxWorker(pool).drain(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].attachments,
+                         [('cv.txt', 'my cv', 'text/plain')])
+
+    def test_worker_reuses_connections(self):
+        server = SMTPStandIn()
+        self.addCleanup(server.stop)
+        pool = ConnectionPool(size=3, connection_factory=server.get_connection)
+        self.addCleanup(pool.close)
+        self.queue(20)
+
+        worker = OutboxWorker(pool, batch_size=7)
+        self.assertEqual(worker.drain(), (20, 0))
+        self.assertEqual(
+            sorted(rcpttos[0] for __, rcpttos, __ in server.messages),
+            sorted('applicant{0}@example.com'.format(i) for i in range(20)))
+        self.assertLessEqual(len(server.peers), 3)
+        self.assertEqual(
+            OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(),
+            20)
+
+    def test_failed_messages_are_retried_with_backoff(self):
+        port = get_unused_port()
+        pool = ConnectionPool(size=2, connection_factory=lambda: (
+            get_connection('django.core.mail.backends.smtp.EmailBackend',
+                           host='127.0.0.1', port=port, timeout=1)))
+        self.addCleanup(pool.close)
+        message = self.queue(1)[0]
+        worker = OutboxWorker(pool, max_attempts=3, retry_delay=60)
+
+        self.assertEqual(worker.drain(), (0, 1))
+        message = OutboxMessage.objects.get(pk=message.pk)
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertTrue(message.last_error)
+        self.assertGreater(message.next_attempt,
+                           now() + timedelta(seconds=50))
+
+        # not due yet
+        self.assertEqual(worker.drain(), (0, 0))
+        OutboxMessage.objects.update(next_attempt=now())
+        worker.drain()
+        message = OutboxMessage.objects.get(pk=message.pk)
+        self.assertGreater(message.next_attempt,
+                           now() + timedelta(seconds=110))
+        OutboxMessage.objects.update(next_attempt=now())
+        worker.drain()
+        message = OutboxMessage.objects.get(pk=message.pk)
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+        self.assertEqual(message.attempts, 3)
+
+    def test_claimed_messages_are_not_claimed_again(self):
+        self.queue(5)
+        pool = ConnectionPool(size=1)
+        self.addCleanup(pool.close)
+        first = OutboxWorker(pool, batch_size=3).claim()
+        second = OutboxWorker(pool, batch_size=3).claim()
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(m.pk for m in first) & set(m.pk for m in second))
+
+
+class ReadRecordingStorage(FileSystemStorage):
+    """
+    Records the sizes of all reads from the files it opens.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ReadRecordingStorage, self).__init__(*args, **kwargs)
+        self.reads = []
+
+    def _open(self, name, mode='rb'):
+        f = super(ReadRecordingStorage, self)._open(name, mode)
+        read = f.file.read
+
+        def recording_read(size=-1):
+            data = read(size)
+            self.reads.append(len(data))
+            return data
+        f.file = RecordingFile(f.file, recording_read)
+        return f
+
+
+class RecordingFile(object):
+
+    def __init__(self, f, read):
+        self.f = f
+        self.read = read
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+class AttachmentStreamingTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(AttachmentStreamingTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.storage = ReadRecordingStorage(location=self.location)
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.staff_user.email = 'staff@example.com'
+        self.staff_user.save()
+        self.default_category.supervisors.add(self.staff_user)
+
+    def tearDown(self):
+        jobs_mail.MAIL_STREAM_ATTACHMENTS = False
+        jobs_mail.ATTACHMENT_LINK_THRESHOLD = None
+        shutil.rmtree(self.location)
+        super(AttachmentStreamingTestCase, self).tearDown()
+
+    def apply(self, *files):
+        form = JobApplicationForm(
+            data=self.make_new_values(self.application_values_raw, 1),
+            files=MultiValueDict({'attachments': [
+                SimpleUploadedFile(name, content) for name, content in files]}),
+            job_opening=self.job_opening)
+        self.assertTrue(form.is_valid(), form.errors)
+        application = form.save()
+        self.addCleanup(application.delete)
+        return application
+
+    def test_large_attachments_are_linked(self):
+        jobs_mail.ATTACHMENT_LINK_THRESHOLD = 10
+        self.apply(('cv.txt', b'my cv'), ('portfolio.pdf', b'%PDF' * 100))
+
+        notification = mail.outbox[1]
+        self.assertEqual([filename for filename, content, mimetype
+                          in notification.attachments], ['cv.txt'])
+        url = re.search(r'portfolio.pdf: (\S+)', notification.body).group(1)
+        self.assertTrue(url.startswith('http://example.com/'))
+        self.assertIn(url, notification.alternatives[0][0])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF' * 100)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(self.client.get(url[:-2] + 'x/').status_code, 404)
+
+    def test_expired_links_are_rejected(self):
+        jobs_mail.ATTACHMENT_LINK_THRESHOLD = 0
+        self.apply(('cv.txt', b'my cv'))
+        url = re.search(r'cv.txt: (\S+)', mail.outbox[1].body).group(1)
+        self.assertEqual(mail.outbox[1].attachments, [])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        max_age = jobs_mail.ATTACHMENT_LINK_MAX_AGE
+        jobs_mail.ATTACHMENT_LINK_MAX_AGE = -1
+        try:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        finally:
+            jobs_mail.ATTACHMENT_LINK_MAX_AGE = max_age
+
+    def test_attachments_are_streamed_in_chunks(self):
+        jobs_mail.MAIL_STREAM_ATTACHMENTS = True
+        content = os.urandom(jobs_mail.STREAM_CHUNK_SIZE * 3 + 1000)
+        name = self.storage.save('portfolio.pdf', SimpleUploadedFile(
+            'portfolio.pdf', content))
+        self.storage.save('cv.txt', SimpleUploadedFile('cv.txt', b'my cv'))
+        server = SMTPStandIn()
+        self.addCleanup(server.stop)
+
+        message = EmailMessage(
+            'Subject', 'Hello\n.\n..dots', 'from@example.com',
+            ['to@example.com'])
+        self.assertEqual(send_email_message(
+            message, [name, 'cv.txt'], server.get_connection(),
+            self.storage), 1)
+
+        self.assertLessEqual(max(self.storage.reads),
+                             jobs_mail.STREAM_CHUNK_SIZE)
+        (mailfrom, rcpttos, data), = server.messages
+        self.assertEqual(rcpttos, ['to@example.com'])
+        received = email.message_from_string(
+            force_bytes(data).decode('ascii'))
+        body, pdf, cv = received.get_payload()
+        self.assertEqual(body.get_payload(), 'Hello\n.\n..dots')
+        self.assertEqual(pdf.get_filename(), 'portfolio.pdf')
+        self.assertEqual(pdf.get_content_type(), 'application/pdf')
+        self.assertEqual(pdf.get_payload(decode=True), content)
+        self.assertEqual(cv.get_payload(decode=True), b'my cv')
+
+    def test_notifications_are_streamed_over_smtp(self):
+        jobs_mail.MAIL_STREAM_ATTACHMENTS = True
+        server = SMTPStandIn()
+        self.addCleanup(server.stop)
+        with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.port):
+            application = self.apply(('cv.txt', b'my cv'))
+        self.assertEqual(len(server.messages), 2)
+        __, rcpttos, data = server.messages[1]
+        self.assertEqual(rcpttos, ['staff@example.com'])
+        received = email.message_from_string(
+            force_bytes(data).decode('ascii'))
+        attachment = received.get_payload()[-1]
+        self.assertEqual(
+            attachment.get_filename(),
+            os.path.basename(JobApplicationAttachment.objects.get(
+                application=application).file.name))
+        self.assertEqual(attachment.get_payload(decode=True), b'my cv')
+
+
+class EmailRendererTestCase(JobsBaseTestCase):
+    template_base = 'aldryn_jobs/emails/rejection_letter'
+
+    def setUp(self):
+        super(EmailRendererTestCase, self).setUp()
+        job_opening = self.create_default_job_opening(translated=True)
+        self.applications = [
+            JobApplication.objects.create(
+                job_opening=job_opening, first_name='Applicant {0}'.format(i),
+                email='applicant{0}@example.com'.format(i))
+            for i in range(20)
+        ]
+
+    def get_messages(self):
+        return [([application.email], {'job_application': application})
+                for application in self.applications]
+
+    def test_renderer_renders_like_emailit(self):
+        for language in ('en', 'de'):
+            expected = construct_mail(
+                ['applicant0@example.com'],
+                {'job_application': self.applications[0]},
+                self.template_base, language=language)
+            message, = get_email_renderer(
+                self.template_base, language).render_many(
+                    self.get_messages()[:1])
+            self.assertEqual(message.subject, expected.subject)
+            self.assertEqual(message.body, expected.body)
+            self.assertEqual(message.alternatives, expected.alternatives)
+            self.assertEqual(message.to, expected.to)
+            self.assertIn('Applicant 0', message.body)
+
+    def test_templates_are_loaded_once_per_language(self):
+        loaded = []
+
+        def select_template(names):
+            loaded.append(names[0])
+            return select_template_orig(names)
+
+        select_template_orig = jobs_mail.select_template
+        jobs_mail.select_template = select_template
+        self.addCleanup(setattr, jobs_mail, 'select_template',
+                        select_template_orig)
+        jobs_mail._email_renderers.clear()
+        self.addCleanup(jobs_mail._email_renderers.clear)
+
+        for language in ('en', 'de', 'en', 'de'):
+            rendered = get_email_renderer(
+                self.template_base, language).render_many(self.get_messages())
+            self.assertEqual(len(rendered), len(self.applications))
+        # the subject, text and HTML templates of each language
+        self.assertEqual(len(loaded), 6)
+        self.assertEqual(len(set(loaded)), 6)
+
+
+class SendBulkTestCase(JobsBaseTestCase):
+
+    def test_results_are_reported_per_message(self):
+        messages = [EmailMessage('Subject', 'Body', 'jobs@example.com', [to])
+                    for to in ('applicant0@example.com', 'refused@example.com',
+                               'applicant1@example.com')]
+        errors = send_bulk(messages, connection=RefusingEmailBackend())
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], SMTPRecipientsRefused)
+        self.assertIsNone(errors[2])
+        self.assertEqual([message.to[0] for message in mail.outbox],
+                         ['applicant0@example.com', 'applicant1@example.com'])
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import RequestFactory
+from django.utils.translation import override
+
+from ..menu import JobCategoryMenu, JobOpeningMenu
+from ..models import JobCategory
+
+from .base import JobsBaseTestCase
+
+
+class JobsMenuTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(JobsMenuTestCase, self).setUp()
+        with override('en'):
+            self.other_category = JobCategory.objects.create(
+                name='Other category', app_config=self.app_config)
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.openings = [self.job_opening]
+        self.add_openings(2)
+
+    def add_openings(self, count):
+        for i in range(len(self.openings), len(self.openings) + count):
+            self.openings.append(self.create_new_job_opening(
+                self.prepare_data(i, category=self.other_category)))
+
+    def get_nodes(self, menu_class, language):
+        menu = menu_class(None)
+        menu.instance = self.page
+        request = RequestFactory().get('/')
+        request.LANGUAGE_CODE = language
+        with override(language):
+            return menu.get_nodes(request)
+
+    def test_job_opening_nodes(self):
+        for language in ('en', 'de'):
+            nodes = self.get_nodes(JobOpeningMenu, language)
+            self.assertEqual(
+                [node.id for node in nodes],
+                [opening.pk for opening in self.openings])
+            for node, opening in zip(nodes, self.openings):
+                with override(language):
+                    opening = opening.__class__.objects.language(
+                        language).get(pk=opening.pk)
+                    self.assertEqual(node.title, opening.title)
+                    self.assertEqual(node.get_absolute_url(),
+                                     opening.get_absolute_url())
+
+    def test_inactive_job_openings_are_skipped(self):
+        self.job_opening.is_active = False
+        self.job_opening.save()
+        nodes = self.get_nodes(JobOpeningMenu, 'en')
+        self.assertNotIn(self.job_opening.pk, [node.id for node in nodes])
+
+    def test_category_nodes(self):
+        for language in ('en', 'de'):
+            nodes = self.get_nodes(JobCategoryMenu, language)
+            categories = JobCategory.objects.language(language).order_by(
+                'ordering', 'pk')
+            with override(language):
+                self.assertEqual(
+                    [(node.title, node.get_absolute_url())
+                     for node in nodes],
+                    [(category.name, category.get_absolute_url())
+                     for category in categories])
+
+    def test_nodes_cost_constant_number_of_queries(self):
+        # warm up url resolvers
+        self.get_nodes(JobOpeningMenu, 'en')
+        # category slugs and job openings
+        with self.assertNumQueries(2):
+            self.get_nodes(JobOpeningMenu, 'en')
+        with self.assertNumQueries(1):
+            self.get_nodes(JobCategoryMenu, 'en')
+
+        self.add_openings(10)
+        with self.assertNumQueries(2):
+            nodes = self.get_nodes(JobOpeningMenu, 'en')
+        self.assertEqual(len(nodes), 13)
+
+    def test_no_nodes_for_not_apphooked_namespace(self):
+        menu = JobOpeningMenu(None)
+        menu.instance = None
+        self.assertEqual(menu.get_nodes(RequestFactory().get('/')), [])
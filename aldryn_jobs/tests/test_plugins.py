@@ -195,6 +195,35 @@ class TestJobCategoriesListPlugin(TestAppConfigPluginsMixin,
         self.assertEquals(self.another_category.count(), 1)
         self.assertEquals(self.empty_category.count(), 0)
 
+    def test_categories_list_plugin_counts_in_constant_queries(self):
+        with override('en'):
+            for i in range(5):
+                category = JobCategory.objects.create(
+                    name='Category {0}'.format(i),
+                    app_config=self.app_config)
+                for j in range(i + 1):
+                    JobOpening.objects.create(
+                        title='Job {0} {1}'.format(i, j), category=category)
+            JobOpening.objects.create(
+                title='job inactive',
+                is_active=False,
+                category=self.empty_category)
+
+        plugin = self.plugin_en.aldryn_jobs_jobcategoriesplugin
+        # make sure app_config is loaded beforehand, it is not part of this
+        # test.
+        self.assertEqual(plugin.app_config, self.app_config)
+        # one aggregate query for categories and one for their translations
+        with self.assertNumQueries(2):
+            counts = dict(
+                (category.name, category.active_jobs_count)
+                for category in plugin.categories)
+
+        self.assertEqual(len(counts), 5)
+        for i in range(5):
+            self.assertEqual(counts['Category {0}'.format(i)], i + 1)
+        self.assertNotIn(self.empty_category.name, counts)
+
 
 class TestJobListPlugin(TestAppConfigPluginsMixin,
                         TestPluginFailuresWithDeletedAppHookMixin,
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import sys
+
+from django.db import connection
+from django.test import RequestFactory
+
+from ..models import JobApplication, JobCategory, JobOpening
+from ..views import CategoryJobOpeningList, JobOpeningList
+
+from .base import JobsBaseTestCase
+
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+else:
+    import unittest
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     'Query plans are only checked on SQLite')
+class QueryPlanTestCase(JobsBaseTestCase):
+    """
+    Make sure that the hot paths are served by indexes and do not fall back
+    to a full table scan of the big tables.
+    """
+    checked_tables = [
+        JobOpening._meta.db_table,
+        JobOpening._parler_meta.root_model._meta.db_table,
+        JobCategory._parler_meta.root_model._meta.db_table,
+        JobApplication._meta.db_table,
+    ]
+
+    def setUp(self):
+        super(QueryPlanTestCase, self).setUp()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        for i in range(3):
+            JobApplication.objects.create(
+                job_opening=self.job_opening,
+                **self.make_new_values(self.application_values_raw, i))
+
+    def get_query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN {0}'.format(sql), params)
+            # the last column contains the human readable details.
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullTableScan(self, queryset):
+        plan = self.get_query_plan(queryset)
+        for detail in plan:
+            for table in self.checked_tables:
+                # SQLite < 3.24 says "SCAN TABLE x", newer only "SCAN x".
+                scans = [
+                    'SCAN TABLE {0}'.format(table),
+                    'SCAN {0}'.format(table),
+                ]
+                if any(detail.startswith(scan) for scan in scans):
+                    self.assertIn(
+                        'USING', detail,
+                        'Full table scan of {0}: {1}'.format(
+                            table, '\n'.join(plan)))
+
+    def test_job_opening_list_uses_index(self):
+        view = JobOpeningList()
+        view.config = self.app_config
+        view.namespace = self.app_config.namespace
+        view.language = 'en'
+        self.assertNoFullTableScan(view.get_queryset())
+
+    def test_category_job_opening_list_uses_index(self):
+        view = CategoryJobOpeningList()
+        view.request = RequestFactory().get('/')
+        view.config = self.app_config
+        view.namespace = self.app_config.namespace
+        view.language = 'en'
+        view.kwargs = {
+            'category_slug': self.default_category_values['en']['slug']}
+        self.assertNoFullTableScan(view.get_queryset())
+
+    def test_job_opening_detail_uses_index(self):
+        queryset = JobOpening.objects.namespace(
+            self.app_config.namespace).translated_slugs(
+            'de',
+            self.default_category_values['de']['slug'],
+            self.default_job_values['de']['slug'])
+        self.assertNoFullTableScan(queryset)
+
+    def test_application_changelist_uses_index(self):
+        # ChangeList adds '-pk' to the ordering to make it deterministic.
+        queryset = JobApplication.objects.order_by('-created', '-pk')
+        self.assertNoFullTableScan(queryset)
+        self.assertNoFullTableScan(
+            queryset.filter(job_opening=self.job_opening))
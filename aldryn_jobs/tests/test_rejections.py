@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.utils.six import StringIO
+from django.utils.timezone import now
+
+from ..mail import ConnectionPool
+from ..models import JobApplication, RejectionJob
+from ..rejections import RejectionJobRunner, start_rejection_job
+
+from .base import JobsBaseTestCase
+from .test_mail import RefusingEmailBackend, SMTPStandIn, get_unused_port
+
+
+class RejectionJobTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(RejectionJobTestCase, self).setUp()
+        job_opening = self.create_default_job_opening(translated=True)
+        for i in range(5):
+            JobApplication.objects.create(
+                job_opening=job_opening,
+                email='applicant{0}@example.com'.format(i))
+
+    def get_runner(self, **kwargs):
+        pool = ConnectionPool(size=1, **kwargs)
+        self.addCleanup(pool.close)
+        return RejectionJobRunner(pool, batch_size=2)
+
+    def run_jobs(self, **kwargs):
+        return self.get_runner(**kwargs).run_pending()
+
+    def test_applications_are_rejected_in_batches(self):
+        job = start_rejection_job(JobApplication.objects.all(), 'de')
+        self.assertEqual(len(mail.outbox), 0)
+        server = SMTPStandIn()
+        self.addCleanup(server.stop)
+
+        self.assertEqual(self.run_jobs(
+            connection_factory=server.get_connection), 1)
+        self.assertEqual(len(server.messages), 5)
+        # all batches are sent over the same connection
+        self.assertEqual(len(server.peers), 1)
+        self.assertEqual(
+            JobApplication.objects.filter(is_rejected=True).count(), 5)
+        job = RejectionJob.objects.get(pk=job.pk)
+        self.assertEqual(job.status, RejectionJob.DONE)
+        self.assertEqual((job.processed, job.total), (5, 5))
+
+    def test_applications_are_deleted(self):
+        start_rejection_job(
+            JobApplication.objects.filter(email__in=[
+                'applicant0@example.com', 'applicant1@example.com']),
+            'en', delete=True)
+        self.run_jobs()
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['applicant0@example.com', 'applicant1@example.com'])
+        self.assertEqual(JobApplication.objects.count(), 3)
+        self.assertFalse(JobApplication.objects.filter(is_rejected=True))
+
+    def test_failed_jobs_keep_their_progress(self):
+        job = start_rejection_job(JobApplication.objects.all(), 'en')
+        port = get_unused_port()
+        self.run_jobs(connection_factory=lambda: get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=port, timeout=1))
+        job = RejectionJob.objects.get(pk=job.pk)
+        self.assertEqual(job.status, RejectionJob.FAILED)
+        self.assertEqual(job.processed, 0)
+        self.assertTrue(job.last_error)
+        self.assertFalse(JobApplication.objects.filter(is_rejected=True))
+
+    def test_failed_jobs_are_retried_with_the_unsent_applications(self):
+        JobApplication.objects.filter(email='applicant0@example.com').update(
+            email='refused0@example.com')
+        job = start_rejection_job(JobApplication.objects.all(), 'en')
+        self.run_jobs(connection_factory=RefusingEmailBackend)
+        job = RejectionJob.objects.get(pk=job.pk)
+        self.assertEqual(job.status, RejectionJob.FAILED)
+        self.assertIn('refused0@example.com', job.last_error)
+        # the email of the other application of the batch was sent
+        self.assertEqual(job.processed, 1)
+        self.assertEqual([message.to[0] for message in mail.outbox],
+                         ['applicant1@example.com'])
+
+        JobApplication.objects.filter(email='refused0@example.com').update(
+            email='applicant0@example.com')
+        out = StringIO()
+        call_command('jobs_retry_rejections', stdout=out)
+        self.assertIn('Retrying 1 rejection job(s).', out.getvalue())
+        self.assertEqual(self.run_jobs(connection_factory=EmailBackend), 1)
+        job = RejectionJob.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.processed), (RejectionJob.DONE, 5))
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['applicant{0}@example.com'.format(i) for i in range(5)])
+        self.assertEqual(
+            JobApplication.objects.filter(is_rejected=True).count(), 5)
+
+    def test_jobs_of_stopped_runners_are_resumed(self):
+        job = start_rejection_job(JobApplication.objects.all(), 'en')
+        stopped = self.get_runner()
+        stopped_job = stopped.claim()
+        self.assertEqual(self.run_jobs(), 0)
+
+        RejectionJob.objects.filter(pk=job.pk).update(
+            heartbeat=now() - timedelta(seconds=stopped.lease + 1))
+        self.assertEqual(self.run_jobs(), 1)
+        self.assertEqual(RejectionJob.objects.get(pk=job.pk).status,
+                         RejectionJob.DONE)
+        self.assertEqual(len(mail.outbox), 5)
+        # the stopped runner does not send the emails again
+        self.assertFalse(stopped.run(stopped_job))
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_admin_action_starts_a_job(self):
+        self.super_user.is_staff = True
+        self.super_user.save()
+        self.client.login(username='super',
+                          password=self.super_user_password)
+        response = self.client.post(
+            reverse('admin:aldryn_jobs_jobapplication_changelist'), {
+                'action': 'send_rejection_email_EN',
+                '_selected_action': list(JobApplication.objects.values_list(
+                    'pk', flat=True)),
+            }, follow=True)
+        job = RejectionJob.objects.get()
+        progress_url = reverse('admin:aldryn_jobs_rejectionjob_progress',
+                               args=(job.pk, ))
+        self.assertContains(response, progress_url)
+        self.assertEqual(job.language, 'en')
+
+        self.assertEqual(
+            json.loads(self.client.get(progress_url).content.decode()),
+            {'status': 'pending', 'total': 5, 'processed': 0, 'error': ''})
+        self.run_jobs()
+        self.assertEqual(
+            json.loads(self.client.get(progress_url).content.decode()),
+            {'status': 'done', 'total': 5, 'processed': 5, 'error': ''})
+
+        self.client.logout()
+        self.assertNotEqual(self.client.get(progress_url).status_code, 200)
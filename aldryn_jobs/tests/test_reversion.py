@@ -8,12 +8,20 @@ except ImportError:
     # django-reversion < 1.9
     from reversion import create_revision, get_for_object
 import six
+import time
 
-from django.db import transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.datastructures import MultiValueDict
 from parler.utils.context import switch_language
 
 from aldryn_reversion.core import create_revision as aldryn_create_revision
 
+from reversion.models import Version
+
+from .. import forms
+from ..forms import JobApplicationForm
 from ..models import JobCategory, JobOpening, JobApplication
 from .base import JobsBaseTestCase
 
@@ -598,3 +606,75 @@ class ReversionTestCase(JobsBaseTestCase):
         new_values_1['job_opening'] = job_opening
         for prop in new_values_1.keys():
             self.assertEqual(getattr(application, prop), new_values_1[prop])
+
+
+class ApplicationRevisionsTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(ApplicationRevisionsTestCase, self).setUp()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.default_category.supervisors.add(self.staff_user)
+
+    def tearDown(self):
+        forms.APPLICATION_REVISIONS = 'full'
+        super(ApplicationRevisionsTestCase, self).tearDown()
+
+    def apply(self, i=1):
+        form = JobApplicationForm(
+            data=self.make_new_values(self.application_values_raw, i),
+            files=MultiValueDict({'attachments': [
+                SimpleUploadedFile('cv.txt', b'my cv')]}),
+            job_opening=self.job_opening)
+        self.assertTrue(form.is_valid(), form.errors)
+        application = form.save()
+        self.addCleanup(application.delete)
+        return application
+
+    def test_full_revisions_follow_the_job_opening(self):
+        application = self.apply()
+        version, = get_for_object(application)
+        models = set(v.content_type.model_class()
+                     for v in version.revision.version_set.all())
+        self.assertIn(JobOpening, models)
+        self.assertIn(JobCategory, models)
+
+    def test_shallow_revisions(self):
+        forms.APPLICATION_REVISIONS = 'shallow'
+        application = self.apply()
+        version, = get_for_object(application)
+        self.assertEqual(version.field_dict['email'], application.email)
+        self.assertEqual(
+            sorted(v.object_repr
+                   for v in version.revision.version_set.all()),
+            sorted([str(application), str(application.attachments.get())]))
+        self.assertEqual(
+            len(get_for_object(application.attachments.get())), 1)
+
+    def test_revisions_can_be_turned_off(self):
+        forms.APPLICATION_REVISIONS = None
+        application = self.apply()
+        self.assertEqual(len(get_for_object(application)), 0)
+        self.assertFalse(Version.objects.exists())
+
+    def test_revision_rows_and_latency_per_submission(self):
+        submissions = 5
+        results = {}
+        for i, mode in enumerate(('full', 'shallow', None)):
+            forms.APPLICATION_REVISIONS = mode
+            versions = Version.objects.count()
+            start = time.time()
+            with CaptureQueriesContext(connection) as queries:
+                for j in range(submissions):
+                    self.apply(i * submissions + j)
+            results[mode] = (
+                (Version.objects.count() - versions) / submissions,
+                len(queries) / submissions,
+                (time.time() - start) / submissions,
+            )
+        # rows, queries and seconds per submission
+        full, shallow, off = results['full'], results['shallow'], results[None]
+        self.assertEqual(shallow[0], 2)
+        self.assertEqual(off[0], 0)
+        self.assertGreater(full[0], shallow[0])
+        self.assertGreater(full[1], shallow[1])
+        self.assertGreater(shallow[1], off[1])
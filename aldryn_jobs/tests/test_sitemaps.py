@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import gzip
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import force_text
+from django.utils.timezone import now
+from django.utils.translation import override
+
+from cms.models import Title
+from cms.utils.apphook_reload import reload_urlconf
+
+from ..models import JobCategory, JobOpening
+from ..sitemaps import JobOpeningSitemap
+from ..sitemaps.files import (
+    DomainSite, get_sitemap_file_name, write_sitemap_files,
+)
+
+from .base import JobsBaseTestCase
+
+
+class JobOpeningSitemapTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(JobOpeningSitemapTestCase, self).setUp()
+        self.site = DomainSite('example.com')
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.openings = [self.job_opening]
+        self.add_openings(2)
+
+    def add_openings(self, count):
+        for i in range(len(self.openings), len(self.openings) + count):
+            self.openings.append(self.create_new_job_opening(
+                self.prepare_data(i)))
+
+    def get_expected_urls(self):
+        urls = {}
+        for opening in JobOpening.objects.filter(
+                pk__in=[opening.pk for opening in self.openings]):
+            for language in opening.get_available_languages():
+                urls[(opening.pk, language)] = 'http://example.com{0}'.format(
+                    opening.get_absolute_url(language))
+        return urls
+
+    def get_urls(self, sitemap):
+        urls = []
+        for page in sitemap.paginator.page_range:
+            urls.extend(sitemap.get_urls(page=page, site=self.site))
+        return urls
+
+    def test_one_entry_per_translation(self):
+        urls = self.get_urls(JobOpeningSitemap())
+        expected = self.get_expected_urls()
+        self.assertEqual(
+            dict(((url['item'].pk, url['item'].language), url['location'])
+                 for url in urls),
+            expected)
+        for url in urls:
+            self.assertEqual(
+                dict((alternate['language'], alternate['location'])
+                     for alternate in url['alternates']),
+                dict((language, location)
+                     for (pk, language), location in expected.items()
+                     if pk == url['item'].pk))
+
+    def test_inactive_and_other_namespaces_are_skipped(self):
+        self.job_opening.is_active = False
+        self.job_opening.save()
+        urls = self.get_urls(JobOpeningSitemap())
+        self.assertNotIn(
+            self.job_opening.pk, [url['item'].pk for url in urls])
+
+        other_urls = self.get_urls(JobOpeningSitemap(namespace='other'))
+        self.assertEqual(other_urls, [])
+
+    def test_lastmod_follows_edits(self):
+        sitemap = JobOpeningSitemap(languages=['en'])
+        lastmod = self.get_urls(sitemap)[0]['lastmod']
+        self.job_opening.save()
+        self.assertGreater(self.get_urls(sitemap)[0]['lastmod'], lastmod)
+
+    def test_pages(self):
+        sitemap = JobOpeningSitemap()
+        sitemap.limit = 2
+        self.assertEqual(sitemap.paginator.num_pages, 2)
+        self.assertEqual(
+            sorted((url['item'].pk, url['item'].language)
+                   for url in self.get_urls(sitemap)),
+            sorted(self.get_expected_urls()))
+
+    def test_entries_cost_constant_number_of_queries(self):
+        sitemap = JobOpeningSitemap()
+        sitemap.chunk_size = 2
+        # warm up url resolvers
+        self.get_urls(sitemap)
+        # count, rows and two chunks of two queries (alternates, categories)
+        with self.assertNumQueries(6):
+            sitemap.get_urls(site=self.site)
+
+        sitemap.chunk_size = 100
+        self.add_openings(10)
+        with self.assertNumQueries(4):
+            urls = sitemap.get_urls(site=self.site)
+        self.assertEqual(len(urls), 14)
+
+
+class SitemapFilesTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(SitemapFilesTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(
+            location=self.location, base_url='/media/')
+        self.site = DomainSite('example.com')
+        self.job_opening = self.create_default_job_opening(translated=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+        super(SitemapFilesTestCase, self).tearDown()
+
+    def write(self, sitemaps=None, **kwargs):
+        if sitemaps is None:
+            sitemaps = {'jobs': JobOpeningSitemap()}
+        return write_sitemap_files(
+            sitemaps, self.site, storage=self.storage, **kwargs)
+
+    def read(self, name):
+        with self.storage.open(name) as f:
+            return force_text(gzip.GzipFile(fileobj=BytesIO(f.read())).read())
+
+    def test_files_are_written(self):
+        written = self.write()
+        self.assertEqual(written, [
+            get_sitemap_file_name('jobs', 1),
+            get_sitemap_file_name(),
+        ])
+        sitemap = self.read(get_sitemap_file_name('jobs', 1))
+        for language in ('en', 'de'):
+            url = 'http://example.com{0}'.format(
+                self.job_opening.get_absolute_url(language))
+            self.assertIn('<loc>{0}</loc>'.format(url), sitemap)
+            self.assertIn(
+                'hreflang="{0}" href="{1}"'.format(language, url), sitemap)
+        self.assertIn(
+            '<loc>http://example.com/media/{0}</loc>'.format(
+                get_sitemap_file_name('jobs', 1)),
+            self.read(get_sitemap_file_name()))
+
+    def test_files_are_written_only_if_openings_changed(self):
+        self.write()
+        self.assertEqual(self.write(), [])
+        self.assertEqual(len(self.write(force=True)), 2)
+
+        self.job_opening.save()
+        self.assertEqual(len(self.write()), 2)
+        JobOpening.objects.create(
+            title='New opening', category=JobCategory.objects.get())
+        self.assertEqual(len(self.write()), 2)
+
+    def test_files_are_written_if_publication_periods_pass(self):
+        with override('en'):
+            category = JobCategory.objects.get()
+            ending = JobOpening.objects.create(
+                title='Ending opening', category=category)
+            starting = JobOpening.objects.create(
+                title='Starting opening', category=category)
+        JobOpening.objects.filter(pk__in=[ending.pk, starting.pk]).update(
+            modified=ending.modified)
+        JobOpening.objects.filter(pk=starting.pk).update(
+            publication_start=now() + timedelta(days=1))
+        self.write()
+
+        # one opening ends as another one starts, without any edit
+        JobOpening.objects.filter(pk=ending.pk).update(
+            publication_end=now() - timedelta(minutes=1))
+        JobOpening.objects.filter(pk=starting.pk).update(
+            publication_start=now() - timedelta(minutes=1))
+        self.assertEqual(len(self.write()), 2)
+        sitemap = self.read(get_sitemap_file_name('jobs', 1))
+        self.assertIn(starting.get_absolute_url('en'), sitemap)
+        self.assertNotIn(ending.get_absolute_url('en'), sitemap)
+
+    def test_files_are_written_if_urls_changed(self):
+        self.write()
+        with override('en'):
+            category = JobCategory.objects.get()
+            category.slug = 'renamed-category'
+            category.save()
+        self.assertEqual(len(self.write()), 2)
+        self.assertIn('renamed-category',
+                      self.read(get_sitemap_file_name('jobs', 1)))
+
+        translation = self.job_opening.translations.get(language_code='de')
+        translation.slug = 'umbenannt'
+        translation.save()
+        self.assertEqual(len(self.write()), 2)
+
+        # move the apphooked page
+        Title.objects.filter(page__in=[self.page, self.page.publisher_public],
+                             language='en').update(path='moved')
+        reload_urlconf()
+        self.assertEqual(len(self.write()), 2)
+        self.assertIn('/en/moved/',
+                      self.read(get_sitemap_file_name('jobs', 1)))
+
+    def test_files_are_replaced_without_deleting_them(self):
+        deleted = []
+        delete = self.storage.delete
+        self.storage.delete = lambda name: (deleted.append(name),
+                                            delete(name))
+        self.write()
+        self.write(force=True)
+        self.assertEqual(deleted, [])
+        directory = os.path.dirname(
+            self.storage.path(get_sitemap_file_name()))
+        self.assertEqual(sorted(os.listdir(directory)), [
+            'sitemap-jobs-1.xml.gz', 'sitemap-jobs.fingerprint',
+            'sitemap.xml.gz'])
+        self.assertIn(self.job_opening.get_absolute_url('en'),
+                      self.read(get_sitemap_file_name('jobs', 1)))
+
+    def test_pages_of_larger_catalogs_are_removed(self):
+        sitemap = JobOpeningSitemap()
+        sitemap.limit = 1
+        self.write({'jobs': sitemap})
+        self.assertTrue(self.storage.exists(get_sitemap_file_name('jobs', 2)))
+        self.write({'jobs': JobOpeningSitemap()}, force=True)
+        self.assertFalse(
+            self.storage.exists(get_sitemap_file_name('jobs', 2)))
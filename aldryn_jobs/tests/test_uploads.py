@@ -0,0 +1,672 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.urlresolvers import resolve, reverse
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.six import StringIO
+from django.utils.timezone import now
+from django.utils.translation import override
+
+try:
+    from reversion.revisions import get_for_object
+except ImportError:
+    from reversion import get_for_object
+
+from .. import uploads
+from ..forms import JobApplicationForm
+from ..models import (
+    AttachmentUpload, FailedFileDeletion, JobApplication,
+    JobApplicationAttachment, JobCategory,
+)
+from ..uploads import (
+    AttachmentUploadHandler, StoredUploadedFile, delete_applications,
+    get_attachment_storage, retry_file_deletions, save_attachments,
+)
+
+from .base import JobsBaseTestCase
+
+
+class OperationCounter(object):
+    """
+    Counts the operations running at the same time and records the maximum
+    in ``max_active``. With ``wait_for`` set, operations wait (up to
+    ``timeout`` seconds) until that many of them ran at the same time, so
+    that concurrent callers reach it regardless of the scheduling.
+    """
+
+    def __init__(self, wait_for=None, timeout=5):
+        self.wait_for = wait_for
+        self.timeout = timeout
+        self.active = 0
+        self.max_active = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.condition.notify_all()
+            deadline = time.time() + self.timeout
+            while (self.wait_for and self.max_active < self.wait_for and
+                   time.time() < deadline):
+                self.condition.wait(deadline - time.time())
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.active -= 1
+
+
+class CountingStorage(FileSystemStorage):
+    """
+    A local storage failing to store files named ``fail_on`` and to delete
+    files named ``fail_delete_on``. The concurrent operations are counted by
+    ``counter``.
+    """
+
+    def __init__(self, fail_on=None, fail_delete_on=None, wait_for=None,
+                 **kwargs):
+        super(CountingStorage, self).__init__(**kwargs)
+        self.fail_on = fail_on
+        self.fail_delete_on = fail_delete_on
+        self.counter = OperationCounter(wait_for)
+
+    def _save(self, name, content):
+        with self.counter:
+            if self.fail_on and os.path.basename(name) == self.fail_on:
+                raise IOError('Could not store {0}'.format(name))
+            return super(CountingStorage, self)._save(name, content)
+
+    def delete(self, name):
+        with self.counter:
+            if self.fail_delete_on and (
+                    os.path.basename(name) == self.fail_delete_on):
+                raise IOError('Could not delete {0}'.format(name))
+            return super(CountingStorage, self).delete(name)
+
+
+class Hold(object):
+    """
+    Holds the first call of hold() until release() is called, ``reached``
+    is set once it is held. Later calls pass.
+    """
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.reached = threading.Event()
+        self.released = threading.Event()
+
+    def hold(self):
+        with self.lock:
+            first = not self.reached.is_set()
+            self.reached.set()
+        if first:
+            self.released.wait(self.timeout)
+
+    def release(self):
+        self.released.set()
+
+
+class TransactionRecordingStorage(CountingStorage):
+    """
+    Records whether files are stored within a transaction, and holds the
+    calls at ``hold`` if set.
+    """
+    in_atomic_block = []
+    hold = None
+
+    def _save(self, name, content):
+        self.in_atomic_block.append(connection.in_atomic_block)
+        if self.hold is not None:
+            self.hold.hold()
+        return super(TransactionRecordingStorage, self)._save(name, content)
+
+
+class TransactionRecordingEmailBackend(EmailBackend):
+    """
+    Records whether emails are sent within a transaction, and holds the
+    calls at ``hold`` if set.
+    """
+    in_atomic_block = []
+    hold = None
+
+    def send_messages(self, messages):
+        self.in_atomic_block.append(connection.in_atomic_block)
+        if self.hold is not None:
+            self.hold.hold()
+        return super(TransactionRecordingEmailBackend, self).send_messages(
+            messages)
+
+
+class SaveAttachmentsTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(SaveAttachmentsTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        job_opening = self.create_default_job_opening(translated=True)
+        self.application = JobApplication.objects.create(
+            job_opening=job_opening, email='applicant@example.com')
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+        super(SaveAttachmentsTestCase, self).tearDown()
+
+    def get_files(self, count):
+        return [SimpleUploadedFile('file{0}.txt'.format(i), b'content')
+                for i in range(count)]
+
+    def get_stored_files(self):
+        return [name for root, dirs, files in os.walk(self.location)
+                for name in files]
+
+    def save(self, files, threads, **kwargs):
+        storage = CountingStorage(location=self.location, **kwargs)
+        attachments = save_attachments(
+            self.application, files, storage=storage, threads=threads)
+        return attachments, storage.counter.max_active
+
+    def test_files_are_stored_concurrently(self):
+        sequential, max_active = self.save(self.get_files(4), threads=1)
+        self.assertEqual(max_active, 1)
+        concurrent, max_active = self.save(
+            self.get_files(4), threads=4, wait_for=4)
+        self.assertEqual(max_active, 4)
+        self.assertEqual(len(concurrent), 4)
+        self.assertEqual(
+            JobApplicationAttachment.objects.filter(
+                application=self.application).count(), 8)
+        self.assertEqual(len(self.get_stored_files()), 8)
+
+    def test_rows_are_inserted_at_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            attachments, max_active = self.save(self.get_files(5), threads=4)
+        self.assertEqual(
+            len([query for query in queries.captured_queries
+                 if 'INSERT INTO' in query['sql']]), 1)
+        self.assertEqual(
+            sorted(os.path.basename(attachment.file.name)
+                   for attachment in attachments),
+            ['file{0}.txt'.format(i) for i in range(5)])
+        for attachment in attachments:
+            self.assertEqual(attachment.application, self.application)
+
+    def test_stored_files_are_deleted_if_a_file_fails(self):
+        for threads in (1, 4):
+            with self.assertRaises(IOError):
+                self.save(self.get_files(4), threads=threads,
+                          fail_on='file2.txt')
+            self.assertEqual(self.get_stored_files(), [])
+            self.assertFalse(JobApplicationAttachment.objects.exists())
+
+    def test_application_revision_includes_attachments(self):
+        form_data = self.make_new_values(self.application_values_raw, 1)
+        response = self.client.post(
+            self.create_default_job_opening().get_absolute_url(),
+            dict(form_data, attachments=[
+                SimpleUploadedFile('cv.txt', b'my cv')]))
+        self.assertEqual(response.status_code, 302)
+        attachment = JobApplicationAttachment.objects.get()
+        self.addCleanup(attachment.application.delete)
+        self.assertEqual(
+            len(get_for_object(attachment)), 1)
+
+
+class DeleteApplicationsTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(DeleteApplicationsTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.storage = CountingStorage(location=self.location)
+        job_opening = self.create_default_job_opening(translated=True)
+        for i in range(5):
+            application = JobApplication.objects.create(
+                job_opening=job_opening,
+                email='applicant{0}@example.com'.format(i))
+            save_attachments(application, [
+                SimpleUploadedFile('cv.txt', b'my cv'),
+                SimpleUploadedFile('letter.txt', b'my letter'),
+            ], storage=self.storage)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+        super(DeleteApplicationsTestCase, self).tearDown()
+
+    def get_stored_files(self):
+        return [name for root, dirs, files in os.walk(self.location)
+                for name in files]
+
+    def test_applications_are_deleted_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            deleted = delete_applications(
+                JobApplication.objects.all(), chunk_size=2,
+                storage=self.storage)
+        self.assertEqual(deleted, 5)
+        self.assertFalse(JobApplication.objects.exists())
+        self.assertFalse(JobApplicationAttachment.objects.exists())
+        self.assertEqual(self.get_stored_files(), [])
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'DELETE FROM' in query['sql'] and
+            'aldryn_jobs_jobapplication"' in query['sql']]), 3)
+
+    def test_files_are_deleted_concurrently(self):
+        self.storage.counter = OperationCounter(wait_for=5)
+        delete_applications(JobApplication.objects.all(), chunk_size=5,
+                            storage=self.storage, threads=5)
+        self.assertEqual(self.storage.counter.max_active, 5)
+        self.assertEqual(self.get_stored_files(), [])
+
+    def test_failed_deletions_are_recorded_and_retried(self):
+        self.storage.fail_delete_on = 'cv.txt'
+        delete_applications(
+            JobApplication.objects.filter(email__in=[
+                'applicant0@example.com', 'applicant1@example.com']),
+            storage=self.storage)
+        self.assertEqual(JobApplication.objects.count(), 3)
+        self.assertEqual(sorted(self.get_stored_files()),
+                         ['cv.txt'] * 5 + ['letter.txt'] * 3)
+        self.assertEqual(FailedFileDeletion.objects.count(), 2)
+        self.assertIn('Could not delete',
+                      FailedFileDeletion.objects.first().error)
+
+        self.assertEqual(retry_file_deletions(self.storage), (0, 2))
+        self.assertEqual(
+            list(FailedFileDeletion.objects.values_list(
+                'attempts', flat=True)), [2, 2])
+        self.storage.fail_delete_on = None
+        self.assertEqual(retry_file_deletions(self.storage), (2, 0))
+        self.assertFalse(FailedFileDeletion.objects.exists())
+        self.assertEqual(len(self.get_stored_files()), 6)
+
+
+@override_settings(
+    EMAIL_BACKEND='aldryn_jobs.tests.test_uploads.'
+                  'TransactionRecordingEmailBackend')
+class ApplicationTransactionTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(ApplicationTransactionTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.field = JobApplicationAttachment._meta.get_field('file')
+        self.storage = self.field.storage
+        self.field.storage = TransactionRecordingStorage(
+            location=self.location)
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.default_category.supervisors.add(self.staff_user)
+        self.staff_user.email = 'staff@example.com'
+        self.staff_user.save()
+
+    def tearDown(self):
+        self.field.storage = self.storage
+        TransactionRecordingStorage.in_atomic_block = []
+        TransactionRecordingEmailBackend.in_atomic_block = []
+        TransactionRecordingStorage.hold = None
+        TransactionRecordingEmailBackend.hold = None
+        shutil.rmtree(self.location)
+        super(ApplicationTransactionTestCase, self).tearDown()
+
+    def apply(self, client, i):
+        data = self.make_new_values(self.application_values_raw, i)
+        return client.post(self.job_opening.get_absolute_url(), dict(
+            data, attachments=[SimpleUploadedFile('cv.txt', b'my cv')]))
+
+    def test_files_and_emails_are_handled_outside_the_transaction(self):
+        response = self.apply(self.client, 1)
+        self.assertEqual(response.status_code, 302)
+        application = JobApplication.objects.get()
+        self.addCleanup(application.delete)
+        self.assertEqual(application.attachments.count(), 1)
+        self.assertEqual(TransactionRecordingStorage.in_atomic_block,
+                         [False])
+        self.assertEqual(TransactionRecordingEmailBackend.in_atomic_block,
+                         [False, False])
+        self.assertEqual(len(get_for_object(application)), 1)
+
+    def test_applications_are_not_blocked_by_files_and_emails(self):
+        # the files and emails of an applicant are held while others apply,
+        # which would fail or block if they held the database's write lock
+        storage_hold = TransactionRecordingStorage.hold = Hold()
+        email_hold = TransactionRecordingEmailBackend.hold = Hold()
+        responses = []
+
+        def apply():
+            responses.append(self.apply(Client(), 0).status_code)
+            connection.close()
+
+        thread = threading.Thread(target=apply)
+        thread.start()
+        self.addCleanup(JobApplication.objects.all().delete)
+        try:
+            self.assertTrue(storage_hold.reached.wait(5))
+            self.assertEqual(self.apply(Client(), 1).status_code, 302)
+            storage_hold.release()
+            self.assertTrue(email_hold.reached.wait(5))
+            self.assertEqual(self.apply(Client(), 2).status_code, 302)
+        finally:
+            storage_hold.release()
+            email_hold.release()
+            thread.join()
+
+        self.assertEqual(responses, [302])
+        self.assertEqual(JobApplication.objects.count(), 3)
+        self.assertEqual(JobApplicationAttachment.objects.count(), 3)
+        self.assertEqual(TransactionRecordingStorage.in_atomic_block,
+                         [False] * 3)
+        self.assertEqual(TransactionRecordingEmailBackend.in_atomic_block,
+                         [False] * 6)
+
+
+class ResumableUploadTestCase(JobsBaseTestCase):
+    content = b'0123456789' * 3
+
+    def setUp(self):
+        super(ResumableUploadTestCase, self).setUp()
+        self.job_opening = self.create_default_job_opening(translated=True)
+        self.storage = get_attachment_storage()
+        uploads.UPLOAD_CHUNK_MAX_SIZE = 16
+        with override('en'):
+            self.start_url = reverse(
+                '{0}:attachment-upload-start'.format(self.app_config.namespace))
+
+    def tearDown(self):
+        uploads.UPLOAD_CHUNK_MAX_SIZE = 1024 * 1024
+        uploads.delete_uploads(AttachmentUpload.objects.all())
+        super(ResumableUploadTestCase, self).tearDown()
+
+    def start(self, filename='cv.txt', size=None):
+        if size is None:
+            size = len(self.content)
+        response = self.client.post(
+            self.start_url, {'filename': filename, 'size': size})
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def send(self, token, offset, data, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum is None:
+            checksum = 'sha256 ' + hashlib.sha256(data).hexdigest()
+        if checksum:
+            headers['HTTP_UPLOAD_CHECKSUM'] = checksum
+        response = self.client.patch(
+            self.start_url + token + '/', data,
+            content_type='application/octet-stream', **headers)
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def upload(self):
+        response, data = self.start()
+        token = data['token']
+        self.send(token, 0, self.content[:16])
+        self.send(token, 16, self.content[16:])
+        return AttachmentUpload.objects.get(token=token)
+
+    def apply(self, tokens):
+        return JobApplicationForm(
+            data=dict(self.make_new_values(self.application_values_raw, 1),
+                      upload_tokens=' '.join(tokens)),
+            job_opening=self.job_opening)
+
+    def test_chunks_are_assembled(self):
+        response, data = self.start()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data['offset'], 0)
+        token = data['token']
+
+        response, data = self.send(token, 0, self.content[:16])
+        self.assertEqual(data['offset'], 16)
+        self.assertFalse(data['complete'])
+
+        # resume: a chunk sent again or out of order is rejected
+        response, data = self.send(token, 0, self.content[:16])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(data['offset'], 16)
+        response = self.client.get(self.start_url + token + '/')
+        self.assertEqual(json.loads(response.content.decode('utf-8'))[
+            'offset'], 16)
+
+        response, data = self.send(
+            token, 16, self.content[16:], checksum='sha256 invalid')
+        self.assertEqual(response.status_code, 400)
+        response, data = self.send(token, 16, self.content[16:])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['complete'])
+
+        upload = AttachmentUpload.objects.get(token=token)
+        self.assertEqual(upload.get_chunk_names(), [])
+        self.assertFalse(self.storage.exists(
+            os.path.join(uploads.UPLOAD_CHUNK_DIR, token, '000000000000')))
+        with self.storage.open(upload.file.name) as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_category_slugs_do_not_shadow_uploads(self):
+        # slugs set without the admin form, e.g. by imports
+        with override('en'):
+            for slug in ('uploads', '_uploads', '_attachments'):
+                category = JobCategory.objects.create(
+                    name=slug, slug=slug, app_config=self.app_config)
+                self.assertEqual(
+                    resolve(category.get_absolute_url()).url_name,
+                    'category-job-opening-list')
+        response, data = self.start()
+        self.assertEqual(response.status_code, 201)
+
+    def test_large_files_and_chunks_are_rejected(self):
+        response, data = self.start(size=uploads.ATTACHMENTS_MAX_FILE_SIZE + 1)
+        self.assertEqual(response.status_code, 413)
+        response, data = self.start()
+        response, data = self.send(data['token'], 0, self.content)
+        self.assertEqual(response.status_code, 413)
+
+    def test_application_uses_upload_tokens(self):
+        upload = self.upload()
+        form = self.apply([upload.token])
+        self.assertTrue(form.is_valid(), form.errors)
+        application = form.save()
+        self.addCleanup(application.delete)
+
+        attachment = application.attachments.get()
+        self.assertEqual(attachment.file.name, upload.file.name)
+        with attachment.file as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(AttachmentUpload.objects.exists())
+        # tokens can only be used once
+        self.assertFalse(self.apply([upload.token]).is_valid())
+
+    def test_uploads_used_meanwhile_are_rejected(self):
+        upload = self.upload()
+        first, second = self.apply([upload.token]), self.apply([upload.token])
+        self.assertTrue(first.is_valid(), first.errors)
+        self.assertTrue(second.is_valid(), second.errors)
+        self.addCleanup(first.save().delete)
+        with self.assertRaises(uploads.UploadError):
+            second.save()
+        self.assertEqual(JobApplication.objects.count(), 1)
+        self.assertEqual(JobApplicationAttachment.objects.count(), 1)
+
+    def test_incomplete_and_expired_uploads_are_rejected(self):
+        response, data = self.start()
+        self.send(data['token'], 0, self.content[:16])
+        self.assertFalse(self.apply([data['token']]).is_valid())
+
+        upload = self.upload()
+        AttachmentUpload.objects.filter(pk=upload.pk).update(
+            modified=now() - timedelta(seconds=uploads.UPLOAD_EXPIRY + 1))
+        self.assertFalse(self.apply([upload.token]).is_valid())
+
+    def test_expired_uploads_are_deleted(self):
+        response, data = self.start()
+        self.send(data['token'], 0, self.content[:16])
+        partial = AttachmentUpload.objects.get(token=data['token'])
+        complete = self.upload()
+        current = self.upload()
+        AttachmentUpload.objects.exclude(pk=current.pk).update(
+            modified=now() - timedelta(seconds=uploads.UPLOAD_EXPIRY + 1))
+
+        out = StringIO()
+        call_command('jobs_cleanup_uploads', stdout=out)
+        self.assertIn('Deleted 2 expired upload(s).', out.getvalue())
+        self.assertEqual(list(AttachmentUpload.objects.all()), [current])
+        self.assertFalse(self.storage.exists(partial.get_chunk_names()[0]))
+        self.assertFalse(self.storage.exists(complete.file.name))
+        self.assertTrue(self.storage.exists(current.file.name))
+
+
+class SweepAttachmentsTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(SweepAttachmentsTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.field = JobApplicationAttachment._meta.get_field('file')
+        self.default_storage = self.field.storage
+        self.field.storage = self.storage = FileSystemStorage(
+            location=self.location)
+        job_opening = self.create_default_job_opening(translated=True)
+        application = JobApplication.objects.create(
+            job_opening=job_opening, email='applicant@example.com')
+        self.attachment, = save_attachments(
+            application, [SimpleUploadedFile('cv.txt', b'my cv')])
+        self.upload = AttachmentUpload.objects.create(
+            filename='letter.txt', size=6, offset=6,
+            file=self.save('attachments/2015/01/e/letter.txt', old=True))
+        self.orphans = [
+            self.save('attachments/2015/01/a/cv.txt', old=True),
+            self.save('attachments/2015/01/b/cv.txt', old=True),
+            self.save('attachments/2016/12/c/cv.txt', old=True),
+        ]
+        self.recent = self.save('attachments/2016/12/d/cv.txt')
+        self.chunk = self.save('attachments/chunks/chunk', old=True)
+
+    def tearDown(self):
+        self.field.storage = self.default_storage
+        shutil.rmtree(self.location)
+        super(SweepAttachmentsTestCase, self).tearDown()
+
+    def save(self, name, old=False):
+        name = self.storage.save(name, ContentFile(b'orphan'))
+        if old:
+            mtime = time.time() - 60 * 60 * 48
+            os.utime(self.storage.path(name), (mtime, mtime))
+        return name
+
+    def sweep(self, **options):
+        out = StringIO()
+        call_command('jobs_sweep_attachments', batch_size=2, stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        output = self.sweep(dry_run=True)
+        self.assertEqual(output.splitlines(),
+                         self.orphans + ['Found 3 orphaned file(s).'])
+        for name in self.orphans:
+            self.assertTrue(self.storage.exists(name))
+
+    def test_orphans_are_deleted(self):
+        output = self.sweep()
+        self.assertIn('Deleted 3 orphaned file(s), 0 failed.', output)
+        for name in self.orphans:
+            self.assertFalse(self.storage.exists(name))
+        for name in (self.attachment.file.name, self.upload.file.name,
+                     self.recent, self.chunk):
+            self.assertTrue(self.storage.exists(name))
+
+
+class AttachmentUploadHandlerTestCase(JobsBaseTestCase):
+
+    def setUp(self):
+        super(AttachmentUploadHandlerTestCase, self).setUp()
+        self.location = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(location=self.location)
+        self.job_opening = self.create_default_job_opening(translated=True)
+        uploads.ATTACHMENTS_MAX_FILE_SIZE = 1000
+
+    def tearDown(self):
+        uploads.ATTACHMENTS_MAX_FILE_SIZE = 1024 * 1024 * 5
+        shutil.rmtree(self.location)
+        super(AttachmentUploadHandlerTestCase, self).tearDown()
+
+    def get_files(self, count, size=10):
+        return [SimpleUploadedFile('file{0}.txt'.format(i), b'x' * size)
+                for i in range(count)]
+
+    def get_stored_files(self):
+        return [name for root, dirs, files in os.walk(self.location)
+                for name in files]
+
+    def post(self, files):
+        data = dict(self.make_new_values(self.application_values_raw, 1),
+                    attachments=files)
+        request = RequestFactory().post('/', data)
+        request.upload_handlers.insert(
+            0, AttachmentUploadHandler(request, storage=self.storage))
+        request.FILES
+        return request
+
+    def test_files_are_written_to_the_storage(self):
+        request = self.post(self.get_files(2) + [
+            SimpleUploadedFile('photo.jpg', b'x' * 10)])
+        files = request.FILES.getlist('attachments')
+        self.assertEqual([uploaded.name for uploaded in files],
+                         ['file0.txt', 'file1.txt', 'photo.jpg'])
+        for uploaded in files:
+            self.assertIsInstance(uploaded, StoredUploadedFile)
+            self.assertEqual(uploaded.size, 10)
+            with self.storage.open(uploaded.storage_name) as f:
+                self.assertEqual(f.read(), b'x' * 10)
+        self.assertEqual(request.POST['email'], 'example_1@example.com')
+        self.assertFalse(hasattr(request, 'attachment_upload_error'))
+
+    def test_too_many_files_are_rejected_early(self):
+        request = self.post(
+            self.get_files(uploads.ATTACHMENTS_MAX_COUNT) +
+            self.get_files(2, size=100 * 1024))
+        self.assertIn('Ensure at most', request.attachment_upload_error)
+        self.assertEqual(self.get_stored_files(), [])
+        # the rest of the request was not read
+        self.assertGreater(request._stream.remaining, 0)
+
+    def test_large_files_are_rejected_early(self):
+        request = self.post(
+            self.get_files(1) + self.get_files(1, size=200 * 1024))
+        self.assertIn('exceeded maximum upload size',
+                      request.attachment_upload_error)
+        self.assertEqual(self.get_stored_files(), [])
+        self.assertGreater(request._stream.remaining, 0)
+
+    @override_settings(MIDDLEWARE_CLASSES=[
+        'aldryn_jobs.middleware.AttachmentUploadMiddleware',
+    ] + list(settings.MIDDLEWARE_CLASSES))
+    def test_middleware_sets_up_the_handler(self):
+        # a client loading the overridden middleware
+        client = Client()
+        url = self.job_opening.get_absolute_url()
+        data = self.make_new_values(self.application_values_raw, 1)
+
+        response = client.post(url, dict(
+            data, attachments=self.get_files(1, size=2000)))
+        self.assertContains(response, 'exceeded maximum upload size')
+        self.assertFalse(JobApplication.objects.exists())
+
+        response = client.post(url, dict(
+            data, attachments=self.get_files(2)))
+        self.assertEqual(response.status_code, 302)
+        application = JobApplication.objects.get()
+        self.addCleanup(application.delete)
+        for attachment in application.attachments.all():
+            with attachment.file as f:
+                self.assertEqual(f.read(), b'x' * 10)
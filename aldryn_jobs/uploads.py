@@ -0,0 +1,744 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import islice
+from os.path import join as join_path
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, StopFutureHandlers, StopUpload,
+)
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import force_text
+from django.utils.six.moves import queue
+from django.utils.timezone import now
+from django.utils.translation import ugettext as _
+
+from multiupload.fields import MultiUploadMetaField
+
+from .models import (
+    AttachmentUpload, FailedFileDeletion, JobApplication,
+    JobApplicationAttachment,
+)
+
+ATTACHMENTS_MAX_COUNT = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENTS_MAX_COUNT', 5)
+ATTACHMENTS_MIN_COUNT = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENTS_MIN_COUNT', 0)
+ATTACHMENTS_MAX_FILE_SIZE = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENTS_MAX_FILE_SIZE', 1024 * 1024 * 5)
+# Number of attachments of an application stored at the same time.
+ATTACHMENT_UPLOAD_THREADS = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENT_UPLOAD_THREADS', 4)
+# Max size in bytes of a chunk of a resumable upload.
+UPLOAD_CHUNK_MAX_SIZE = getattr(
+    settings, 'ALDRYN_JOBS_UPLOAD_CHUNK_MAX_SIZE', 1024 * 1024)
+# Seconds after the last chunk until unused uploads are deleted.
+UPLOAD_EXPIRY = getattr(settings, 'ALDRYN_JOBS_UPLOAD_EXPIRY', 60 * 60 * 24)
+UPLOAD_CHUNK_DIR = getattr(
+    settings, 'ALDRYN_JOBS_UPLOAD_CHUNK_DIR', 'attachments/chunks/')
+UPLOAD_CHECKSUM_ALGORITHMS = ('md5', 'sha1', 'sha256')
+# Number of applications deleted per query by delete_applications().
+DELETE_CHUNK_SIZE = getattr(settings, 'ALDRYN_JOBS_DELETE_CHUNK_SIZE', 100)
+# Number of stored files looked up at once by find_orphaned_files().
+SWEEP_BATCH_SIZE = 500
+# Number of attachment files deleted at the same time.
+ATTACHMENT_DELETE_THREADS = getattr(
+    settings, 'ALDRYN_JOBS_ATTACHMENT_DELETE_THREADS', 4)
+
+logger = logging.getLogger(__name__)
+
+
+def map_in_threads(func, items, threads):
+    """
+    Call ``func(item)`` for all ``items`` on at most ``threads`` threads.
+    Returns the results in the order of ``items``, exceptions raised by
+    ``func`` are returned as results.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    tasks = queue.Queue()
+    for index, item in enumerate(items):
+        tasks.put((index, item))
+
+    def work():
+        while True:
+            try:
+                index, item = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = func(item)
+            except Exception as e:
+                results[index] = e
+
+    workers = [threading.Thread(target=work)
+               for i in range(min(threads, len(items)))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def delete_files(names, storage):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.exception('Could not delete attachment file %s.', name)
+
+
+def store_attachments(application, files, storage=None, threads=None):
+    """
+    Store the uploaded ``files`` of ``application`` concurrently and return
+    their names. If storing a file fails, the files stored so far are
+    deleted again and the exception is raised.
+    """
+    files = list(files)
+    if not files:
+        return []
+    field = JobApplicationAttachment._meta.get_field('file')
+    storage = storage or field.storage
+    if threads is None:
+        threads = ATTACHMENT_UPLOAD_THREADS
+
+    def store(uploaded):
+        if isinstance(uploaded, StoredUploadedFile):
+            # already stored by AttachmentUploadHandler
+            return uploaded.storage_name
+        attachment = JobApplicationAttachment(application=application)
+        name = field.generate_filename(attachment, uploaded.name)
+        return storage.save(name, uploaded)
+
+    if threads > 1:
+        names = map_in_threads(store, files, threads)
+    else:
+        names = []
+        for uploaded in files:
+            try:
+                names.append(store(uploaded))
+            except Exception as e:
+                names.append(e)
+                break
+    errors = [name for name in names if isinstance(name, Exception)]
+    names = [name for name in names if not isinstance(name, Exception)]
+    if errors:
+        delete_files(names, storage)
+        raise errors[0]
+    return names
+
+
+def save_attachments(application, files, storage=None, threads=None):
+    """
+    Store the uploaded ``files`` of ``application`` concurrently, then
+    insert their JobApplicationAttachment rows at once. If storing a file or
+    inserting the rows fails, the files stored so far are deleted again and
+    the exception is raised.
+    """
+    storage = storage or get_attachment_storage()
+    names = store_attachments(application, files, storage, threads)
+    try:
+        return create_attachments(application, names)
+    except Exception:
+        delete_files(names, storage)
+        raise
+
+
+def create_attachments(application, names):
+    """
+    Insert the JobApplicationAttachment rows of the stored files ``names``
+    at once.
+    """
+    if not names:
+        return []
+    JobApplicationAttachment.objects.bulk_create([
+        JobApplicationAttachment(application=application, file=name)
+        for name in names
+    ])
+    # bulk_create() neither sets primary keys nor sends post_save, which
+    # adds the attachments to the current revision
+    attachments = list(
+        JobApplicationAttachment.objects.filter(
+            application=application, file__in=names).order_by('pk'))
+    using = router.db_for_write(JobApplicationAttachment)
+    for attachment in attachments:
+        post_save.send(sender=JobApplicationAttachment, instance=attachment,
+                       created=True, update_fields=None, raw=False,
+                       using=using)
+    return attachments
+
+
+class UploadError(Exception):
+    """
+    A rejected request of a resumable upload, ``status`` is the HTTP status
+    code of the response.
+    """
+
+    def __init__(self, message, status=400, **data):
+        super(UploadError, self).__init__(message)
+        self.status = status
+        self.data = data
+
+
+def get_attachment_storage():
+    return JobApplicationAttachment._meta.get_field('file').storage
+
+
+def start_upload(filename, size):
+    """
+    Create an AttachmentUpload of a file ``filename`` of ``size`` bytes.
+    """
+    filename = os.path.basename(filename or '')
+    if not filename:
+        raise UploadError(_('No file name was given.'))
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError(_('No file size was given.'))
+    if size <= 0:
+        raise UploadError(_('The file is empty.'))
+    if size > ATTACHMENTS_MAX_FILE_SIZE:
+        raise UploadError(_('The file is too large.'), status=413)
+    return AttachmentUpload.objects.create(filename=filename, size=size)
+
+
+def verify_checksum(data, checksum):
+    """
+    Check ``data`` against an Upload-Checksum header value like
+    ``sha256 <hex digest>``.
+    """
+    try:
+        algorithm, digest = checksum.split(None, 1)
+    except ValueError:
+        raise UploadError(_('The checksum is invalid.'))
+    algorithm = algorithm.lower()
+    if algorithm not in UPLOAD_CHECKSUM_ALGORITHMS:
+        raise UploadError(_('The checksum algorithm is not supported.'))
+    expected = hashlib.new(algorithm, data).hexdigest()
+    if not constant_time_compare(expected, digest.strip().lower()):
+        raise UploadError(_('The checksum does not match the chunk.'))
+
+
+def append_chunk(upload, offset, data, checksum=None, storage=None):
+    """
+    Store chunk ``data`` of ``upload`` starting at byte ``offset``, which
+    must be the number of bytes received so far. Once all bytes are
+    received, the chunks are assembled into ``upload.file``.
+    """
+    storage = storage or get_attachment_storage()
+    if upload.is_complete:
+        raise UploadError(_('The upload is already complete.'), status=409,
+                          offset=upload.offset)
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise UploadError(_('No offset was given.'))
+    if offset != upload.offset:
+        raise UploadError(_('The offset does not match the upload.'),
+                          status=409, offset=upload.offset)
+    if not data:
+        raise UploadError(_('The chunk is empty.'))
+    if len(data) > UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadError(_('The chunk is too large.'), status=413)
+    if offset + len(data) > upload.size:
+        raise UploadError(_('The chunk exceeds the file size.'))
+    if checksum:
+        verify_checksum(data, checksum)
+
+    name = join_path(
+        UPLOAD_CHUNK_DIR, upload.token, '{0:012d}'.format(offset))
+    name = storage.save(name, File(BytesIO(data)))
+    chunks = '\n'.join(upload.get_chunk_names() + [name])
+    # a concurrent request for the same offset wins or loses as a whole
+    updated = AttachmentUpload.objects.filter(
+        pk=upload.pk, offset=offset).update(
+        offset=offset + len(data), chunks=chunks, modified=now())
+    if not updated:
+        delete_files([name], storage)
+        upload = AttachmentUpload.objects.get(pk=upload.pk)
+        raise UploadError(_('The offset does not match the upload.'),
+                          status=409, offset=upload.offset)
+    upload.offset += len(data)
+    upload.chunks = chunks
+    if upload.offset == upload.size:
+        assemble_upload(upload, storage)
+    return upload
+
+
+class ChunksReader(object):
+    """
+    Reads the stored chunk files ``names`` as one file.
+    """
+
+    def __init__(self, names, storage):
+        self.names = names
+        self.storage = storage
+        self.seek(0)
+
+    def seek(self, position):
+        if position != 0:
+            raise IOError('Chunks can only be read from the start.')
+        self.close()
+        self.pending = list(self.names)
+
+    def close(self):
+        if getattr(self, 'current', None) is not None:
+            self.current.close()
+        self.current = None
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(64 * 1024), b''))
+        while True:
+            if self.current is None:
+                if not self.pending:
+                    return b''
+                self.current = self.storage.open(self.pending.pop(0), 'rb')
+            data = self.current.read(size)
+            if data:
+                return data
+            self.close()
+
+
+def assemble_upload(upload, storage=None):
+    """
+    Store the chunks of a complete ``upload`` as its file, named as the
+    attachment files are, and delete the chunks.
+    """
+    storage = storage or get_attachment_storage()
+    chunk_names = upload.get_chunk_names()
+    content = File(ChunksReader(chunk_names, storage), name=upload.filename)
+    content.size = upload.size
+    field = JobApplicationAttachment._meta.get_field('file')
+    name = field.generate_filename(
+        JobApplicationAttachment(), upload.filename)
+    try:
+        name = storage.save(name, content)
+    finally:
+        content.close()
+    upload.file = name
+    upload.chunks = ''
+    upload.save(update_fields=['file', 'chunks', 'modified'])
+    delete_files(chunk_names, storage)
+    return upload
+
+
+def get_completed_uploads(tokens):
+    """
+    Return the complete, not expired uploads of ``tokens``.
+    """
+    return (
+        AttachmentUpload.objects
+                        .filter(token__in=tokens,
+                                modified__gte=get_upload_expiry_date())
+                        .exclude(file='')
+                        .exclude(file__isnull=True)
+    )
+
+
+def consume_uploads(uploads):
+    """
+    Delete the rows of ``uploads``, whose files were taken over by the
+    attachments of an application. The rows are locked first, raises
+    UploadError if another application used any of them meanwhile.
+    """
+    pks = [upload.pk for upload in uploads]
+    locked = list(AttachmentUpload.objects.select_for_update()
+                                          .filter(pk__in=pks)
+                                          .values_list('pk', flat=True))
+    if len(locked) == len(pks):
+        deleted = AttachmentUpload.objects.filter(pk__in=locked).delete()
+        # Django < 1.9 does not return the number of deleted rows
+        if deleted is None or deleted[0] == len(pks):
+            return
+    raise UploadError(_('Some attachments were used by another application, '
+                        'please upload them again.'), status=409)
+
+
+def get_upload_expiry_date():
+    return now() - timedelta(seconds=UPLOAD_EXPIRY)
+
+
+def delete_uploads(uploads, storage=None):
+    """
+    Delete ``uploads`` along with their stored chunks and files.
+    """
+    storage = storage or get_attachment_storage()
+    uploads = list(uploads)
+    names = []
+    for upload in uploads:
+        names.extend(upload.get_chunk_names())
+        if upload.file:
+            names.append(upload.file.name)
+    AttachmentUpload.objects.filter(
+        pk__in=[upload.pk for upload in uploads]).delete()
+    delete_files(names, storage)
+    return len(uploads)
+
+
+def delete_expired_uploads(storage=None):
+    """
+    Delete the uploads which were neither completed nor used by an
+    application within ALDRYN_JOBS_UPLOAD_EXPIRY seconds.
+    """
+    return delete_uploads(
+        AttachmentUpload.objects.filter(
+            modified__lt=get_upload_expiry_date()),
+        storage)
+
+
+def delete_attachment_files(names, storage=None, threads=None):
+    """
+    Delete the files ``names`` of the attachment storage on at most
+    ``threads`` threads. Files which could not be deleted are recorded as
+    FailedFileDeletion to be retried, their number is returned.
+    """
+    storage = storage or get_attachment_storage()
+    if threads is None:
+        threads = ATTACHMENT_DELETE_THREADS
+    names = list(names)
+    results = map_in_threads(storage.delete, names, threads)
+    failed = [
+        FailedFileDeletion(name=name, error=force_text(result))
+        for name, result in zip(names, results)
+        if isinstance(result, Exception)
+    ]
+    for deletion in failed:
+        logger.warning('Could not delete attachment file %s: %s',
+                       deletion.name, deletion.error)
+    FailedFileDeletion.objects.bulk_create(failed)
+    return len(failed)
+
+
+def delete_applications(queryset, chunk_size=None, storage=None,
+                        threads=None):
+    """
+    Delete the applications of ``queryset`` along with their attachments,
+    ``chunk_size`` applications per transaction. The names of the
+    attachment files are gathered up front, the files of a chunk are
+    deleted concurrently once its rows are deleted. Returns the number of
+    deleted applications.
+    """
+    if chunk_size is None:
+        chunk_size = DELETE_CHUNK_SIZE
+    names = defaultdict(list)
+    for application_id, name in JobApplicationAttachment.objects.filter(
+            application__in=queryset).values_list('application_id', 'file'):
+        if name:
+            names[application_id].append(name)
+    pks = list(queryset.order_by().values_list('pk', flat=True))
+    for start in range(0, len(pks), chunk_size):
+        chunk = pks[start:start + chunk_size]
+        with transaction.atomic():
+            # without attachments, cleanup_attachments has nothing to do
+            JobApplicationAttachment.objects.filter(
+                application__in=chunk).delete()
+            JobApplication.objects.filter(pk__in=chunk).delete()
+        delete_attachment_files(
+            [name for pk in chunk for name in names[pk]], storage, threads)
+    return len(pks)
+
+
+def retry_file_deletions(storage=None, threads=None, chunk_size=None):
+    """
+    Retry to delete the files recorded as FailedFileDeletion. Returns the
+    numbers of deleted files and of files which failed again.
+    """
+    storage = storage or get_attachment_storage()
+    if threads is None:
+        threads = ATTACHMENT_DELETE_THREADS
+    if chunk_size is None:
+        chunk_size = DELETE_CHUNK_SIZE
+    deleted = failed = last_pk = 0
+    while True:
+        deletions = list(FailedFileDeletion.objects.filter(
+            pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not deletions:
+            break
+        last_pk = deletions[-1].pk
+        results = map_in_threads(
+            storage.delete, [deletion.name for deletion in deletions],
+            threads)
+        done = []
+        for deletion, result in zip(deletions, results):
+            if isinstance(result, Exception):
+                FailedFileDeletion.objects.filter(pk=deletion.pk).update(
+                    attempts=F('attempts') + 1, error=force_text(result),
+                    modified=now())
+                failed += 1
+            else:
+                done.append(deletion.pk)
+        FailedFileDeletion.objects.filter(pk__in=done).delete()
+        deleted += len(done)
+    return deleted, failed
+
+
+def iter_stored_files(storage, path):
+    """
+    Yield the names of the files below ``path``, listing one directory at a
+    time.
+    """
+    dirs, files = storage.listdir(path)
+    for name in sorted(files):
+        yield join_path(path, name)
+    for directory in sorted(dirs):
+        for name in iter_stored_files(storage, join_path(path, directory)):
+            yield name
+
+
+def iter_attachment_files(storage=None, root='attachments'):
+    """
+    Yield the names of the files stored in the ``root``/YYYY/MM/ directories
+    of default_jobs_attachment_upload_to, month by month.
+    """
+    storage = storage or get_attachment_storage()
+    if not storage.exists(root):
+        return
+    years, __ = storage.listdir(root)
+    for year in sorted(year for year in years if year.isdigit()):
+        months, __ = storage.listdir(join_path(root, year))
+        for month in sorted(month for month in months if month.isdigit()):
+            for name in iter_stored_files(
+                    storage, join_path(root, year, month)):
+                yield name
+
+
+def is_older(name, storage, date):
+    try:
+        return storage.modified_time(name) < date
+    except NotImplementedError:
+        return True
+
+
+def find_orphaned_files(storage=None, root='attachments', min_age=0,
+                        batch_size=None):
+    """
+    Yield the names of the stored attachment files which belong neither to
+    an attachment nor to a resumable upload, looked up ``batch_size`` files
+    at a time. Files modified within the last ``min_age`` seconds are
+    skipped, they may belong to an application being submitted.
+    """
+    storage = storage or get_attachment_storage()
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    # Storage.modified_time() returns naive local times
+    date = datetime.now() - timedelta(seconds=min_age)
+    names = iter_attachment_files(storage, root)
+    while True:
+        batch = list(islice(names, batch_size))
+        if not batch:
+            return
+        known = set(JobApplicationAttachment.objects.filter(
+            file__in=batch).values_list('file', flat=True))
+        known.update(AttachmentUpload.objects.filter(
+            file__in=batch).values_list('file', flat=True))
+        for name in batch:
+            if name not in known and is_older(name, storage, date):
+                yield name
+
+
+class StorageWriter(object):
+    """
+    Stores a file while it is written: storage.save() runs on a thread and
+    reads the written chunks as they arrive, at most ``max_chunks`` of them
+    are buffered in between.
+    """
+
+    def __init__(self, storage, name, max_chunks=2):
+        self.storage = storage
+        self.name = storage.get_available_name(name)
+        self.chunks = queue.Queue(maxsize=max_chunks)
+        self.buffer = b''
+        self.eof = False
+        self.error = None
+        self.stored_name = None
+        self.thread = threading.Thread(target=self.store)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def store(self):
+        try:
+            self.stored_name = self.storage.save(
+                self.name, File(self, name=self.name))
+        except Exception as e:
+            self.error = e
+
+    # file interface read by the storage
+
+    def seek(self, position):
+        if position != 0 or self.buffer or self.eof:
+            raise IOError('A streamed file can only be read once.')
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or
+                                len(self.buffer) < size):
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.eof = True
+            elif chunk is StopUpload:
+                raise IOError('The upload was aborted.')
+            else:
+                self.buffer += chunk
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        pass
+
+    # interface of the upload handler
+
+    def put(self, item):
+        while self.thread.is_alive():
+            try:
+                self.chunks.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def write(self, data):
+        if not self.put(data):
+            raise self.error or IOError('The file could not be stored.')
+
+    def finish(self):
+        """
+        Wait until the file is stored, returns its name in the storage.
+        """
+        self.put(None)
+        self.thread.join()
+        if self.error is not None:
+            self.delete()
+            raise self.error
+        return self.stored_name
+
+    def abort(self):
+        self.put(StopUpload)
+        self.thread.join()
+        self.delete()
+
+    def delete(self):
+        delete_files([self.stored_name or self.name], self.storage)
+
+
+class StoredUploadedFile(UploadedFile):
+    """
+    An uploaded file which AttachmentUploadHandler stored as
+    ``storage_name`` already.
+    """
+
+    def __init__(self, storage, storage_name, *args, **kwargs):
+        super(StoredUploadedFile, self).__init__(None, *args, **kwargs)
+        self.storage = storage
+        self.storage_name = storage_name
+
+    def open(self, mode='rb'):
+        self.file = self.storage.open(self.storage_name, mode)
+        return self
+
+    def delete(self):
+        delete_files([self.storage_name], self.storage)
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """
+    Streams the attachments posted with an application directly to the
+    attachment storage. Stops reading the request as soon as it exceeds
+    ALDRYN_JOBS_ATTACHMENTS_MAX_COUNT or ALDRYN_JOBS_ATTACHMENTS_MAX_FILE_SIZE,
+    the error is then set as ``request.attachment_upload_error``. Files of
+    other fields are left to the next handlers.
+    """
+    attachments_field = 'attachments'
+    # allowance for the other fields of the form in the request size limit
+    form_data_max_size = 1024 * 1024
+
+    def __init__(self, request=None, storage=None):
+        super(AttachmentUploadHandler, self).__init__(request)
+        self.storage = storage or get_attachment_storage()
+        self.request_size = None
+        self.count = 0
+        self.received = 0
+        self.writer = None
+        self.files = []
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        self.request_size = content_length
+
+    def reject(self, message):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+        for uploaded in self.files:
+            uploaded.delete()
+        self.files = []
+        if self.request is not None:
+            self.request.attachment_upload_error = message
+        raise StopUpload(connection_reset=True)
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super(AttachmentUploadHandler, self).new_file(
+            field_name, file_name, *args, **kwargs)
+        self.writer = None
+        if field_name != self.attachments_field:
+            return
+        max_size = (ATTACHMENTS_MAX_COUNT * ATTACHMENTS_MAX_FILE_SIZE +
+                    self.form_data_max_size)
+        if self.request_size and self.request_size > max_size:
+            self.reject(_('The attachments exceed the maximum upload size.'))
+        self.count += 1
+        if self.count > ATTACHMENTS_MAX_COUNT:
+            self.reject(
+                MultiUploadMetaField.default_error_messages['max_num'] % {
+                    'max_num': ATTACHMENTS_MAX_COUNT,
+                    'num_files': self.count,
+                })
+        self.received = 0
+        field = JobApplicationAttachment._meta.get_field('file')
+        self.writer = StorageWriter(self.storage, field.generate_filename(
+            JobApplicationAttachment(), file_name))
+        raise StopFutureHandlers
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.writer is None:
+            return raw_data
+        self.received += len(raw_data)
+        if self.received > ATTACHMENTS_MAX_FILE_SIZE:
+            self.reject(
+                MultiUploadMetaField.default_error_messages['file_size'] % {
+                    'uploaded_file_name': self.file_name,
+                })
+        try:
+            self.writer.write(raw_data)
+        except Exception:
+            logger.exception('Could not store attachment %s.', self.file_name)
+            self.reject(_('The attachments could not be stored.'))
+
+    def file_complete(self, file_size):
+        if self.writer is None:
+            return None
+        writer, self.writer = self.writer, None
+        try:
+            name = writer.finish()
+        except Exception:
+            logger.exception('Could not store attachment %s.', self.file_name)
+            self.reject(_('The attachments could not be stored.'))
+        uploaded = StoredUploadedFile(
+            self.storage, name, name=self.file_name,
+            content_type=self.content_type, size=file_size,
+            charset=self.charset, content_type_extra=self.content_type_extra)
+        self.files.append(uploaded)
+        return uploaded
@@ -4,7 +4,10 @@ from __future__ import unicode_literals
 
 from django.conf.urls import url
 
-from .views import CategoryJobOpeningList, JobOpeningDetail, JobOpeningList
+from .views import (
+    AttachmentUploadChunk, AttachmentUploadStart, CategoryJobOpeningList,
+    JobApplicationAttachmentDownload, JobOpeningDetail, JobOpeningList,
+)
 
 # default view (root url) which is pointing to ^$ url
 DEFAULT_VIEW = 'job-opening-list'
@@ -12,6 +15,15 @@ DEFAULT_VIEW = 'job-opening-list'
 urlpatterns = [
     url(r'^$', JobOpeningList.as_view(),
         name='job-opening-list'),
+    # the tilde is not matched by the category slug patterns below
+    url(r'^~uploads/$', AttachmentUploadStart.as_view(),
+        name='attachment-upload-start'),
+    url(r'^~uploads/(?P<token>[0-9a-f]{32})/$',
+        AttachmentUploadChunk.as_view(),
+        name='attachment-upload-chunk'),
+    url(r'^~attachments/(?P<token>[-:\w]+)/$',
+        JobApplicationAttachmentDownload.as_view(),
+        name='job-application-attachment'),
     url(r'^(?P<category_slug>\w[-_\w]*)/$',
         CategoryJobOpeningList.as_view(),
         name='category-job-opening-list'),
@@ -2,10 +2,25 @@
 from __future__ import unicode_literals
 from os.path import splitext
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6
+    from ordereddict import OrderedDict
+
 from django.core.urlresolvers import reverse, NoReverseMatch
+from django.db import transaction
+from django.db.models import Q
+from django.utils.http import urlquote
 from django.utils.text import get_valid_filename as get_valid_filename_django
 from django.template.defaultfilters import slugify
 
+from cms.utils.i18n import force_language
+from reversion.models import Revision, Version
+from reversion.revisions import default_revision_manager
+
+from .cache import get_apphooked_cache
+
 
 def get_valid_filename(s):
     """
@@ -23,14 +38,120 @@ def get_valid_filename(s):
 
 
 def namespace_is_apphooked(namespace):
-    # avoid circular import
-    from .urls import DEFAULT_VIEW
     """
     Check if provided namespace has an app-hooked page.
-    Returns True or False.
+    Returns True or False. Results are cached per process until pages are
+    published, unpublished or the apphooks are reloaded.
     """
+    # avoid circular import
+    from .urls import DEFAULT_VIEW
+    apphooked_cache = get_apphooked_cache()
+    try:
+        return apphooked_cache[namespace]
+    except KeyError:
+        pass
     try:
         reverse('{0}:{1}'.format(namespace, DEFAULT_VIEW))
     except NoReverseMatch:
-        return False
-    return True
+        apphooked = False
+    else:
+        apphooked = True
+    apphooked_cache[namespace] = apphooked
+    return apphooked
+
+
+def get_keyset_value(obj, field):
+    """
+    Return the value of a (possibly related, double underscore separated)
+    ``field`` lookup for ``obj``, e.g. 'category__ordering'.
+    """
+    value = obj
+    for attr in field.split('__'):
+        value = getattr(value, attr)
+    return value
+
+
+def get_keyset_filter(fields, values, reverse=False):
+    """
+    Return a Q object selecting rows that come after (or before, if
+    ``reverse``) the row with ``values`` when ordered by ``fields``, i.e.
+    a row value comparison (f1, f2, ...) > (v1, v2, ...) spelled out for
+    the ORM.
+    """
+    lookup_type = 'lt' if reverse else 'gt'
+    keyset_filter = Q()
+    for i, field in enumerate(fields):
+        lookups = dict(zip(fields[:i], values[:i]))
+        lookups['{0}__{1}'.format(field, lookup_type)] = values[i]
+        keyset_filter |= Q(**lookups)
+    return keyset_filter
+
+
+CATEGORY_SLUG_PLACEHOLDER = '__category_slug__'
+JOB_OPENING_SLUG_PLACEHOLDER = '__job_opening_slug__'
+
+
+def get_url_template(namespace, language, view_name, **kwargs):
+    """
+    Reverse ``view_name`` once with placeholders as kwargs, the result is
+    turned into the URLs of all objects with fill_url_template(). Returns
+    None if the namespace can not be reversed.
+    """
+    with force_language(language):
+        try:
+            return reverse('{0}:{1}'.format(namespace, view_name),
+                           kwargs=kwargs, current_app=namespace)
+        except NoReverseMatch:
+            return None
+
+
+def fill_url_template(url_template, **kwargs):
+    for placeholder, value in kwargs.items():
+        url_template = url_template.replace(placeholder, urlquote(value))
+    return url_template
+
+
+def get_translated_rows(rows, languages):
+    """
+    Pick the row in the most preferred of ``languages`` for each object,
+    ``rows`` are tuples starting with the object pk and language code.
+    Returns an ordered dict {pk: row}, in the order of ``rows``.
+    """
+    translated = OrderedDict()
+    for row in rows:
+        pk, language_code = row[:2]
+        current = translated.get(pk)
+        if (current is None or languages.index(language_code) <
+                languages.index(current[1])):
+            translated[pk] = row
+    return translated
+
+
+def on_commit(func, using=None):
+    """
+    Calls ``func`` once the current transaction is committed, or right away
+    outside of transactions. Django < 1.9 cannot defer the call, there it
+    always happens right away.
+    """
+    try:
+        defer = transaction.on_commit
+    except AttributeError:
+        # Django < 1.9
+        func()
+    else:
+        defer(func, using=using)
+
+
+def save_shallow_revision(objects, comment=''):
+    """
+    Saves a revision of ``objects`` without following their registered
+    relations, unlike the revisions created by django-reversion.
+    """
+    revision = Revision.objects.create(
+        manager_slug=default_revision_manager._manager_slug, comment=comment)
+    Version.objects.bulk_create([
+        Version(revision=revision, **default_revision_manager.get_adapter(
+            obj.__class__).get_version_data(obj))
+        for obj in objects
+    ])
+    return revision
@@ -2,22 +2,241 @@
 
 from __future__ import unicode_literals
 
-from django.db import transaction
+import json
+import os
+
 from django.contrib import messages
-from django.http import Http404
-from django.shortcuts import redirect
+from django.core.cache import cache
+from django.core import signing
+from django.http import (
+    Http404, HttpResponse, QueryDict, StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
+from django.utils.encoding import force_text
 from django.utils.translation import (
     ugettext as _, get_language_from_request
 )
-from django.views.generic import DetailView, ListView
+from django.views.generic import DetailView, ListView, View
 from aldryn_apphooks_config.mixins import AppConfigMixin
 from aldryn_apphooks_config.utils import get_app_instance
+from cms.utils.conf import get_cms_setting
 from menus.utils import set_language_changer
-from parler.views import TranslatableSlugMixin
-from reversion.revisions import revision_context_manager
+from parler.views import FallbackLanguageResolved, TranslatableSlugMixin
 
+from .cache import LIST_CACHE_TIMEOUT, get_list_cache_key
 from .forms import JobApplicationForm
-from .models import JobCategory, JobOpening
+from .mail import get_attachment_mimetype, get_attachment_pk
+from .models import (
+    AttachmentUpload, JobApplicationAttachment, JobCategory, JobOpening,
+)
+from .uploads import (
+    UPLOAD_CHUNK_MAX_SIZE, StoredUploadedFile, UploadError, append_chunk,
+    delete_uploads, start_upload,
+)
+from .utils import get_keyset_filter, get_keyset_value
+
+
+class KeysetPage(object):
+    """
+    A page of a keyset paginated list, see KeysetPaginationMixin.
+    """
+
+    def __init__(self, object_list, has_next, has_previous,
+                 next_querystring='', previous_querystring=''):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_querystring = next_querystring
+        self.previous_querystring = previous_querystring
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin(object):
+    """
+    Seek (keyset) pagination for list views. Instead of an OFFSET, pages are
+    selected by comparing ``keyset_fields`` against the values of the last
+    (or first) row of the previous page, so that deep pages cost the same as
+    the first one. ``keyset_fields`` must be integer valued and unique when
+    taken together, usually the list ordering followed by 'pk'.
+    """
+    keyset_fields = ('pk',)
+    after_kwarg = 'after'
+    before_kwarg = 'before'
+
+    def get_keyset_paginate_by(self):
+        """
+        Return the page size, or None if the list should not be paginated.
+        """
+        return None
+
+    def get_keyset(self, kwarg):
+        value = self.request.GET.get(kwarg)
+        if not value:
+            return None
+        try:
+            keyset = [int(part) for part in value.split('.')]
+        except ValueError:
+            raise Http404
+        if len(keyset) != len(self.keyset_fields):
+            raise Http404
+        return keyset
+
+    def get_keyset_querystring(self, kwarg, obj):
+        query = self.request.GET.copy()
+        query.pop(self.after_kwarg, None)
+        query.pop(self.before_kwarg, None)
+        query[kwarg] = '.'.join(
+            str(get_keyset_value(obj, field)) for field in self.keyset_fields)
+        return query.urlencode()
+
+    def paginate_keyset(self, queryset, paginate_by):
+        fields = list(self.keyset_fields)
+        after = self.get_keyset(self.after_kwarg)
+        before = self.get_keyset(self.before_kwarg)
+
+        if before is not None:
+            # fetch the rows before the key in reversed order, then restore
+            # the order for display.
+            queryset = queryset.filter(
+                get_keyset_filter(fields, before, reverse=True)).order_by(
+                *['-{0}'.format(field) for field in fields])
+            object_list = list(queryset[:paginate_by + 1])
+            has_previous = len(object_list) > paginate_by
+            object_list = object_list[:paginate_by][::-1]
+            has_next = True
+        else:
+            if after is not None:
+                queryset = queryset.filter(get_keyset_filter(fields, after))
+            object_list = list(queryset.order_by(*fields)[:paginate_by + 1])
+            has_next = len(object_list) > paginate_by
+            object_list = object_list[:paginate_by]
+            has_previous = after is not None
+
+        page = KeysetPage(object_list, has_next, has_previous)
+        if object_list:
+            if has_next:
+                page.next_querystring = self.get_keyset_querystring(
+                    self.after_kwarg, object_list[-1])
+            if has_previous:
+                page.previous_querystring = self.get_keyset_querystring(
+                    self.before_kwarg, object_list[0])
+        return page
+
+    def get_context_data(self, **kwargs):
+        paginate_by = self.get_keyset_paginate_by()
+        if not paginate_by:
+            return super(KeysetPaginationMixin, self).get_context_data(
+                **kwargs)
+        page = self.paginate_keyset(self.object_list, paginate_by)
+        kwargs.update({
+            'object_list': page.object_list,
+            'keyset_page': page,
+        })
+        context = super(KeysetPaginationMixin, self).get_context_data(
+            **kwargs)
+        context['is_paginated'] = page.has_next or page.has_previous
+        return context
+
+
+class ListCacheMixin(object):
+    """
+    Cache rendered lists for anonymous visitors per namespace, language,
+    category and query string. Entries are dropped when openings,
+    categories or configs of the namespace are saved or deleted (see
+    models.py), and never outlive the next publication window change, so
+    that scheduled openings appear and disappear on time.
+    """
+    cache_timeout = LIST_CACHE_TIMEOUT
+
+    def is_cacheable(self, request):
+        toolbar = getattr(request, 'toolbar', None)
+        return (
+            self.cache_timeout and
+            self.config is not None and
+            request.method in ('GET', 'HEAD') and
+            not request.user.is_authenticated() and
+            # the toolbar renders a login form with the visitor's CSRF token
+            not (toolbar is not None and toolbar.show_toolbar) and
+            get_cms_setting('CMS_TOOLBAR_URL__EDIT_ON') not in request.GET and
+            # pending messages are shown with the list
+            not len(messages.get_messages(request))
+        )
+
+    def is_response_cacheable(self, request, response):
+        """
+        Whether ``response`` can be served to other visitors: it must not
+        set cookies, carry a CSRF token or depend on the visitor's cookies.
+        """
+        vary = [header.strip().lower()
+                for header in response.get('Vary', '').split(',')]
+        return (
+            response.status_code == 200 and
+            not request.META.get('CSRF_COOKIE_USED') and
+            not response.cookies and
+            not response.has_header('Set-Cookie') and
+            'cookie' not in vary and
+            'private' not in response.get('Cache-Control', '').lower()
+        )
+
+    # the query parameters the rendered list depends on, the keyset cursors
+    # of KeysetPaginationMixin
+    cache_query_params = ('after', 'before')
+
+    def get_cache_key(self):
+        # other parameters don't change the list, leaving them out of the
+        # key keeps visitors from creating entries with arbitrary queries
+        query = QueryDict('', mutable=True)
+        for param in sorted(self.cache_query_params):
+            if param in self.request.GET:
+                query[param] = self.request.GET[param]
+        return get_list_cache_key(
+            self.config.namespace,
+            self.language,
+            self.kwargs.get('category_slug', ''),
+            query.urlencode(),
+        )
+
+    def get_cache_timeout(self):
+        timeout = self.cache_timeout
+        next_change = (JobOpening.objects.namespace(self.config.namespace)
+                                         .next_publication_change())
+        if next_change is not None:
+            seconds = (next_change - timezone.now()).total_seconds()
+            timeout = min(timeout, int(seconds))
+        return timeout
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super(ListCacheMixin, self).get(request, *args, **kwargs)
+
+        cache_key = self.get_cache_key()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            status, headers, content = cached
+            response = HttpResponse(content, status=status)
+            for header, value in headers:
+                response[header] = value
+            return response
+
+        response = super(ListCacheMixin, self).get(request, *args, **kwargs)
+        timeout = self.get_cache_timeout()
+        if timeout > 0 and response.status_code == 200:
+            # the CSRF token and cookies are only known once rendered
+            response.add_post_render_callback(
+                lambda r: self.cache_response(request, r, cache_key, timeout))
+        return response
+
+    def cache_response(self, request, response, cache_key, timeout):
+        if self.is_response_cacheable(request, response):
+            cache.set(cache_key, (response.status_code,
+                                  list(response.items()), response.content),
+                      timeout)
 
 
 class JobsBaseMixin(object):
@@ -29,10 +248,14 @@ class JobsBaseMixin(object):
         self.language = get_language_from_request(request, check_path=True)
         return super(JobsBaseMixin, self).dispatch(request, *args, **kwargs)
 
+    def get_keyset_paginate_by(self):
+        return getattr(self.config, 'paginate_by', None)
+
     def get_queryset(self):
         """
         Base queryset returns active JobOpenings with respect to language and
-        namespace. selects related categories, no ordering.
+        namespace. Prefetches categories, translations and app configs, no
+        ordering.
         """
         # if config is none - probably apphook relaod is in progress, or
         # something is wrong, anyway do not fail with 500
@@ -43,18 +266,26 @@ class JobsBaseMixin(object):
                               .namespace(self.config.namespace)
                               .language(self.language)
                               .active_translations(self.language)
-                              .select_related('category')
+                              .prefetch_translations()
         )
 
 
-class JobOpeningList(JobsBaseMixin, AppConfigMixin, ListView):
+class JobOpeningList(JobsBaseMixin, ListCacheMixin, KeysetPaginationMixin,
+                     AppConfigMixin, ListView):
+    # category_id keeps openings of categories with the same ordering
+    # grouped together, which {% regroup %} in the template relies on.
+    keyset_fields = ('category__ordering', 'category_id', 'ordering', 'pk')
 
     def get_queryset(self):
         return super(JobOpeningList, self).get_queryset().order_by(
-            'category__ordering', 'ordering')
+            *self.keyset_fields)
+
 
+class CategoryJobOpeningList(JobsBaseMixin, ListCacheMixin,
+                             KeysetPaginationMixin, AppConfigMixin,
+                             ListView):
+    keyset_fields = ('ordering', 'pk')
 
-class CategoryJobOpeningList(JobsBaseMixin, AppConfigMixin, ListView):
     def get_queryset(self):
         category_slug = self.kwargs['category_slug']
         try:
@@ -72,7 +303,7 @@ class CategoryJobOpeningList(JobsBaseMixin, AppConfigMixin, ListView):
         self.set_language_changer(category=self.category)
         return (super(CategoryJobOpeningList, self).get_queryset()
                 .filter(category=self.category)
-                .order_by('ordering'))
+                .order_by(*self.keyset_fields))
 
     def set_language_changer(self, category):
         """Translate the slug while changing the language."""
@@ -105,6 +336,8 @@ class JobOpeningDetail(AppConfigMixin, TranslatableSlugMixin, DetailView):
             kwargs.update({
                 'data': self.request.POST,
                 'files': self.request.FILES,
+                'upload_error': getattr(
+                    self.request, 'attachment_upload_error', None),
             })
         return kwargs
 
@@ -127,8 +360,45 @@ class JobOpeningDetail(AppConfigMixin, TranslatableSlugMixin, DetailView):
         qs = super(JobOpeningDetail, self).get_queryset()
         return qs.namespace(self.namespace)
 
-    @transaction.atomic
-    @revision_context_manager.create_revision()
+    def get_object(self, queryset=None):
+        """
+        Same as TranslatableSlugMixin.get_object, but looks the opening up by
+        both the category and the opening slugs, which is a single indexed
+        query per language choice.
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        category_slug = self.kwargs['category_slug']
+        slug = self.kwargs[self.slug_url_kwarg]
+        choices = self.get_language_choices()
+
+        obj = None
+        prev_choices = []
+        for lang_choice in choices:
+            try:
+                obj = (queryset.translated_slugs(lang_choice, category_slug,
+                                                 slug)
+                               .language(lang_choice)
+                               .get())
+            except JobOpening.DoesNotExist:
+                prev_choices.append(lang_choice)
+            else:
+                break
+
+        if obj is None:
+            raise Http404(
+                _('No job opening found matching the query, tried '
+                  'languages: {0}').format(', '.join(choices)))
+
+        # redirect to the translated slug if the object was resolved with
+        # a fallback language, but has a translation in the requested one.
+        for prev_choice in prev_choices:
+            if obj.has_translation(prev_choice):
+                raise FallbackLanguageResolved(obj, prev_choice)
+
+        return obj
+
     def post(self, *args, **kwargs):
         """Handles application for the job."""
         if not self.object.can_apply:
@@ -140,16 +410,123 @@ class JobOpeningDetail(AppConfigMixin, TranslatableSlugMixin, DetailView):
         self.form = self.get_form(form_class)
 
         if self.form.is_valid():
-            self.form.save()
-            msg = _("You have successfully applied for %(job)s.") % {
-                'job': self.object.title
-            }
-            messages.success(self.request, msg)
-            return redirect(self.object.get_absolute_url())
-        else:
-            return super(JobOpeningDetail, self).get(*args, **kwargs)
+            try:
+                self.form.save()
+            except UploadError as e:
+                # another application used the same uploads meanwhile
+                self.form.add_error(None, force_text(e))
+            else:
+                msg = _("You have successfully applied for %(job)s.") % {
+                    'job': self.object.title
+                }
+                messages.success(self.request, msg)
+                return redirect(self.object.get_absolute_url())
+        # drop the files AttachmentUploadHandler stored already
+        for uploaded in self.request.FILES.getlist('attachments'):
+            if isinstance(uploaded, StoredUploadedFile):
+                uploaded.delete()
+        return super(JobOpeningDetail, self).get(*args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(JobOpeningDetail, self).get_context_data(**kwargs)
         context['form'] = self.form
         return context
+
+
+def iter_file_chunks(f):
+    try:
+        for chunk in f.chunks():
+            yield chunk
+    finally:
+        f.close()
+
+
+class JobApplicationAttachmentDownload(View):
+    """
+    Streams an application attachment to the holders of a signed download
+    link, as sent in the staff notifications for large attachments.
+    """
+
+    def get(self, request, token):
+        try:
+            pk = get_attachment_pk(token)
+        except signing.BadSignature:
+            raise Http404
+        attachment = get_object_or_404(JobApplicationAttachment, pk=pk)
+        attachment.file.open('rb')
+        filename = os.path.basename(attachment.file.name)
+        response = StreamingHttpResponse(
+            iter_file_chunks(attachment.file),
+            content_type=get_attachment_mimetype(filename))
+        response['Content-Disposition'] = 'attachment; filename="{0}"'.format(
+            filename)
+        response['Content-Length'] = attachment.file.size
+        return response
+
+
+class JSONResponseMixin(object):
+
+    def render_json(self, data, status=200):
+        return HttpResponse(json.dumps(data), status=status,
+                            content_type='application/json')
+
+    def render_upload(self, upload, status=200):
+        return self.render_json({
+            'token': upload.token,
+            'offset': upload.offset,
+            'size': upload.size,
+            'complete': upload.is_complete,
+        }, status=status)
+
+    def render_error(self, error):
+        data = dict(error.data, error=force_text(error))
+        return self.render_json(data, status=error.status)
+
+
+class AttachmentUploadStart(JSONResponseMixin, View):
+    """
+    Starts a resumable attachment upload. Expects the ``filename`` and the
+    ``size`` in bytes of the file, returns the token of the upload.
+    """
+
+    def post(self, request):
+        try:
+            upload = start_upload(request.POST.get('filename'),
+                                  request.POST.get('size'))
+        except UploadError as e:
+            return self.render_error(e)
+        return self.render_upload(upload, status=201)
+
+
+class AttachmentUploadChunk(JSONResponseMixin, View):
+    """
+    GET returns the state of an upload, to resume it from its ``offset``.
+    PATCH appends a chunk, sent as the request body with the offset of its
+    first byte in the Upload-Offset header and optionally its checksum in
+    the Upload-Checksum header (e.g. ``sha256 <hex digest>``). Once the
+    upload is complete its token can be submitted with the application.
+    """
+
+    def get_upload(self, token):
+        return get_object_or_404(AttachmentUpload, token=token)
+
+    def get(self, request, token):
+        return self.render_upload(self.get_upload(token))
+
+    def patch(self, request, token):
+        upload = self.get_upload(token)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if length > UPLOAD_CHUNK_MAX_SIZE:
+                # refuse before reading the body
+                raise UploadError(_('The chunk is too large.'), status=413)
+            upload = append_chunk(
+                upload, request.META.get('HTTP_UPLOAD_OFFSET'), request.body,
+                checksum=request.META.get('HTTP_UPLOAD_CHECKSUM'))
+        except UploadError as e:
+            return self.render_error(e)
+        return self.render_upload(upload)
+
+    def delete(self, request, token):
+        delete_uploads([self.get_upload(token)])
+        return HttpResponse(status=204)
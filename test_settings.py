@@ -38,6 +38,8 @@ HELPER_SETTINGS = {
         'sortedm2m',
         'easy_thumbnails',
         'djangocms_text_ckeditor',
+        'emailit',
+        'absolute',
         'adminsortable2',
         'standard_form',
     ],